@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 from pathlib import Path
-import json
 from accounts.models import CountryName  
+from shopingo.geography import import_geography, iter_json_array, json_rows
 
 class Command(BaseCommand):
     help = "Import countries from a JSON file. Supports list of strings or list of {'name':...}."
@@ -16,21 +16,12 @@ class Command(BaseCommand):
             return
 
         try:
-            data = json.loads(path.read_text(encoding='utf-8'))
-        except Exception as e:
+            with path.open(encoding='utf-8') as f:
+                created = import_geography(json_rows(iter_json_array(f)))['countries']
+        except ValueError as e:
             self.stdout.write(self.style.ERROR(f"Invalid JSON: {e}"))
             return
 
-        created = 0
-        for item in data:
-            name = item.get("name") if isinstance(item, dict) else item
-            if not name:
-                continue
-            name = name.strip()
-            _, was_created = CountryName.objects.get_or_create(nameName=name)
-            if was_created:
-                created += 1
-
         self.stdout.write(
             self.style.SUCCESS(
                 f"Imported {created} new countries. Total now: {CountryName.objects.count()}"
@@ -0,0 +1,41 @@
+import csv
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from shopingo.geography import IMPORT_BATCH_SIZE, csv_rows, import_geography, iter_json_array, json_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Import countries, divisions and districts from a JSON array or a CSV file "
+        "(country, division, district columns). Existing rows are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', type=str, help='Path to a .json or .csv file')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        path = Path(options['file'])
+        if not path.exists():
+            self.stdout.write(self.style.ERROR(f"File not found: {path}"))
+            return
+
+        with path.open(encoding='utf-8', newline='') as f:
+            if path.suffix.lower() == '.csv':
+                rows = csv_rows(csv.DictReader(f))
+            else:
+                rows = json_rows(iter_json_array(f))
+            try:
+                created = import_geography(rows, options['batch_size'])
+            except ValueError as e:
+                self.stdout.write(self.style.ERROR(f"Invalid file: {e}"))
+                return
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {created['countries']} countries, {created['divisions']} divisions "
+                f"and {created['districts']} districts."
+            )
+        )
@@ -1,3 +1,98 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import CountryName, District, Division
+from shopingo.geography import get_geography
+from shopingo.versions import GEOGRAPHY, get_version
+
+
+# ===========================
+# import_geography command
+# ===========================
+class ImportGeographyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        handle, self.path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(handle, "w", encoding="utf-8") as f:
+            json.dump([
+                {"name": "Bangladesh", "divisions": [{"name": "Dhaka", "districts": ["Gazipur", "Narayanganj"]}]},
+                {"country": "Nepal", "division": "Bagmati", "district": "Lalitpur"},
+                "Bhutan",
+            ], f)
+        self.addCleanup(os.remove, self.path)
+
+    def test_import_countries_runs_on_the_default_cache(self):
+        version = get_version(GEOGRAPHY)
+        call_command("import_countries", self.path, stdout=StringIO())
+        self.assertEqual(sorted(CountryName.objects.values_list("nameName", flat=True)), ["Bangladesh", "Bhutan", "Nepal"])
+        self.assertNotEqual(get_version(GEOGRAPHY), version)
+
+    def test_import_is_idempotent_and_bumps_the_version(self):
+        version = get_version(GEOGRAPHY)
+        call_command("import_geography", self.path, stdout=StringIO())
+        self.assertNotEqual(get_version(GEOGRAPHY), version)
+
+        call_command("import_geography", self.path, stdout=StringIO())
+        self.assertEqual(CountryName.objects.count(), 3)
+        self.assertEqual(Division.objects.count(), 2)
+        self.assertEqual(District.objects.count(), 3)
+
+        geography = get_geography()
+        dhaka = Division.objects.get(division_name="Dhaka")
+        self.assertEqual([row["district_name"] for row in geography.districts_of(dhaka.id)], ["Gazipur", "Narayanganj"])
+
+
+# ===========================
+# Geography tree and its endpoints
+# ===========================
+class GeographyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.country = CountryName.objects.create(nameName="Bangladesh")
+        self.dhaka = Division.objects.create(country=self.country, division_name="Dhaka")
+        District.objects.create(country=self.country, division=self.dhaka, district_name="Gazipur")
+
+    def test_tree_is_built_once_per_version(self):
+        geography = get_geography()
+        with self.assertNumQueries(0):
+            self.assertIs(get_geography(), geography)
+
+        Division.objects.create(country=self.country, division_name="Sylhet")
+        rebuilt = get_geography()
+        self.assertIsNot(rebuilt, geography)
+        self.assertEqual([row["division_name"] for row in rebuilt.divisions_of(self.country.id)], ["Dhaka", "Sylhet"])
+
+    def test_divisions_answer_304_until_a_write(self):
+        url = reverse("get_divisions") + f"?country_id={self.country.id}"
+        response = self.client.get(url)
+        self.assertEqual(response.json(), [{"id": self.dhaka.id, "division_name": "Dhaka"}])
+        etag = response["ETag"]
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.dhaka.division_name = "Dhaka Division"
+        self.dhaka.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["division_name"], "Dhaka Division")
+
+    def test_document_is_immutable_and_a_stale_version_redirects(self):
+        version = get_geography().version
+        response = self.client.get(reverse("geography_document", args=[version]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        document = json.loads(response.content)
+        self.assertEqual(document["countries"], [[self.country.id, "Bangladesh"]])
+        self.assertEqual(document["districts"][str(self.dhaka.id)][0][1], "Gazipur")
 
-# Create your tests here.
+        CountryName.objects.create(nameName="Nepal")
+        response = self.client.get(reverse("geography_document", args=[version]))
+        self.assertRedirects(response, reverse("geography_document", args=[get_version(GEOGRAPHY)]))
+        self.assertIn("Nepal", self.client.get(response["Location"]).content.decode())
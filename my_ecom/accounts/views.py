@@ -12,6 +12,7 @@ from django.contrib.auth.models import User
 from .models import PasswordResetCode
 from django.conf import settings
 from shopingo.models import *
+from shopingo.geography import get_geography
 from django.contrib.auth import update_session_auth_hash
 
 
@@ -163,7 +164,7 @@ def customer_register(request):
             messages.error(request, "There were errors in your registration form. Please fix them and try again.")
     else:
         form = CustomerRegistrationForm()
-    countries = CountryName.objects.all()
+    countries = get_geography().countries
     context = {
         'form': form,
         'countries': countries,
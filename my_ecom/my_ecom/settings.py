@@ -45,6 +45,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # After auth: merges the guest cart (cookie) into Cart rows at login
+    'shopingo.guest_cart.GuestCartMiddleware',
 ]
 
 ROOT_URLCONF = 'my_ecom.urls'
@@ -82,6 +84,32 @@ DATABASES = {
 }
 
 
+# Cache
+# Version counters (shopingo/versions.py) live here; with several worker
+# processes point this at a shared backend (Redis / Memcached) so a bump in
+# one process is seen by all of them.
+
+# Cached pages and snapshots are invalidated by bumping version counters in
+# this cache (shopingo/versions.py). LocMemCache keeps them inside one
+# process, which is fine for runserver. With several workers (gunicorn) or
+# cron'd management commands, every process must share the counters, e.g.
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#   'LOCATION': 'redis://127.0.0.1:6379',  (needs the redis package)
+# or 'django.core.cache.backends.db.DatabaseCache' with LOCATION
+# 'shoppingo_cache' after `python manage.py createcachetable`.
+# With DEBUG off, a process-local backend raises the shopingo.W001 warning.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shoppingo',
+    }
+}
+
+# In-memory bitmap index for listing filters / facet counts (shopingo/facets.py).
+# Off by default; every process keeps its own copy of the index.
+SHOPINGO_FACET_INDEX = False
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
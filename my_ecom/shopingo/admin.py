@@ -62,7 +62,12 @@ class ProductAdmin(admin.ModelAdmin):
     discount_percent_display.short_description = "Discount %"
 
     def save_model(self, request, obj, form, change):
-        obj.save()
+        if change:
+            # obj was loaded before the form was filled in: leave the counters
+            # and pointers other writes keep (Product.MAINTAINED_FIELDS) alone
+            obj.save(update_fields=Product.edited_fields())
+        else:
+            obj.save()
 
 
 
@@ -123,6 +128,38 @@ class ProductTagAdmin(admin.ModelAdmin):
     search_fields = ("product__title", "tag__name")
 
 
+# ===========================
+# Product Listing Admin (Read-only, maintained by signals)
+# ===========================
+@admin.register(ProductListing)
+class ProductListingAdmin(admin.ModelAdmin):
+    list_display = ("title", "category_name", "brand_name", "price", "min_price", "max_price", "total_stock", "is_featured")
+    list_filter = ("is_featured", "category")
+    search_fields = ("title", "slug")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ===========================
+# Product Sales Stats Admin (Read-only, maintained at checkout)
+# ===========================
+@admin.register(ProductSalesStats)
+class ProductSalesStatsAdmin(admin.ModelAdmin):
+    list_display = ("product", "units_sold", "orders_count", "revenue", "units_7d", "units_30d", "updated_at")
+    search_fields = ("product__title",)
+    ordering = ("-units_sold",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # ===========================
 # Cart Admin (Read-only)
 # ===========================
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ShopingoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shopingo'
+
+    def ready(self):
+        import shopingo.checks  # noqa: F401
+        import shopingo.signals  # noqa: F401
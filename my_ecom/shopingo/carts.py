@@ -0,0 +1,291 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .images import with_primary_image
+from .models import Cart, Product, Wishlist
+from .popularity import wishlists_added
+from .versions import bump_version, get_version, get_versions, product_content, user_cart
+
+
+CART_SUMMARY_TIMEOUT = 60 * 60
+
+EMPTY_CART = {
+    "cart_items_base": [],
+    "cart_total_items": 0,
+    "cart_subtotal": Decimal("0.00"),
+}
+
+
+def _key(user_id, version):
+    return f"shopingo:cart:{user_id}:{version}"
+
+
+# ===========================
+# Per-user cart summary (mini-cart)
+# ===========================
+# The header shows the cart on every page, so each user's lines (with their
+# product card data) are kept in the cache. Every Cart save / delete bumps
+# the user's cart version (signals), which covers adding, removing, moving
+# to the wishlist and clearing at checkout; set_cart_quantity bumps it itself. A product edit
+# (price, title, image) bumps that product's content version; the summary
+# remembers the versions it was built from and is rebuilt when one moved.
+
+def build_cart_lines(user_id):
+    cart_items = with_primary_image(Cart.objects.filter(user_id=user_id), "product")
+
+    total_items = 0
+    subtotal = Decimal("0.00")
+    cart_items_with_total = []
+
+    for item in cart_items:
+        item_total = Decimal(item.quantity) * Decimal(item.product.orginal_price)
+        total_items += item.quantity
+        subtotal += item_total
+        cart_items_with_total.append({
+            "item": item,
+            "item_total": item_total,
+        })
+
+    return {
+        "cart_items_base": cart_items_with_total,
+        "cart_total_items": total_items,
+        "cart_subtotal": subtotal,
+    }
+
+
+def _content_names(summary):
+    return [product_content(entry["item"].product_id) for entry in summary["cart_items_base"]]
+
+
+def get_cart_lines(user_id):
+    """The user's cached summary: two cache round trips and no query while nothing changed."""
+    version = get_version(user_cart(user_id))
+    entry = cache.get(_key(user_id, version))
+    if entry is not None:
+        summary, content_versions = entry
+        if get_versions(list(content_versions)) == content_versions:
+            return summary
+
+    summary = build_cart_lines(user_id)
+    # Product ids are only known after the build, so the content versions
+    # are read after it; a product edit racing the build can stay in the
+    # mini-cart until the next write or timeout. Money is never taken from
+    # here: checkout totals are built from the rows (context_processors).
+    content_versions = get_versions(_content_names(summary)) if summary["cart_items_base"] else {}
+    cache.set(_key(user_id, version), (summary, content_versions), CART_SUMMARY_TIMEOUT)
+    return summary
+
+
+# ===========================
+# Totals (AJAX cart endpoints)
+# ===========================
+def _money(expression, **extra):
+    field = DecimalField(max_digits=12, decimal_places=2)
+    return Coalesce(Sum(expression, output_field=field, **extra), Value(Decimal("0.00")), output_field=field)
+
+
+def cart_totals(user_id, line_id=None):
+    """
+    ``{"cart_total_items", "cart_subtotal"}`` of a user's cart from one
+    aggregate query, plus ``"item_total"`` of cart row ``line_id`` when given.
+    """
+    line_amount = F("quantity") * F("product__orginal_price")
+    aggregates = {
+        "cart_total_items": Coalesce(Sum("quantity"), 0),
+        "cart_subtotal": _money(line_amount),
+    }
+    if line_id is not None:
+        aggregates["item_total"] = _money(line_amount, filter=Q(id=line_id))
+    return Cart.objects.filter(user_id=user_id).aggregate(**aggregates)
+
+
+def set_cart_quantity(user_id, line_id, quantity):
+    """One UPDATE of a cart row's quantity; False when the row isn't the user's."""
+    updated = Cart.objects.filter(id=line_id, user_id=user_id).update(quantity=quantity)
+    if updated:
+        # update() sends no post_save
+        bump_version(user_cart(user_id))
+    return bool(updated)
+
+
+# ===========================
+# Batch operations (api/cart/batch/)
+# ===========================
+# A list of add / set / remove / wishlist operations applied in order, in
+# one transaction, with one query per kind of write: a delete for removed
+# rows, bulk_update for changed quantities and bulk_create for new rows
+# (Cart has no unique key to upsert on, so existing rows are updated and
+# the rest created). Any invalid operation rejects the whole batch.
+
+CART_OPERATIONS = ("add", "set", "remove", "wishlist")
+MAX_CART_OPERATIONS = 100
+MAX_LINE_QUANTITY = 999
+OPTION_MAX_LENGTH = Cart._meta.get_field("color").max_length
+
+# Largest id / quantity the database takes (64-bit signed)
+_MAX_NUMBER = 2 ** 63 - 1
+
+
+def _number(value, label, index):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Operation {index}: {label} must be a number.")
+    if abs(number) > _MAX_NUMBER:
+        raise ValueError(f"Operation {index}: {label} is out of range.")
+    return number
+
+
+def _quantity(row, index):
+    if row.quantity > MAX_LINE_QUANTITY:
+        raise ValueError(f"Operation {index}: at most {MAX_LINE_QUANTITY} of one product.")
+
+
+def _option(operation, label, index):
+    value = operation.get(label)
+    if value is None:
+        return ""
+    if not isinstance(value, str) or len(value) > OPTION_MAX_LENGTH:
+        raise ValueError(f"Operation {index}: {label} must be text of at most {OPTION_MAX_LENGTH} characters.")
+    return value
+
+
+def apply_cart_operations(user_id, operations):
+    """
+    Apply ``operations`` to a user's cart. Each is a dict with ``op`` and:
+
+    - ``add``: ``product_id``, optional ``quantity`` (default 1), ``color``, ``size``
+      (text, at most OPTION_MAX_LENGTH characters); adds to the line of that
+      product if there is one
+    - ``set``: ``item_id`` or ``product_id``, ``quantity`` (1 to MAX_LINE_QUANTITY)
+    - ``remove``: ``item_id`` or ``product_id``
+    - ``wishlist``: like remove, and the product goes to the wishlist
+
+    Raises ValueError (nothing written) for an invalid batch.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("No operations given.")
+    if len(operations) > MAX_CART_OPERATIONS:
+        raise ValueError(f"At most {MAX_CART_OPERATIONS} operations per request.")
+
+    with transaction.atomic():
+        rows = list(Cart.objects.select_for_update().filter(user_id=user_id).order_by("id"))
+        live = {row.id: row for row in rows}
+        by_product = {}
+        for row in rows:
+            by_product.setdefault(row.product_id, []).append(row)
+        new_rows = {}  # product_id -> unsaved Cart
+        changed, removed = set(), set()
+        to_wishlist, off_wishlist = set(), set()
+
+        def product_line(product_id):
+            for row in by_product.get(product_id, []):
+                if row.id in live:
+                    return row
+            return new_rows.get(product_id)
+
+        def find(operation, index):
+            if "item_id" in operation:
+                row = live.get(_number(operation["item_id"], "item_id", index))
+            else:
+                row = product_line(_number(operation.get("product_id"), "product_id", index))
+            if row is None:
+                raise ValueError(f"Operation {index}: item not found.")
+            return row
+
+        def drop(row):
+            if row.id is None:
+                del new_rows[row.product_id]
+            else:
+                del live[row.id]
+                changed.discard(row.id)
+                removed.add(row.id)
+
+        for index, operation in enumerate(operations, start=1):
+            if not isinstance(operation, dict) or operation.get("op") not in CART_OPERATIONS:
+                raise ValueError(f"Operation {index}: op must be one of {', '.join(CART_OPERATIONS)}.")
+            op = operation["op"]
+
+            if op == "add":
+                product_id = _number(operation.get("product_id"), "product_id", index)
+                quantity = max(_number(operation.get("quantity", 1), "quantity", index), 1)
+                color, size = _option(operation, "color", index), _option(operation, "size", index)
+                row = product_line(product_id)
+                if row is None:
+                    row = new_rows[product_id] = Cart(
+                        user_id=user_id, product_id=product_id, quantity=quantity, color=color, size=size,
+                    )
+                else:
+                    row.quantity += quantity
+                    if row.id is not None:
+                        changed.add(row.id)
+                _quantity(row, index)
+                # Same as the single add: the product leaves the wishlist
+                to_wishlist.discard(product_id)
+                off_wishlist.add(product_id)
+
+            elif op == "set":
+                row = find(operation, index)
+                row.quantity = max(_number(operation.get("quantity"), "quantity", index), 1)
+                _quantity(row, index)
+                if row.id is not None:
+                    changed.add(row.id)
+
+            else:
+                row = find(operation, index)
+                drop(row)
+                if op == "wishlist":
+                    off_wishlist.discard(row.product_id)
+                    to_wishlist.add(row.product_id)
+
+        wanted = set(new_rows) | to_wishlist
+        known = set(Product.objects.filter(id__in=wanted).values_list("id", flat=True))
+        unknown = sorted(wanted - known)
+        if unknown:
+            raise ValueError(f"Unknown product(s): {', '.join(map(str, unknown))}.")
+
+        if removed:
+            Cart.objects.filter(id__in=removed).delete()
+        if changed:
+            Cart.objects.bulk_update([live[row_id] for row_id in changed], ["quantity"])
+        if new_rows:
+            Cart.objects.bulk_create(new_rows.values())
+
+        if off_wishlist:
+            Wishlist.objects.filter(user_id=user_id, product_id__in=off_wishlist).delete()
+        if to_wishlist:
+            listed = set(
+                Wishlist.objects.filter(user_id=user_id, product_id__in=to_wishlist).values_list("product_id", flat=True)
+            )
+            fresh = to_wishlist - listed
+            Wishlist.objects.bulk_create(Wishlist(user_id=user_id, product_id=product_id) for product_id in fresh)
+            wishlists_added(fresh)
+
+    # bulk_update / bulk_create send no signals
+    bump_version(user_cart(user_id))
+
+
+def cart_summary_json(user_id):
+    """The user's cart summary, JSON-ready (the same data as the mini-cart)."""
+    lines = get_cart_lines(user_id)
+    return {
+        "cart_total_items": lines["cart_total_items"],
+        "cart_subtotal": f"{lines['cart_subtotal']:.2f}",
+        "items": [
+            {
+                "item_id": entry["item"].id,
+                "product_id": entry["item"].product_id,
+                "title": entry["item"].product.title,
+                "slug": entry["item"].product.slug,
+                "quantity": entry["item"].quantity,
+                "color": entry["item"].color,
+                "size": entry["item"].size,
+                "item_total": f"{entry['item_total']:.2f}",
+            }
+            for entry in lines["cart_items_base"]
+        ],
+    }
@@ -0,0 +1,515 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Count, F, OrderBy, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Variation, Brand, Color, Size, ProductListing, Product, ProductTag
+from .pagination import CountedPaginator, CursorPage, keyset_page
+from .versions import FACETS, bump_version, get_versions, listing_scope
+
+
+# ===========================
+# Listing filter constants
+# ===========================
+PRICE_RANGE_MAPPING = {
+    "5-49": (5, 49),
+    "49-99": (49, 99),
+    "99-149": (99, 149),
+    "149-300": (149, 300),
+    "300-500": (300, 500),
+    "1000+": (1000, None),
+}
+
+DISCOUNT_RANGES = [10, 20, 30, 40, 50, 60, 70, 80, 90]
+
+PER_PAGE_LIST = [9, 12, 16, 20, 50, 100]
+
+# Listing result cache (see run_listing); versions make it fresh, this only bounds memory
+LISTING_CACHE_TIMEOUT = 60 * 15
+
+# Every ordering ends with the primary key so keyset pagination has a total order
+SORT_ORDERING = {
+    "price_asc": ("price", "product_id"),
+    "price_desc": ("-price", "-product_id"),
+    "newest": ("-product_id",),
+}
+DEFAULT_ORDERING = SORT_ORDERING["newest"]
+
+
+def discount_bounds(value):
+    """(start, end) of a discount bucket, e.g. 20 -> (11, 20), 90 -> (81, 100)."""
+    start = (value - 10) + 1 if value > 10 else 0
+    end = value if value < 90 else 100
+    return start, end
+
+
+# Bucket sets for histogram(): (value, start, end), None = open ended
+DISCOUNT_BUCKETS = [(d,) + discount_bounds(d) for d in DISCOUNT_RANGES]
+
+PRICE_BUCKETS = [(key, low, high) for key, (low, high) in PRICE_RANGE_MAPPING.items()]
+
+STOCK_BUCKETS = [
+    ("out", 0, 0),
+    ("low", 1, 10),
+    ("medium", 11, 50),
+    ("high", 51, None),
+]
+
+
+# ===========================
+# Histogram
+# ===========================
+def histogram(queryset, field, buckets, count="id"):
+    """
+    Count rows of ``queryset`` per bucket of ``field`` in a single query.
+
+    Every bucket becomes one conditional ``Count`` inside the same
+    ``aggregate()``, so the sidebar can show any number of buckets (discount,
+    price, stock, rating bands ...) for the cost of one query. Bounds are
+    inclusive; ``count="product"`` counts distinct products instead of rows.
+
+    Returns ``[{"value": ..., "count": ...}, ...]`` in bucket order.
+    """
+    aggregates = {}
+    for i, (value, start, end) in enumerate(buckets):
+        condition = Q()
+        if start is not None:
+            condition &= Q(**{f"{field}__gte": start})
+        if end is not None:
+            condition &= Q(**{f"{field}__lte": end})
+        aggregates[f"bucket_{i}"] = Count(count, filter=condition, distinct=count != "id")
+
+    result = queryset.aggregate(**aggregates) if aggregates else {}
+    return [
+        {"value": value, "count": result[f"bucket_{i}"]}
+        for i, (value, start, end) in enumerate(buckets)
+    ]
+
+
+# ===========================
+# Top-K per group
+# ===========================
+def top_k_per_group(queryset, group_field, k, ordering):
+    """
+    At most ``k`` rows of ``queryset`` per value of ``group_field``, each
+    group in ``ordering``. Returns ``{group value: [rows]}``.
+
+    Uses ``ROW_NUMBER() OVER (PARTITION BY group_field ORDER BY ...)`` in a
+    single query; databases without window functions (SQLite < 3.25) run
+    one LIMIT k query per group instead. Either way no more than k rows per
+    group are ever loaded.
+    """
+    groups = {}
+    if connections[queryset.db].features.supports_over_clause:
+        rows = (
+            queryset.annotate(
+                group_rank=Window(
+                    RowNumber(),
+                    partition_by=F(group_field),
+                    order_by=[OrderBy(F(f.lstrip("-")), descending=f.startswith("-")) for f in ordering],
+                )
+            )
+            .filter(group_rank__lte=k)
+            .order_by(group_field, "group_rank")
+        )
+        for row in rows:
+            groups.setdefault(getattr(row, group_field), []).append(row)
+        return groups
+
+    values = queryset.order_by().values_list(group_field, flat=True).distinct()
+    for value in values:
+        groups[value] = list(queryset.filter(**{group_field: value}).order_by(*ordering)[:k])
+    return groups
+
+
+# ===========================
+# Filter spec
+# ===========================
+def parse_listing_filters(request):
+    """
+    Read the sidebar + top toolbox filters from the query string.
+
+    Key names match the template context, so the result can be merged
+    straight into the listing context.
+    """
+    min_price = request.GET.get("min_price") or ""
+    max_price = request.GET.get("max_price") or ""
+    price_range = request.GET.get("price_range") or ""
+
+    # Price range -> convert to min/max only if manual min/max not given
+    if price_range and not (min_price or max_price):
+        pr_min, pr_max = PRICE_RANGE_MAPPING.get(price_range, (None, None))
+        if pr_min is not None:
+            min_price = pr_min
+        if pr_max is not None:
+            max_price = pr_max
+
+    try:
+        per_page = int(request.GET.get("per_page") or 12)
+    except ValueError:
+        per_page = 12
+    # Only the sizes the "Show" select offers: 0 or a negative value would
+    # break both pagers, a huge one would fetch the whole scope
+    if per_page not in PER_PAGE_LIST:
+        per_page = 12
+
+    return {
+        "selected_category_ids": [c for c in request.GET.getlist("category") if c],
+        "selected_brand_ids": [b for b in request.GET.getlist("brand") if b],
+        "selected_color_ids": [c for c in request.GET.getlist("color") if c],
+        "min_price": min_price,
+        "max_price": max_price,
+        "selected_discount": request.GET.get("discount") or "",
+        "selected_sort": request.GET.get("sort") or "",
+        "selected_size": request.GET.get("size") or "",
+        "top_color": request.GET.get("top_color") or "",
+        "price_range": price_range,
+        "per_page": per_page,
+        "page": request.GET.get("page"),
+        # Opt-in keyset pagination: ?paging=cursor (or any ?cursor=...)
+        "cursor": request.GET.get("cursor") or "",
+        "paging": "cursor" if request.GET.get("paging") == "cursor" or request.GET.get("cursor") else "",
+    }
+
+
+def _variation_conditions(filters):
+    """
+    Variation level conditions (brand, color, size, price), one Q per facet.
+
+    Filters work at product level, as the chained ``variations__`` filters
+    always did: "brand A + color red" matches a product with any variation
+    of brand A and any variation in red, not necessarily the same one. The
+    price range is one condition (a variation priced inside the range),
+    like the price buckets of the bitmap index.
+    """
+    conditions = []
+    if filters["selected_brand_ids"]:
+        conditions.append(Q(brand_id__in=filters["selected_brand_ids"]))
+    if filters["selected_color_ids"]:
+        conditions.append(Q(color_id__in=filters["selected_color_ids"]))
+    if filters["selected_size"]:
+        conditions.append(Q(size_id=filters["selected_size"]))
+    if filters["top_color"]:
+        conditions.append(Q(color_id=filters["top_color"]))
+    price = Q()
+    if filters["min_price"]:
+        price &= Q(discount_price__gte=filters["min_price"])
+    if filters["max_price"]:
+        price &= Q(discount_price__lte=filters["max_price"])
+    if price:
+        conditions.append(price)
+    return conditions
+
+
+def _matching_products(product_ids, conditions):
+    """Narrow a product id subquery by each condition in turn (one nested subquery per facet)."""
+    for condition in conditions:
+        product_ids = Variation.objects.filter(condition, product_id__in=product_ids).values("product_id")
+    return product_ids
+
+
+def _selected_discount(filters):
+    try:
+        return int(filters["selected_discount"])
+    except (TypeError, ValueError):
+        return None
+
+
+def filters_active(filters):
+    """True when any variation level filter (or a discount bucket) is set."""
+    return bool(
+        filters["selected_brand_ids"]
+        or filters["selected_color_ids"]
+        or filters["selected_size"]
+        or filters["top_color"]
+        or filters["min_price"]
+        or filters["max_price"]
+        or _selected_discount(filters) is not None
+    )
+
+
+# ===========================
+# Faceted listing query
+# ===========================
+def run_listing(scope, filters, scope_key=None, rank=None):
+    """
+    Listing page + facets, served from the result cache when possible.
+
+    With a ``scope_key`` the result (product ids of the page, page number and
+    total, brand / color counts, discount histogram) is cached under the
+    normalized filter spec plus the version of every scope id. Product,
+    Variation and ProductTag writes bump those versions (signals.py), so a
+    hit is never older than the last write. Only ids and counts are cached;
+    the cards are re-read from ProductListing in one query.
+    """
+    if not scope_key:
+        return _run_listing(scope, filters, rank=rank)
+
+    key = listing_cache_key(scope_key, filters)
+    cached = cache.get(key)
+    if cached is not None:
+        return _thaw_listing(cached, filters)
+
+    result = _run_listing(scope, filters, scope_key)
+    result["brands"] = list(result["brands"])
+    result["colors"] = list(result["colors"])
+    cache.set(key, _freeze_listing(result), LISTING_CACHE_TIMEOUT)
+    return result
+
+
+def _run_listing(scope, filters, scope_key=None, rank=None):
+    """
+    Run a product listing page with its sidebar facets.
+
+    ``scope`` is the base ``ProductListing`` queryset (a category, subcategory
+    or tag), so the page itself is read from the denormalized card rows.
+    Each filter narrows a product id subquery (``id__in``, see
+    _matching_products), so the page, the pagination count and every facet
+    count are a fixed number of queries no matter how many filters are
+    ticked, and no ``.distinct()`` is needed on the page.
+
+    ``scope_key`` describes the same scope as a facet, e.g.
+    ``("category", [3])``; with it, and the bitmap index enabled, filtering
+    and counts come from the in-memory index instead (see facets.py).
+
+    ``rank`` wraps the filtered queryset for the default order when no sort
+    is picked, e.g. search relevance (see search.ranked_listings).
+    """
+    from .facets import facet_index_enabled, get_facet_index
+
+    if scope_key and facet_index_enabled() and _index_supports(filters):
+        products, brands, colors, discount_data = _bitmap_facets(get_facet_index(), scope, filters, scope_key)
+    else:
+        products, brands, colors, discount_data = _orm_facets(scope, filters)
+
+    ordering = SORT_ORDERING.get(filters["selected_sort"])
+    if not ordering and rank:
+        # Best match first, ranked one page at a time (search.ranked_listings)
+        products = rank(products)
+    else:
+        # No sort picked: newest first, the same on the ORM and bitmap paths
+        ordering = ordering or DEFAULT_ORDERING
+        products = products.order_by(*ordering)
+
+    if filters["paging"] == "cursor" and ordering:
+        # Seek on the sort keys: no COUNT(*) and no OFFSET scan
+        page_obj = keyset_page(products, ordering, filters["per_page"], filters["cursor"])
+    else:
+        paginator = Paginator(products, filters["per_page"])
+        page_obj = paginator.get_page(filters["page"])
+
+    return {
+        "products": page_obj,
+        "page_obj": page_obj,
+        "brands": brands,
+        "colors": colors,
+        "sizes": Size.objects.all(),
+        "discount_ranges": DISCOUNT_RANGES,
+        "discount_data": discount_data,
+    }
+
+
+def _orm_facets(scope, filters):
+    conditions = _variation_conditions(filters)
+
+    # Products matching every filter except the discount bucket
+    # (used for the counts, same as the old products_before_discount).
+    facet_ids = _matching_products(scope.values("product_id"), conditions)
+
+    page_ids = facet_ids
+    selected_discount = _selected_discount(filters)
+    if selected_discount is not None:
+        start, end = discount_bounds(selected_discount)
+        page_ids = _matching_products(page_ids, [Q(discount_price__gte=start, discount_price__lte=end)])
+
+    products = scope
+    if filters_active(filters):
+        products = products.filter(product_id__in=page_ids)
+
+    # ----------------- FACET COUNTS -----------------
+    # Products of the current result per brand / color / discount bucket
+    brands = Brand.objects.annotate(
+        product_count=Count(
+            "variation__product",
+            filter=Q(variation__product_id__in=facet_ids),
+            distinct=True,
+        )
+    )
+    colors = Color.objects.annotate(
+        product_count=Count(
+            "variation__product",
+            filter=Q(variation__product_id__in=facet_ids),
+            distinct=True,
+        )
+    )
+
+    facet_variations = Variation.objects.filter(product_id__in=facet_ids)
+    discount_data = histogram(facet_variations, "discount_price", DISCOUNT_BUCKETS, count="product")
+    return products, brands, colors, discount_data
+
+
+def _index_supports(filters):
+    """
+    The bitmap index only knows the price buckets, not arbitrary min/max
+    prices; keyset (cursor) pages seek in SQL, so they stay on the ORM path.
+    """
+    if filters["paging"] == "cursor":
+        return False
+    if not (filters["min_price"] or filters["max_price"]):
+        return True
+    bucket = PRICE_RANGE_MAPPING.get(filters["price_range"])
+    return bucket is not None and (filters["min_price"], filters["max_price"] or None) == bucket
+
+
+def _bitmap_facets(index, scope, filters, scope_key):
+    from .facets import BitmapListings
+
+    facet, values = scope_key
+    bits = index.union(facet, values)
+
+    if filters["selected_brand_ids"]:
+        bits &= index.union("brand", filters["selected_brand_ids"])
+    if filters["selected_color_ids"]:
+        bits &= index.union("color", filters["selected_color_ids"])
+    if filters["selected_size"]:
+        bits &= index.union("size", [filters["selected_size"]])
+    if filters["top_color"]:
+        bits &= index.union("color", [filters["top_color"]])
+    if filters["min_price"] or filters["max_price"]:
+        bits &= index.union("price", [filters["price_range"]])
+
+    page_bits = bits
+    selected_discount = _selected_discount(filters)
+    if selected_discount is not None:
+        page_bits &= index.union("discount", [selected_discount])
+
+    products = scope
+    if filters_active(filters):
+        # Paged on the bitmap itself; only one page of ids reaches the database
+        products = BitmapListings(scope, index, page_bits)
+
+    # Counts are popcounts of each facet bitmap within the current result
+    brands = list(Brand.objects.all())
+    for brand in brands:
+        brand.product_count = index.count("brand", brand.id, bits)
+    colors = list(Color.objects.all())
+    for color in colors:
+        color.product_count = index.count("color", color.id, bits)
+    discount_data = [
+        {"value": value, "count": index.count("discount", value, bits)}
+        for value, start, end in DISCOUNT_BUCKETS
+    ]
+    return products, brands, colors, discount_data
+
+
+# ===========================
+# Listing result cache
+# ===========================
+def listing_cache_key(scope_key, filters):
+    """Cache key of one filter combination inside one (versioned) scope."""
+    from .facets import facet_index_enabled
+
+    kind, values = scope_key
+    values = sorted({str(v) for v in values})
+    bitmap = facet_index_enabled()
+    # The bitmap path reads the index, which is published on its own commit
+    # callback: a result from the old index must not outlive it
+    versions = get_versions([listing_scope(kind, v) for v in values] + ([FACETS] if bitmap else []))
+    spec = {
+        "scope": [kind, values, [versions[listing_scope(kind, v)] for v in values]],
+        "brand": sorted(filters["selected_brand_ids"]),
+        "color": sorted(filters["selected_color_ids"]),
+        "size": filters["selected_size"],
+        "top_color": filters["top_color"],
+        "price": [str(filters["min_price"]), str(filters["max_price"])],
+        "discount": filters["selected_discount"],
+        "sort": filters["selected_sort"],
+        "page": filters["page"] or "",
+        "per_page": filters["per_page"],
+        "paging": filters["paging"],
+        "cursor": filters["cursor"],
+        "bitmap": versions[FACETS] if bitmap else False,
+    }
+    digest = hashlib.md5(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+    return f"shopingo:listing:{digest}"
+
+
+def _freeze_listing(result):
+    page = result["page_obj"]
+    frozen = {
+        "ids": [row.product_id for row in page],
+        "brands": {brand.id: brand.product_count for brand in result["brands"]},
+        "colors": {color.id: color.product_count for color in result["colors"]},
+        "discount_data": result["discount_data"],
+    }
+    if isinstance(page, CursorPage):
+        frozen["cursor_page"] = (page.next_cursor, page.previous_cursor, page.estimated_count)
+    else:
+        frozen["page"] = (page.number, page.paginator.count)
+    return frozen
+
+
+def _thaw_listing(frozen, filters):
+    rows = ProductListing.objects.in_bulk(frozen["ids"])
+    rows = [rows[pid] for pid in frozen["ids"] if pid in rows]
+
+    if "cursor_page" in frozen:
+        page_obj = CursorPage(rows, *frozen["cursor_page"])
+    else:
+        number, count = frozen["page"]
+        page_obj = Page(rows, number, CountedPaginator(count, filters["per_page"]))
+
+    brands = list(Brand.objects.all())
+    for brand in brands:
+        brand.product_count = frozen["brands"].get(brand.id, 0)
+    colors = list(Color.objects.all())
+    for color in colors:
+        color.product_count = frozen["colors"].get(color.id, 0)
+
+    return {
+        "products": page_obj,
+        "page_obj": page_obj,
+        "brands": brands,
+        "colors": colors,
+        "sizes": Size.objects.all(),
+        "discount_ranges": DISCOUNT_RANGES,
+        "discount_data": frozen["discount_data"],
+    }
+
+
+def invalidate_listings(category_ids=(), subcategory_ids=(), tag_ids=()):
+    """Bump the listing versions of the given scopes (None ids are skipped)."""
+    for kind, ids in (("category", category_ids), ("subcategory", subcategory_ids), ("tag", tag_ids)):
+        for value in set(ids):
+            if value is not None:
+                bump_version(listing_scope(kind, value))
+
+
+def invalidate_product_listings(product_id):
+    """Bump every listing scope ``product_id`` appears in."""
+    product = Product.objects.filter(id=product_id).values_list("category_id", "subcategory_id").first()
+    if product is None:
+        return
+    invalidate_listings(
+        category_ids=[product[0]],
+        subcategory_ids=[product[1]],
+        tag_ids=ProductTag.objects.filter(product_id=product_id).values_list("tag_id", flat=True),
+    )
+
+
+def listing_context(scope, filters, view_type, scope_key=None, rank=None):
+    """Full template context for a listing view: results, facets and filter state."""
+    context = dict(filters)
+    context.pop("page")
+    context.pop("cursor")
+    context.update(run_listing(scope, filters, scope_key, rank))
+    page_obj = context["page_obj"]
+    if not isinstance(page_obj, CursorPage):
+        context["page_range"] = page_obj.paginator.get_elided_page_range(page_obj.number)
+    context["per_page_list"] = PER_PAGE_LIST
+    context["view_type"] = view_type
+    return context
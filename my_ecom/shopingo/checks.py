@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from .versions import cache_is_shared
+
+
+# ===========================
+# System checks
+# ===========================
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Cache versions (versions.py) are bumped by whichever process writes: a
+    web worker saving in the admin, a cron command rebuilding a snapshot.
+    On a process-local backend the other workers never see those bumps and
+    keep serving navigation, geography, typeahead and cart summaries from
+    before the write. One development server is fine, so this only warns
+    with DEBUG off.
+    """
+    if settings.DEBUG or cache_is_shared():
+        return []
+    return [
+        Warning(
+            "CACHES['default'] is process-local, so cache versions bumped by one "
+            "process are not seen by the others.",
+            hint="Use a shared backend (Redis, Memcached or the database cache) when "
+                 "running more than one worker, see CACHES in settings.py.",
+            id="shopingo.W001",
+        )
+    ]
@@ -0,0 +1,78 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .guest_cart import GUEST_CART_COOKIE
+from .versions import changed_at, get_versions
+
+
+# ===========================
+# Conditional GET (ETag / Last-Modified -> 304)
+# ===========================
+# Pages are validated against cache versions instead of being rendered:
+# the ETag is a hash of the versions the page depends on, Last-Modified
+# the latest of their bump times. Only anonymous visitors without pending
+# flash messages qualify, since logged-in pages carry the user's cart.
+# The CSRF cookie is part of the ETag, so a 304 never hands back a page
+# whose form token belongs to an older cookie; so is the guest cart cookie,
+# whose lines the header mini-cart shows. A page with a guest cart sends no
+# Last-Modified, which could not see the cart change.
+
+def _cacheable(request, anonymous_only):
+    if anonymous_only and request.user.is_authenticated:
+        return False
+    return "messages" not in request.COOKIES
+
+
+def versioned_condition(version_names, last_modified=None, anonymous_only=True, page=True):
+    """
+    ``@condition`` keyed on cache versions.
+
+    ``version_names`` is a list of version names or a function
+    ``(request, *args, **kwargs) -> names`` (None to skip). ``last_modified``
+    optionally adds a per-object timestamp, e.g. a product's updated_at.
+    JSON endpoints (no form, no mini-cart) pass ``page=False``.
+    """
+    def names_for(request, *args, **kwargs):
+        if not _cacheable(request, anonymous_only):
+            return None
+        if callable(version_names):
+            return version_names(request, *args, **kwargs)
+        return version_names
+
+    def etag_func(request, *args, **kwargs):
+        names = names_for(request, *args, **kwargs)
+        if names is None:
+            return None
+        versions = get_versions(names)
+        raw = "|".join(f"{name}={versions[name]}" for name in names)
+        if page:
+            raw += "|" + request.COOKIES.get(settings.CSRF_COOKIE_NAME, "")
+            raw += "|" + request.COOKIES.get(GUEST_CART_COOKIE, "")
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified_func(request, *args, **kwargs):
+        names = names_for(request, *args, **kwargs)
+        if names is None or (page and GUEST_CART_COOKIE in request.COOKIES):
+            return None
+        stamps = [changed_at(name) for name in names]
+        if last_modified is not None:
+            stamps.append(last_modified(request, *args, **kwargs))
+        stamps = [stamp for stamp in stamps if stamp is not None]
+        return max(stamps) if stamps else None
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.has_header("ETag"):
+                # Always revalidate; never reuse without asking
+                patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -1,50 +1,69 @@
 from django.shortcuts import render
 from .models import *
 from django.shortcuts import get_object_or_404, render
-from accounts.models import CountryName
 from decimal import Decimal
 from django.utils import timezone
+from .carts import build_cart_lines, get_cart_lines
+from .guest_cart import build_guest_cart_lines, read_guest_cart
+from .geography import get_geography
+from .navigation import get_navigation
 
 def global_categories(request):
-    categories = Category.objects.prefetch_related('subcategories').all()
-    tag = Tag.objects.all()
-    personal_info = PersonalInfo.objects.last()
+    # Built once per process, rebuilt when the navigation version moves (shopingo/navigation.py)
+    return get_navigation()
 
 
 
-    return {
-        'categories': categories,
-        'tags': tag,
-        'personal_info': personal_info,
-        }
 
+# ---- Cart (lazy) ----
+# cart_context runs on every render, but most pages never show the cart.
+# The processor hands the template zero-argument callables (templates call
+# them on lookup), so nothing is queried until a template touches a key.
+# Results are kept on the request: the template, and views that need the
+# totals, share one computation per request.
+#
+# The mini-cart (items, count, subtotal) comes from the per-user cached
+# summary (shopingo/carts.py): no cart query while browsing; visitors' from
+# the guest cart cookie (shopingo/guest_cart.py). Totals that
+# turn into money (shipping, coupon, order total) are built from the Cart
+# rows themselves, and the page then shows those same rows.
 
+LINE_KEYS = ['cart_items_base', 'cart_total_items', 'cart_subtotal']
+TOTAL_KEYS = ['cart_shipping', 'cart_coupon_discount', 'cart_order_total']
 
 
-def cart_context(request):
-    country_name = CountryName.objects.all()
-    shipping_charge_obj = ShippingCharge.objects.first()
-    shipping_charge = shipping_charge_obj.charge_amount if shipping_charge_obj else Decimal("0.00")
+def _shipping_charge(request):
+    if not hasattr(request, '_shipping_charge'):
+        request._shipping_charge = ShippingCharge.objects.first()
+    return request._shipping_charge
 
-    if request.user.is_authenticated:
-        cart_items = Cart.objects.filter(user=request.user).select_related('product')
 
-        total_items = 0
-        subtotal = Decimal("0.00")
-        cart_items_with_total = []
+def cart_lines(request, fresh=False):
+    """Cart lines of this request: cached summary, or read from the rows when ``fresh``."""
+    if getattr(request, '_cart_lines_fresh', False) or (not fresh and hasattr(request, '_cart_lines')):
+        return request._cart_lines
+    if not request.user.is_authenticated:
+        # Visitors: lines from the guest cart cookie (shopingo/guest_cart.py)
+        lines = build_guest_cart_lines(read_guest_cart(request))
+    elif fresh:
+        lines = build_cart_lines(request.user.id)
+    else:
+        lines = get_cart_lines(request.user.id)
+    request._cart_lines, request._cart_lines_fresh = lines, fresh
+    return lines
 
-        for item in cart_items:
-            item_total = Decimal(item.quantity) * Decimal(item.product.orginal_price)
-            total_items += item.quantity
-            subtotal += item_total
-            cart_items_with_total.append({
-                'item': item,
-                'item_total': item_total,
-            })
+
+def build_cart_summary(request):
+    lines = cart_lines(request, fresh=True)
+    subtotal = lines['cart_subtotal']
+
+    if request.user.is_authenticated:
+        shipping_charge_obj = _shipping_charge(request)
+        shipping_charge = shipping_charge_obj.charge_amount if shipping_charge_obj else Decimal("0.00")
 
         # ---------- Shipping ----------
         if subtotal >= 100:
-            shipping = shipping_charge  # তোমার সেটিং অনুযায়ী
+            shipping = shipping_charge  # তোমার সেটিং অনুযায়ী
         else:
             shipping = shipping_charge
 
@@ -66,20 +85,34 @@ def cart_context(request):
         order_total = (subtotal + shipping) - coupon_discount
 
     else:
-        cart_items_with_total = []
-        total_items = 0
-        subtotal = Decimal("0.00")
         shipping = Decimal("0.00")
         coupon_discount = Decimal("0.00")
         order_total = Decimal("0.00")
 
     return {
-        'cart_items_base': cart_items_with_total,
-        'cart_total_items': total_items,
-        'cart_subtotal': subtotal,
+        **lines,
         'cart_shipping': shipping,
         'cart_coupon_discount': coupon_discount,
         'cart_order_total': order_total,
-        'country_name': country_name,
-        'shipping_charges': shipping_charge_obj,
-    }
\ No newline at end of file
+    }
+
+
+def cart_summary(request):
+    """Cart totals of this request, computed on first use and then reused."""
+    if not hasattr(request, '_cart_summary'):
+        request._cart_summary = build_cart_summary(request)
+    return request._cart_summary
+
+
+def _lazy(function, request, key):
+    return lambda: function(request)[key]
+
+
+def cart_context(request):
+    context = {key: _lazy(cart_lines, request, key) for key in LINE_KEYS}
+    context.update({key: _lazy(cart_summary, request, key) for key in TOTAL_KEYS})
+    # The shipping row and the countries don't need the cart
+    context['shipping_charges'] = lambda: _shipping_charge(request)
+    # Countries come from the in-memory geography tree (shopingo/geography.py)
+    context['country_name'] = lambda: get_geography().countries
+    return context
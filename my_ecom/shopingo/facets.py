@@ -0,0 +1,290 @@
+import heapq
+import threading
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .catalog import DISCOUNT_BUCKETS, PRICE_BUCKETS
+from .models import Product, ProductTag, Variation
+from .versions import FACETS, bump_version, get_version
+
+
+# Changes older than this many versions trigger a full rebuild instead of a replay
+MAX_REPLAY = 500
+CHANGE_TIMEOUT = 60 * 60
+
+
+def facet_index_enabled():
+    """The bitmap index is opt-in: settings.SHOPINGO_FACET_INDEX = True."""
+    return getattr(settings, "SHOPINGO_FACET_INDEX", False)
+
+
+def _in_bucket(value, start, end):
+    return (start is None or value >= start) and (end is None or value <= end)
+
+
+# ===========================
+# Bitmap index
+# ===========================
+class FacetIndex:
+    """
+    Facet value -> bitmap of product ids.
+
+    A bitmap is a plain Python int with bit ``product_id`` set, so filtering
+    is ``&``/``|`` on ints and a facet count is ``bit_count()`` of the facet
+    bitmap and the current result. Keys are (facet, value) pairs: brand,
+    color, size, category, subcategory, tag, price and discount buckets.
+
+    Filters work at product level: a product matches "brand A + color red"
+    when it has any variation of brand A and any variation in red.
+    """
+
+    def __init__(self):
+        self.bitmaps = defaultdict(int)
+        self.product_keys = {}
+        self.prices = {}  # product id -> listing price, for the price sorts
+        self.all = 0
+
+    def copy(self):
+        """Independent copy to apply changes to while readers keep using this one."""
+        index = FacetIndex()
+        index.bitmaps = defaultdict(int, self.bitmaps)
+        index.product_keys = dict(self.product_keys)
+        index.prices = dict(self.prices)
+        index.all = self.all
+        return index
+
+    # -------- building --------
+    def set_product(self, product_id, keys, price):
+        self.remove_product(product_id)
+        bit = 1 << product_id
+        for key in keys:
+            self.bitmaps[key] |= bit
+        self.product_keys[product_id] = keys
+        self.prices[product_id] = price
+        self.all |= bit
+
+    def remove_product(self, product_id):
+        keys = self.product_keys.pop(product_id, None)
+        if keys is None:
+            return
+        mask = ~(1 << product_id)
+        for key in keys:
+            self.bitmaps[key] &= mask
+        del self.prices[product_id]
+        self.all &= mask
+
+    # -------- querying --------
+    def union(self, facet, values):
+        bits = 0
+        for value in values:
+            bits |= self.bitmaps.get((facet, _coerce(value)), 0)
+        return bits
+
+    def count(self, facet, value, bits):
+        return (self.bitmaps.get((facet, value), 0) & bits).bit_count()
+
+    @staticmethod
+    def ids(bits, reverse=False):
+        """Set bit positions, i.e. product ids, ascending (or descending); one pass over the bytes."""
+        data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+        offsets = range(len(data) - 1, -1, -1) if reverse else range(len(data))
+        for offset in offsets:
+            byte = data[offset]
+            if byte:
+                base = offset * 8
+                positions = _BYTE_BITS[byte]
+                for position in (reversed(positions) if reverse else positions):
+                    yield base + position
+
+    def page_ids(self, bits, ordering, start, stop):
+        """
+        Product ids ``start:stop`` of ``bits`` in a SORT_ORDERING ordering
+        (None: ascending id, like an unordered listing query).
+        """
+        if not ordering or ordering == ("product_id",):
+            return list(islice(self.ids(bits), start, stop))
+        if ordering == ("-product_id",):
+            return list(islice(self.ids(bits, reverse=True), start, stop))
+        if ordering == ("price", "product_id"):
+            return heapq.nsmallest(stop, self.ids(bits), key=lambda pid: (self.prices[pid], pid))[start:]
+        if ordering == ("-price", "-product_id"):
+            return heapq.nlargest(stop, self.ids(bits), key=lambda pid: (self.prices[pid], pid))[start:]
+        raise ValueError(f"Unsupported ordering: {ordering}")
+
+
+# Set bit positions of every byte value
+_BYTE_BITS = [tuple(i for i in range(8) if byte >> i & 1) for byte in range(256)]
+
+
+class BitmapListings:
+    """
+    The filtered listing as Paginator sees it: ``count()`` is a popcount
+    and a slice picks that page's ids straight from the bitmap (in the sort
+    order), then loads only those rows. No id list is ever sent to the
+    database, so a result of any size stays one small ``IN`` query.
+    """
+
+    def __init__(self, scope, index, bits, ordering=None):
+        self.scope = scope
+        self.index = index
+        self.bits = bits
+        self.ordering = ordering
+
+    def order_by(self, *ordering):
+        return BitmapListings(self.scope, self.index, self.bits, tuple(ordering))
+
+    def count(self):
+        return self.bits.bit_count()
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        if stop <= start:
+            return []
+        ids = self.index.page_ids(self.bits, self.ordering, start, stop)
+        rows = self.scope.in_bulk(ids)
+        return [rows[pid] for pid in ids if pid in rows]
+
+
+def _coerce(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _variation_keys(brand_id, color_id, size_id, discount_price):
+    keys = {("brand", brand_id), ("color", color_id), ("size", size_id)}
+    for value, start, end in PRICE_BUCKETS:
+        if _in_bucket(discount_price, start, end):
+            keys.add(("price", value))
+    for value, start, end in DISCOUNT_BUCKETS:
+        if _in_bucket(discount_price, start, end):
+            keys.add(("discount", value))
+    return keys
+
+
+def build_index():
+    """Full build: three streaming queries, no per-product lookups."""
+    keys = defaultdict(set)
+    prices = {}
+    for product_id, category_id, subcategory_id, price in Product.objects.values_list("id", "category_id", "subcategory_id", "price").iterator():
+        prices[product_id] = price
+        keys[product_id].add(("category", category_id))
+        if subcategory_id:
+            keys[product_id].add(("subcategory", subcategory_id))
+    for row in Variation.objects.values_list("product_id", "brand_id", "color_id", "size_id", "discount_price").iterator():
+        if row[0] in keys:
+            keys[row[0]] |= _variation_keys(*row[1:])
+    for product_id, tag_id in ProductTag.objects.filter(product__isnull=False, tag__isnull=False).values_list("product_id", "tag_id").iterator():
+        if product_id in keys:
+            keys[product_id].add(("tag", tag_id))
+
+    index = FacetIndex()
+    for product_id, product_keys in keys.items():
+        index.set_product(product_id, product_keys, prices[product_id])
+    return index
+
+
+def product_keys(product_id):
+    """(facet keys, price) of one product from the database, or None if it is gone."""
+    product = Product.objects.filter(id=product_id).values_list("category_id", "subcategory_id", "price").first()
+    if product is None:
+        return None
+    keys = {("category", product[0])}
+    if product[1]:
+        keys.add(("subcategory", product[1]))
+    for row in Variation.objects.filter(product_id=product_id).values_list("brand_id", "color_id", "size_id", "discount_price"):
+        keys |= _variation_keys(*row)
+    for tag_id in ProductTag.objects.filter(product_id=product_id, tag__isnull=False).values_list("tag_id", flat=True):
+        keys.add(("tag", tag_id))
+    return keys, product[2]
+
+
+def refresh_product(index, product_id):
+    found = product_keys(product_id)
+    if found is None:
+        index.remove_product(product_id)
+    else:
+        index.set_product(product_id, *found)
+
+
+# ===========================
+# Change log + process-local copy
+# ===========================
+# Writers log changed product ids; when their transaction commits, all of
+# them go out as one FACETS version (one bump, one log entry with the ids).
+# Every process replays the versions it has not seen yet (incremental) on a
+# copy of its index and swaps it in, and rebuilds from scratch only if it
+# fell too far behind or a log entry was evicted.
+
+def _change_key(version):
+    return f"shopingo:facets:change:{version}"
+
+
+_pending = threading.local()
+
+
+def record_change(product_id):
+    """Log ``product_id`` as changed, published once the current transaction commits."""
+    if not hasattr(_pending, "ids"):
+        _pending.ids = set()
+    _pending.ids.add(product_id)
+    # Every write registers a callback; the first one after the commit
+    # publishes the whole set, the rest find it empty. Ids left over from a
+    # rolled back transaction just get refreshed once more.
+    transaction.on_commit(_publish_changes)
+
+
+def _publish_changes():
+    ids = getattr(_pending, "ids", None)
+    if not ids:
+        return
+    _pending.ids = set()
+    # Already after the commit: one version, and its log entry, per transaction
+    version = bump_version(FACETS, again_on_commit=False)
+    cache.set(_change_key(version), sorted(ids), CHANGE_TIMEOUT)
+
+
+_lock = threading.Lock()
+# (version, FacetIndex), replaced as a whole so readers never see a half-applied change
+_built = (None, None)
+
+
+def get_facet_index():
+    global _built
+    version = get_version(FACETS)
+    built_version, index = _built
+    if index is not None and built_version == version:
+        return index
+
+    with _lock:
+        built_version, index = _built
+        if index is not None and built_version == version:
+            return index
+
+        if index is not None and 0 < version - built_version <= MAX_REPLAY:
+            missing = range(built_version + 1, version + 1)
+            changes = cache.get_many([_change_key(v) for v in missing])
+            if len(changes) == len(missing):
+                index = index.copy()
+                for product_id in {pid for ids in changes.values() for pid in ids}:
+                    refresh_product(index, product_id)
+                _built = (version, index)
+                return index
+
+        index = build_index()
+        _built = (version, index)
+        return index
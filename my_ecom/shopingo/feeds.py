@@ -0,0 +1,130 @@
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from .catalog import top_k_per_group
+from .models import Category, Product, ProductListing, ProductSalesStats, Tag
+from .versions import CATALOG, get_version
+
+
+# Best sellers / top rated move with orders and wishlists, not with catalog
+# writes, so the snapshot is also rebuilt at least this often.
+HOME_FEED_TIMEOUT = 60 * 10
+
+MAIN_TAGS = ["Men Wear", "Women Wear", "Kids Wear"]
+
+# Cards fetched per category for the carousel
+CAROUSEL_PRODUCTS = 1
+
+
+def _key(version):
+    return f"shopingo:home_feed:{version}"
+
+
+# ===========================
+# Snapshot
+# ===========================
+def best_sellers(limit, field="units_sold"):
+    """
+    Top ``limit`` cards by ProductSalesStats ``field`` (units_sold, units_7d,
+    units_30d), topped up with the newest products while fewer have sold.
+    """
+    ids = list(
+        ProductSalesStats.objects.filter(**{f"{field}__gt": 0})
+        .order_by(f"-{field}", "-product_id")
+        .values_list("product_id", flat=True)[:limit]
+    )
+    return _cards(ids, limit)
+
+
+def top_rated(limit):
+    """Top ``limit`` cards by the maintained Product.wishlist_count (indexed)."""
+    ids = list(
+        Product.objects.filter(wishlist_count__gt=0)
+        .order_by("-wishlist_count", "-id")
+        .values_list("id", flat=True)[:limit]
+    )
+    return _cards(ids, limit)
+
+
+def _cards(ids, limit):
+    """Listing cards of ``ids`` in order, topped up with the newest products."""
+    cards = ProductListing.objects.in_bulk(ids)
+    result = [cards[pid] for pid in ids if pid in cards]
+    if len(result) < limit:
+        result += ProductListing.objects.exclude(product_id__in=ids).order_by("-product_id")[:limit - len(result)]
+    return result
+
+
+def build_home_feed():
+    """
+    Everything index.html shows, as plain lists of ProductListing cards.
+
+    The snapshot is pickled into the cache as is, so rendering it needs no
+    further query (cards carry their image, category name and prices).
+    """
+    tag_data = []
+    for tag_name in MAIN_TAGS:
+        tag = Tag.objects.filter(name__iexact=tag_name).first()
+
+        if not tag:
+            tag = Tag.objects.exclude(name__in=MAIN_TAGS).first()
+
+        if tag:
+            product = (
+                ProductListing.objects.filter(product__tags__tag=tag)
+                .order_by("price")
+                .first()
+            )
+            tag_data.append({"tag": tag, "product": product})
+
+    featured_products = list(ProductListing.objects.filter(is_featured=True)[:10])
+    new_arrivals = list(ProductListing.objects.order_by("-created_at")[:10])
+
+    # Category carousel: the first CAROUSEL_PRODUCTS cards of each category
+    # (top-K query, never every product), cover = the first card's image
+    carousel_categories = list(
+        Category.objects
+        .annotate(product_count=Count("products"))
+        .filter(product_count__gt=0)
+    )
+    top_products = top_k_per_group(ProductListing.objects.all(), "category_id", CAROUSEL_PRODUCTS, ["product_id"])
+    for category in carousel_categories:
+        category.top_products = top_products.get(category.id, [])
+        cover = category.top_products[0].image if category.top_products else None
+        category.cover_url = cover.url if cover else ""
+
+    best_selling_products = best_sellers(4)
+    top_rated_products = top_rated(4)
+
+    return {
+        "tag_data": tag_data,
+        "featured_products": featured_products,
+        "new_arrivals": new_arrivals,
+        # Not "categories": that is the header / footer menu (global_categories)
+        "carousel_categories": carousel_categories,
+
+        # bottom lists
+        "best_selling_products": best_selling_products,
+        "bottom_featured_products": featured_products[:4],
+        "bottom_new_arrivals": new_arrivals[:4],
+        "top_rated_products": top_rated_products,
+        "built_at": timezone.now(),
+    }
+
+
+def rebuild_home_feed():
+    """Build the snapshot for the current catalog version and store it."""
+    # Version first: a write during the build leaves this snapshot behind
+    version = get_version(CATALOG)
+    feed = build_home_feed()
+    cache.set(_key(version), feed, HOME_FEED_TIMEOUT)
+    return feed
+
+
+def get_home_feed():
+    """The current snapshot: two cache reads on a hit, a rebuild on a miss."""
+    feed = cache.get(_key(get_version(CATALOG)))
+    if feed is None:
+        feed = rebuild_home_feed()
+    return feed
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .models import Product
+from .variants import variation_context
+from .versions import VARIATION_LABELS, get_versions, product_content
+
+
+QUICK_VIEW_TEMPLATE = "partials/quick_view_content.html"
+QUICK_VIEW_TIMEOUT = 60 * 60
+
+# Most slugs one batch request may ask for
+MAX_BATCH = 24
+
+
+# ===========================
+# Quick view fragment
+# ===========================
+# The fragment holds nothing per user (the CSRF field is filled in by the
+# page's own JS), so one rendered copy per product content version serves
+# everyone, and the version doubles as the ETag.
+
+def _names(product_id):
+    return [product_content(product_id), VARIATION_LABELS]
+
+
+def _tag(product_id, versions):
+    return f"qv-{product_id}-" + "-".join(str(versions[name]) for name in _names(product_id))
+
+
+def _key(tag):
+    return f"shopingo:fragment:{tag}"
+
+
+def quick_view_etag(product_id):
+    """ETag of the current fragment, without rendering it."""
+    return _tag(product_id, get_versions(_names(product_id)))
+
+
+def render_quick_view(product):
+    return render_to_string(QUICK_VIEW_TEMPLATE, {"product": product, **variation_context(product.id)})
+
+
+def quick_view_html(product):
+    key = _key(quick_view_etag(product.id))
+    html = cache.get(key)
+    if html is None:
+        html = render_quick_view(product)
+        cache.set(key, html, QUICK_VIEW_TIMEOUT)
+    return html
+
+
+def quick_view_batch(slugs):
+    """
+    ``{slug: html}`` for up to MAX_BATCH slugs: one query for the ids, one
+    cache round trip for every fragment, and one query (plus images) for
+    the products that still need rendering. Unknown slugs are left out.
+    """
+    ids = dict(Product.objects.filter(slug__in=list(slugs)[:MAX_BATCH]).values_list("id", "slug"))
+    versions = get_versions([name for product_id in ids for name in _names(product_id)])
+    keys = {product_id: _key(_tag(product_id, versions)) for product_id in ids}
+    found = cache.get_many(list(keys.values()))
+
+    fragments = {ids[product_id]: found[key] for product_id, key in keys.items() if key in found}
+    missing = [product_id for product_id in ids if keys[product_id] not in found]
+    rendered = {}
+    for product in Product.objects.filter(id__in=missing).prefetch_related("images"):
+        html = render_quick_view(product)
+        rendered[keys[product.id]] = html
+        fragments[product.slug] = html
+    if rendered:
+        cache.set_many(rendered, QUICK_VIEW_TIMEOUT)
+    return fragments
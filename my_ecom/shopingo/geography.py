@@ -0,0 +1,256 @@
+import json
+
+from django.db import transaction
+
+from accounts.models import CountryName, District, Division
+
+from .versions import GEOGRAPHY, bump_version, get_version
+
+
+# ===========================
+# Country -> division -> district tree
+# ===========================
+# Address forms only ever read these three small tables, so each process
+# keeps the whole tree in memory, checked against the shared GEOGRAPHY
+# version (bumped by any write, see signals). The same tree is served as
+# one JSON document under a versioned URL, which browsers may keep for good:
+# a write changes the version, and so the URL.
+
+# (version, tree), swapped in one assignment so a reader never pairs a
+# version with another build's tree
+_built = (None, None)
+
+
+class GeographyTree:
+    """
+    One built copy of the three tables.
+
+    ``document`` is the JSON served to browsers, with rows as compact
+    ``[id, name]`` pairs keyed by parent id:
+    ``{"countries": [...], "divisions": {country_id: [...]}, "districts": {division_id: [...]}}``.
+    """
+
+    def __init__(self, version, countries, divisions, districts):
+        self.version = version
+        self.countries = countries
+        self.divisions = divisions
+        self.districts = districts
+        self.country_names = {country.id: country.nameName for country in countries}
+        self.division_names = {row[0]: row[1] for rows in divisions.values() for row in rows}
+        self.district_names = {row[0]: row[1] for rows in districts.values() for row in rows}
+        self.document = json.dumps({
+            "version": version,
+            "countries": [[country.id, country.nameName] for country in countries],
+            "divisions": divisions,
+            "districts": districts,
+        }, separators=(",", ":"))
+
+    def country_name(self, country_id):
+        return self.country_names.get(_int(country_id))
+
+    def division_name(self, division_id):
+        return self.division_names.get(_int(division_id))
+
+    def district_name(self, district_id):
+        return self.district_names.get(_int(district_id))
+
+    def divisions_of(self, country_id):
+        return [{"id": id, "division_name": name} for id, name in self.divisions.get(_int(country_id), [])]
+
+    def districts_of(self, division_id):
+        return [{"id": id, "district_name": name} for id, name in self.districts.get(_int(division_id), [])]
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def build_geography(version):
+    """Three queries, rows in each model's Meta.ordering."""
+    countries = list(CountryName.objects.all())
+    divisions, districts = {}, {}
+    for id, country_id, name in Division.objects.values_list("id", "country_id", "division_name"):
+        divisions.setdefault(country_id, []).append([id, name])
+    for id, division_id, name in District.objects.values_list("id", "division_id", "district_name"):
+        districts.setdefault(division_id, []).append([id, name])
+    return GeographyTree(version, countries, divisions, districts)
+
+
+def get_geography():
+    global _built
+    version = get_version(GEOGRAPHY)
+    built_version, tree = _built
+    if built_version != version:
+        tree = build_geography(version)
+        _built = (version, tree)
+    return tree
+
+
+# ===========================
+# Bulk import
+# ===========================
+# Countries, divisions and districts stream in as (country, division,
+# district) rows; division / district may be empty. Rows are buffered and
+# written with bulk_create(ignore_conflicts=True), so re-importing a file
+# (or one that overlaps what is there) only adds what is missing. Parents
+# are resolved through name -> id maps: loaded once for what exists, then
+# extended with one query per flushed batch.
+
+IMPORT_BATCH_SIZE = 2000
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(stream, chunk_size=READ_CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array, reading ``stream`` in chunks."""
+    decoder = json.JSONDecoder()
+    buffer, pos, started = "", 0, False
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                started, pos = True, pos + 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break  # element continues in the next chunk
+            if end == len(buffer) and chunk:
+                break  # a number may go on in the next chunk
+            yield item
+            pos = end
+        if not chunk:
+            raise ValueError("Unterminated JSON array")
+
+
+def _clean(value):
+    return (value or "").strip()
+
+
+def json_rows(items):
+    """
+    (country, division, district) rows of JSON items. An item is a country
+    name, ``{"name": ...}`` (the old countries file), a flat
+    ``{"country": ..., "division": ..., "district": ...}`` row, or nested:
+    ``{"name": ..., "divisions": [{"name": ..., "districts": [name, ...]}]}``.
+    """
+    for item in items:
+        if isinstance(item, str):
+            yield _clean(item), "", ""
+        elif "country" in item:
+            yield _clean(item["country"]), _clean(item.get("division")), _clean(item.get("district"))
+        else:
+            country = _clean(item.get("name"))
+            yield country, "", ""
+            for division in item.get("divisions") or []:
+                division_name = _clean(division if isinstance(division, str) else division.get("name"))
+                yield country, division_name, ""
+                for district in (division.get("districts") or []) if isinstance(division, dict) else []:
+                    yield country, division_name, _clean(district if isinstance(district, str) else district.get("name"))
+
+
+def csv_rows(reader):
+    """(country, division, district) rows of a csv.DictReader (country, division, district columns)."""
+    for row in reader:
+        yield _clean(row.get("country")), _clean(row.get("division")), _clean(row.get("district"))
+
+
+class GeographyImporter:
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.countries = dict(CountryName.objects.values_list("nameName", "id"))
+        self.divisions = {
+            (country_id, name): id
+            for id, country_id, name in Division.objects.values_list("id", "country_id", "division_name")
+        }
+        # Pending rows, unique per batch: names until their parents have ids
+        self.new_countries = set()
+        self.new_divisions = set()   # (country name, division name)
+        self.new_districts = set()   # (country name, division name, district name)
+
+    def add(self, country, division="", district=""):
+        if not country:
+            return
+        if country not in self.countries:
+            self.new_countries.add(country)
+        if division:
+            self.new_divisions.add((country, division))
+            if district:
+                self.new_districts.add((country, division, district))
+                if len(self.new_districts) >= self.batch_size:
+                    self.flush()
+        if len(self.new_countries) >= self.batch_size or len(self.new_divisions) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self._flush_countries()
+        self._flush_divisions()
+        self._flush_districts()
+
+    def _flush_countries(self):
+        if not self.new_countries:
+            return
+        names = list(self.new_countries)
+        CountryName.objects.bulk_create([CountryName(nameName=name) for name in names], ignore_conflicts=True)
+        self.countries.update(CountryName.objects.filter(nameName__in=names).values_list("nameName", "id"))
+        self.new_countries.clear()
+
+    def _flush_divisions(self):
+        pending = [
+            (self.countries[country], name) for country, name in self.new_divisions
+            if (self.countries[country], name) not in self.divisions
+        ]
+        if pending:
+            Division.objects.bulk_create(
+                [Division(country_id=country_id, division_name=name) for country_id, name in pending],
+                ignore_conflicts=True,
+            )
+            rows = Division.objects.filter(
+                country_id__in={country_id for country_id, _ in pending},
+                division_name__in={name for _, name in pending},
+            ).values_list("id", "country_id", "division_name")
+            self.divisions.update({(country_id, name): id for id, country_id, name in rows})
+        self.new_divisions.clear()
+
+    def _flush_districts(self):
+        if not self.new_districts:
+            return
+        rows = []
+        for country, division, name in self.new_districts:
+            country_id = self.countries[country]
+            rows.append(District(country_id=country_id, division_id=self.divisions[(country_id, division)], district_name=name))
+        District.objects.bulk_create(rows, ignore_conflicts=True)
+        self.new_districts.clear()
+
+
+def import_geography(rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import (country, division, district) rows in one transaction.
+    Returns ``{"countries": n, "divisions": n, "districts": n}`` of new rows.
+    """
+    models = {"countries": CountryName, "divisions": Division, "districts": District}
+    before = {key: model.objects.count() for key, model in models.items()}
+
+    with transaction.atomic():
+        importer = GeographyImporter(batch_size)
+        for country, division, district in rows:
+            importer.add(country, division, district)
+        importer.flush()
+
+    # bulk_create sends no signals
+    bump_version(GEOGRAPHY)
+    return {key: model.objects.count() - before[key] for key, model in models.items()}
@@ -0,0 +1,139 @@
+import json
+import logging
+from decimal import Decimal
+
+from .carts import EMPTY_CART, apply_cart_operations
+from .images import with_primary_image
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+GUEST_CART_COOKIE = "guest_cart"
+GUEST_CART_SALT = "shopingo.guest_cart"
+GUEST_CART_MAX_AGE = 60 * 60 * 24 * 30
+
+# A cookie holds about 4 KB
+MAX_GUEST_LINES = 50
+
+
+# ===========================
+# Guest cart (signed cookie)
+# ===========================
+# Visitors who aren't logged in keep their cart in a signed cookie:
+# [[product_id, quantity, color, size], ...], one line per product. Adding
+# and removing only rewrite the cookie, so browsing and filling a cart
+# writes nothing to the database (not even a session row). At login or
+# registration GuestCartMiddleware merges the lines into Cart rows with one
+# batch operation and drops the cookie.
+
+class GuestCartLine:
+    """Stands in for a Cart row in the cart templates; ``id`` is the product id."""
+
+    def __init__(self, product, quantity, color, size):
+        self.id = product.id
+        self.product = product
+        self.product_id = product.id
+        self.quantity = quantity
+        self.color = color
+        self.size = size
+
+
+def read_guest_cart(request):
+    """The visitor's lines; empty for a missing, tampered or malformed cookie."""
+    raw = request.get_signed_cookie(GUEST_CART_COOKIE, default=None, salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE)
+    if not raw:
+        return []
+    try:
+        lines = json.loads(raw)
+        return [[int(product_id), max(int(quantity), 1), str(color), str(size)] for product_id, quantity, color, size in lines]
+    except (ValueError, TypeError):
+        return []
+
+
+def write_guest_cart(response, lines):
+    if lines:
+        response.set_signed_cookie(
+            GUEST_CART_COOKIE, json.dumps(lines, separators=(",", ":")),
+            salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE, httponly=True, samesite="Lax",
+        )
+    else:
+        response.delete_cookie(GUEST_CART_COOKIE, samesite="Lax")
+
+
+def guest_cart_add(lines, product_id, quantity=1, color="", size=""):
+    """
+    ``lines`` with ``quantity`` more of ``product_id`` (same rule as Cart: one
+    line per product). Raises ValueError when a new line would go past
+    MAX_GUEST_LINES.
+    """
+    for line in lines:
+        if line[0] == product_id:
+            line[1] += quantity
+            return lines
+    if len(lines) >= MAX_GUEST_LINES:
+        raise ValueError(f"Your cart can hold {MAX_GUEST_LINES} different products. Log in to add more.")
+    return lines + [[product_id, quantity, color or "", size or ""]]
+
+
+def guest_cart_remove(lines, product_id):
+    return [line for line in lines if line[0] != product_id]
+
+
+def build_guest_cart_lines(lines):
+    """Same shape as carts.build_cart_lines, from one product query."""
+    if not lines:
+        return EMPTY_CART
+    products = with_primary_image(Product.objects.all()).in_bulk([line[0] for line in lines])
+
+    total_items = 0
+    subtotal = Decimal("0.00")
+    cart_items_with_total = []
+
+    for product_id, quantity, color, size in lines:
+        product = products.get(product_id)
+        if product is None:
+            continue
+        item_total = Decimal(quantity) * Decimal(product.orginal_price or 0)
+        total_items += quantity
+        subtotal += item_total
+        cart_items_with_total.append({
+            "item": GuestCartLine(product, quantity, color, size),
+            "item_total": item_total,
+        })
+
+    return {
+        "cart_items_base": cart_items_with_total,
+        "cart_total_items": total_items,
+        "cart_subtotal": subtotal,
+    }
+
+
+def merge_guest_cart(user_id, lines):
+    """Add the guest lines to the user's Cart rows in one batch; products gone since are skipped."""
+    known = set(Product.objects.filter(id__in=[line[0] for line in lines]).values_list("id", flat=True))
+    operations = [
+        {"op": "add", "product_id": product_id, "quantity": quantity, "color": color, "size": size}
+        for product_id, quantity, color, size in lines
+        if product_id in known
+    ]
+    if operations:
+        apply_cart_operations(user_id, operations)
+
+
+class GuestCartMiddleware:
+    """Merge the guest cart into the user's cart on the first logged-in response (login / registration)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if GUEST_CART_COOKIE in request.COOKIES and request.user.is_authenticated:
+            try:
+                merge_guest_cart(request.user.id, read_guest_cart(request))
+            except ValueError as e:
+                # e.g. a product deleted while merging: give up on the guest
+                # cart rather than fail (and retry) on every request
+                logger.warning("Guest cart of user %s not merged: %s", request.user.id, e)
+            write_guest_cart(response, [])
+        return response
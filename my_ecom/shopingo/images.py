@@ -0,0 +1,28 @@
+from .models import Product, ProductImage
+
+
+# ===========================
+# Primary image
+# ===========================
+# Product.primary_image points at the image ProductImage's Meta.ordering
+# puts first (is_primary, then ordering, then id). Cards and cart rows read
+# it through the pointer, so a grid needs one JOIN instead of one
+# images.first() query per card.
+
+def primary_image_id(product_id):
+    return ProductImage.objects.filter(product_id=product_id).values_list("id", flat=True).first()
+
+
+def refresh_primary_image(product_id):
+    """Re-point Product.primary_image after an image of ``product_id`` changed."""
+    Product.objects.filter(id=product_id).update(primary_image_id=primary_image_id(product_id))
+
+
+def with_primary_image(queryset, path=""):
+    """
+    ``queryset`` with the primary image joined in, e.g.
+    ``with_primary_image(Cart.objects.all(), "product")`` for cart rows.
+    """
+    prefix = f"{path}__" if path else ""
+    return queryset.select_related(f"{prefix}primary_image")
+
@@ -0,0 +1,172 @@
+from collections import defaultdict
+
+from django.db.models import CharField, Max, Min, Sum, Value
+from django.db.models.functions import Cast, Concat
+
+from .models import Product, ProductImage, ProductListing, ProductTag, Variation
+from .versions import CATALOG, bump_version
+
+
+BATCH_SIZE = 500
+
+
+def _listing_row(product, image_name, stats, brand, tag_names):
+    """Build an (unsaved) ProductListing for ``product`` from pre-fetched parts."""
+    return ProductListing(
+        product_id=product.id,
+        title=product.title,
+        slug=product.slug,
+        image=image_name or "",
+        price=product.price,
+        orginal_price=product.orginal_price,
+        discount_price=product.discount_price,
+        discount_percent=product.discount_percent,
+        min_price=stats.get("min_price"),
+        max_price=stats.get("max_price"),
+        total_stock=stats.get("total_stock") or 0,
+        category_id=product.category_id,
+        category_name=product.category.name,
+        subcategory_id=product.subcategory_id,
+        brand_id=brand[0] if brand else None,
+        brand_name=(brand[1] or "") if brand else "",
+        tag_names=", ".join(tag_names),
+        is_featured=product.is_featured,
+        created_at=product.created_at,
+    )
+
+
+def refresh_listing(product_id, create=True):
+    """
+    Recompute the listing row of one product.
+
+    ``create=False`` only updates an existing row; delete signals use it so a
+    cascade delete of a product never re-creates the row it is removing.
+    """
+    product = Product.objects.select_related("category").filter(id=product_id).first()
+    if product is None:
+        return None
+    if not create and not ProductListing.objects.filter(product_id=product_id).exists():
+        return None
+
+    # Meta.ordering puts the primary image first
+    image_name = (
+        ProductImage.objects.filter(product_id=product_id)
+        .values_list("image", flat=True)
+        .first()
+    )
+    stats = Variation.objects.filter(product_id=product_id).aggregate(
+        min_price=Min("discount_price"),
+        max_price=Max("discount_price"),
+        total_stock=Sum("stock"),
+    )
+    brand = (
+        Variation.objects.filter(product_id=product_id)
+        .order_by("id")
+        .values_list("brand_id", "brand__name")
+        .first()
+    )
+    tag_names = list(
+        ProductTag.objects.filter(product_id=product_id, tag__isnull=False)
+        .order_by("tag__name")
+        .values_list("tag__name", flat=True)
+    )
+
+    row = _listing_row(product, image_name, stats, brand, tag_names)
+    row.save()
+    return row
+
+
+def _tag_names(product_ids):
+    """{product_id: [tag name, ...]} in name order."""
+    tags = defaultdict(list)
+    for product_id, tag_name in (
+        ProductTag.objects.filter(product_id__in=product_ids, tag__isnull=False)
+        .order_by("tag__name")
+        .values_list("product_id", "tag__name")
+    ):
+        tags[product_id].append(tag_name)
+    return tags
+
+
+def refresh_tag_names(product_ids):
+    """Recompute ``tag_names`` of the given products' rows, e.g. after a tag rename."""
+    product_ids = list(product_ids)
+    tags = _tag_names(product_ids)
+    rows = list(ProductListing.objects.filter(product_id__in=product_ids).only("product_id", "tag_names"))
+    for row in rows:
+        row.tag_names = ", ".join(tags[row.product_id])
+    ProductListing.objects.bulk_update(rows, ["tag_names"], batch_size=BATCH_SIZE)
+
+
+def _listing_rows(products):
+    """Unsaved listing rows of a batch of products: four queries for their parts."""
+    product_ids = [p.id for p in products]
+
+    images = {}
+    for product_id, image in (
+        ProductImage.objects.filter(product_id__in=product_ids)
+        .order_by("is_primary", "-ordering", "-id")
+        .values_list("product_id", "image")
+    ):
+        images[product_id] = image  # reverse of Meta.ordering: the primary image wins
+
+    stats = {
+        row["product_id"]: row
+        for row in Variation.objects.filter(product_id__in=product_ids).values("product_id").annotate(
+            min_price=Min("discount_price"),
+            max_price=Max("discount_price"),
+            total_stock=Sum("stock"),
+        )
+    }
+
+    brands = {}
+    for product_id, brand_id, brand_name in (
+        Variation.objects.filter(product_id__in=product_ids)
+        .order_by("-id")
+        .values_list("product_id", "brand_id", "brand__name")
+    ):
+        brands[product_id] = (brand_id, brand_name)
+
+    tags = _tag_names(product_ids)
+
+    return [
+        _listing_row(p, images.get(p.id), stats.get(p.id, {}), brands.get(p.id), tags[p.id])
+        for p in products
+    ]
+
+
+# Everything but the key: what an upsert overwrites
+LISTING_FIELDS = [field.name for field in ProductListing._meta.concrete_fields if not field.primary_key]
+
+
+def rebuild_listings():
+    """
+    Rebuild every listing row, BATCH_SIZE products at a time. Returns the row count.
+
+    Each batch is upserted (bulk_create with update_conflicts), so memory
+    stays flat and no row is deleted: no per-row delete signals, and the
+    listing pages keep serving while the rebuild runs. Rows of deleted
+    products are gone already (the OneToOne cascades).
+    """
+    products = Product.objects.select_related("category").order_by("id")
+    total, last_id = 0, 0
+    while True:
+        batch = list(products.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        rows = _listing_rows(batch)
+        # A stale row may still hold a slug one of these products took over;
+        # park it on a placeholder until its own batch rewrites it
+        ProductListing.objects.filter(slug__in=[row.slug for row in rows]).exclude(
+            product_id__in=[row.product_id for row in rows]
+        ).update(slug=Concat(Value("~"), Cast("product_id", CharField())))
+        ProductListing.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=LISTING_FIELDS,
+        )
+        total += len(batch)
+        last_id = batch[-1].id
+    bump_version(CATALOG)
+    return total
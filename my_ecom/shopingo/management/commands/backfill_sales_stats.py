@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from shopingo.sales import rebuild_sales_stats, refresh_sales_windows
+
+
+class Command(BaseCommand):
+    help = "Rebuild ProductSalesStats / ProductSalesDay from completed orders (or only roll the 7/30 day windows)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--windows",
+            action="store_true",
+            help="Only recompute units_7d / units_30d from the day rows (run daily)",
+        )
+
+    def handle(self, *args, **options):
+        if options["windows"]:
+            total = refresh_sales_windows()
+            self.stdout.write(self.style.SUCCESS(f"Refreshed sales windows of {total} products."))
+            return
+
+        total = rebuild_sales_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales stats of {total} products."))
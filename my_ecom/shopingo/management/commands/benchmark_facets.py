@@ -0,0 +1,132 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from shopingo.catalog import parse_listing_filters, run_listing, _bitmap_facets
+from shopingo.facets import build_index
+from shopingo.models import Brand, Category, Color, Product, ProductListing, Size, Variation
+
+
+VARIATIONS_PER_PRODUCT = 10
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the ORM facet queries with the bitmap facet index on synthetic data. "
+        "Everything runs in a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "sizes", nargs="*", type=int, default=[10_000, 100_000, 1_000_000],
+            help="Variation counts to benchmark (default: 10000 100000 1000000)",
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per query, best time is reported")
+
+    def handle(self, *args, **options):
+        for size in options["sizes"]:
+            with transaction.atomic():
+                self.benchmark(size, options["repeat"])
+                transaction.set_rollback(True)
+
+    # ---- synthetic catalog ----
+    def seed(self, size):
+        seller = get_user_model().objects.create(username=f"facet-bench-{time.time_ns()}")
+        category = Category.objects.create(name=f"Facet bench {time.time_ns()}")
+        brands = Brand.objects.bulk_create(Brand(name=f"bench-brand-{time.time_ns()}-{i}", slug=f"bench-brand-{time.time_ns()}-{i}") for i in range(20))
+        colors = Color.objects.bulk_create(Color(name=f"bench-color-{time.time_ns()}-{i}") for i in range(VARIATIONS_PER_PRODUCT))
+        sizes = Size.objects.bulk_create(Size(name=f"bench-{i}") for i in range(5))
+
+        products = Product.objects.bulk_create(
+            (
+                Product(
+                    title=f"Bench product {i}",
+                    slug=f"bench-{category.id}-{i}",
+                    price=Decimal(10 + i % 990),
+                    orginal_price=Decimal(10 + i % 990),
+                    discount_price=0,
+                    category=category,
+                    seller=seller,
+                )
+                for i in range(max(1, size // VARIATIONS_PER_PRODUCT))
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        Variation.objects.bulk_create(
+            (
+                Variation(
+                    product=product,
+                    color=colors[j],
+                    size=sizes[(i + j) % len(sizes)],
+                    brand=brands[i % len(brands)],
+                    price=product.price,
+                    discount_price=Decimal((i * 7 + j * 13) % 1100),
+                )
+                for i, product in enumerate(products)
+                for j in range(VARIATIONS_PER_PRODUCT)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        ProductListing.objects.bulk_create(
+            (
+                ProductListing(
+                    product=product,
+                    title=product.title,
+                    slug=product.slug,
+                    price=product.price,
+                    orginal_price=product.orginal_price,
+                    category=category,
+                    category_name=category.name,
+                    created_at=product.created_at,
+                )
+                for product in products
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return category, brands, colors
+
+    def best(self, repeat, func):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        return min(times) * 1000
+
+    def benchmark(self, size, repeat):
+        self.stdout.write(f"Seeding {size} variations ...")
+        category, brands, colors = self.seed(size)
+
+        scope = ProductListing.objects.filter(category=category)
+        query = f"?brand={brands[0].id}&brand={brands[1].id}&color={colors[0].id}&price_range=99-149&sort=price_asc"
+        filters = parse_listing_filters(RequestFactory().get("/" + query))
+
+        def orm():
+            result = run_listing(scope, filters)
+            list(result["products"])
+            list(result["brands"])
+            list(result["colors"])
+
+        start = time.perf_counter()
+        index = build_index()
+        build_ms = (time.perf_counter() - start) * 1000
+
+        def bitmap():
+            products, brand_counts, color_counts, discount_data = _bitmap_facets(
+                index, scope, filters, ("category", [category.id])
+            )
+            list(products.order_by("price", "product_id")[:filters["per_page"]])
+
+        orm_ms = self.best(repeat, orm)
+        bitmap_ms = self.best(repeat, bitmap)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{size:>9} variations: ORM {orm_ms:9.1f} ms | bitmap {bitmap_ms:9.1f} ms "
+                f"(index build {build_ms:.0f} ms, {len(index.bitmaps)} bitmaps)"
+            )
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from shopingo.feeds import HOME_FEED_TIMEOUT, rebuild_home_feed
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the home page feed snapshot. Run it from cron more often than "
+        f"every {HOME_FEED_TIMEOUT // 60} minutes to keep best sellers / top rated fresh "
+        "without a rebuild on a visitor's request."
+    )
+
+    def handle(self, *args, **options):
+        feed = rebuild_home_feed()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Home feed rebuilt: {len(feed['new_arrivals'])} new arrivals, "
+                f"{len(feed['featured_products'])} featured, {len(feed['carousel_categories'])} categories."
+            )
+        )
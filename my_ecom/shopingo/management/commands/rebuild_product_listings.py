@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shopingo.listings import rebuild_listings
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized ProductListing table from Product, ProductImage, Variation and ProductTag."
+
+    def handle(self, *args, **options):
+        total = rebuild_listings()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} product listings."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shopingo.recommendations import TOP_N, rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = "Rebuild item-item product recommendations from co-purchases (same order) and co-wishlists (same user)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=TOP_N, help=f"Neighbours kept per product (default {TOP_N})")
+
+    def handle(self, *args, **options):
+        total = rebuild_recommendations(options["top"])
+        self.stdout.write(self.style.SUCCESS(f"Stored {total} product neighbours."))
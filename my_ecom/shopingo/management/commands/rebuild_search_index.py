@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shopingo.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index (SQLite FTS5 / PostgreSQL tsvector)."
+
+    def handle(self, *args, **options):
+        total = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} products."))
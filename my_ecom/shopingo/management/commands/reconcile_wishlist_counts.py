@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shopingo.popularity import reconcile_wishlist_counts
+
+
+class Command(BaseCommand):
+    help = "Recount Product.wishlist_count from the Wishlist table and fix any drift."
+
+    def handle(self, *args, **options):
+        fixed = reconcile_wishlist_counts()
+        self.stdout.write(self.style.SUCCESS(f"Fixed wishlist_count on {fixed} products."))
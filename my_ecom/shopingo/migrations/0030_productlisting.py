@@ -0,0 +1,85 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Min, Max, Sum
+
+
+def populate_listings(apps, schema_editor):
+    Product = apps.get_model('shopingo', 'Product')
+    ProductImage = apps.get_model('shopingo', 'ProductImage')
+    ProductListing = apps.get_model('shopingo', 'ProductListing')
+    ProductTag = apps.get_model('shopingo', 'ProductTag')
+    Variation = apps.get_model('shopingo', 'Variation')
+
+    rows = []
+    for product in Product.objects.select_related('category'):
+        image = ProductImage.objects.filter(product=product).order_by('id').values_list('image', flat=True).first()
+        variations = Variation.objects.filter(product=product)
+        stats = variations.aggregate(min_price=Min('discount_price'), max_price=Max('discount_price'), total_stock=Sum('stock'))
+        brand = variations.order_by('id').values_list('brand_id', 'brand__name').first()
+        tags = ProductTag.objects.filter(product=product, tag__isnull=False).order_by('tag__name').values_list('tag__name', flat=True)
+        percent = 0
+        if product.price and product.orginal_price and product.price > 0:
+            percent = round(((product.price - product.orginal_price) / product.price) * 100, 2)
+        rows.append(ProductListing(
+            product_id=product.id,
+            title=product.title,
+            slug=product.slug,
+            image=image or '',
+            price=product.price,
+            orginal_price=product.orginal_price,
+            discount_price=product.discount_price,
+            discount_percent=percent,
+            min_price=stats['min_price'],
+            max_price=stats['max_price'],
+            total_stock=stats['total_stock'] or 0,
+            category_id=product.category_id,
+            category_name=product.category.name,
+            subcategory_id=product.subcategory_id,
+            brand_id=brand[0] if brand else None,
+            brand_name=(brand[1] or '') if brand else '',
+            tag_names=', '.join(tags),
+            is_featured=product.is_featured,
+            created_at=product.created_at,
+        ))
+    ProductListing.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopingo', '0029_personalinfo_whychooseus_brand_brand_logo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductListing',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='shopingo.product')),
+                ('title', models.CharField(max_length=200)),
+                ('slug', models.SlugField(max_length=220, unique=True)),
+                ('image', models.ImageField(blank=True, upload_to='products/')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('orginal_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('discount_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('discount_percent', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('total_stock', models.PositiveIntegerField(default=0)),
+                ('category_name', models.CharField(max_length=200)),
+                ('brand_name', models.CharField(blank=True, max_length=100)),
+                ('tag_names', models.TextField(blank=True)),
+                ('is_featured', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('brand', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='listings', to='shopingo.brand')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listings', to='shopingo.category')),
+                ('subcategory', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='listings', to='shopingo.subcategory')),
+            ],
+            options={
+                'verbose_name_plural': 'Product Listings',
+                'indexes': [models.Index(fields=['category', '-created_at'], name='shopingo_pr_categor_d8dab0_idx'), models.Index(fields=['is_featured', '-created_at'], name='shopingo_pr_is_feat_c6a007_idx'), models.Index(fields=['-created_at'], name='shopingo_pr_created_524107_idx'), models.Index(fields=['price'], name='shopingo_pr_price_829a01_idx')],
+            },
+        ),
+        migrations.RunPython(populate_listings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopingo', '0030_productlisting'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['category', 'price', 'product'], name='shopingo_pr_categor_ee8875_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['subcategory', 'price', 'product'], name='shopingo_pr_subcate_c06460_idx'),
+        ),
+    ]
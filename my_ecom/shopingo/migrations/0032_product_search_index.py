@@ -0,0 +1,66 @@
+from django.db import migrations
+from django.utils.html import strip_tags
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS shopingo_product_search "
+            "USING fts5(title, body, taxonomy, tokenize='porter unicode61')"
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS shopingo_product_search ("
+            "product_id bigint PRIMARY KEY REFERENCES shopingo_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS shopingo_product_search_document_gin "
+            "ON shopingo_product_search USING GIN (document)"
+        )
+    else:
+        return
+
+    Product = apps.get_model('shopingo', 'Product')
+    Variation = apps.get_model('shopingo', 'Variation')
+    ProductTag = apps.get_model('shopingo', 'ProductTag')
+
+    with connection.cursor() as cursor:
+        for product in Product.objects.select_related('category', 'subcategory'):
+            body = " ".join(strip_tags(t) for t in (product.description, product.description_details) if t)
+            taxonomy = [product.category.name]
+            if product.subcategory_id:
+                taxonomy.append(product.subcategory.name)
+            taxonomy += [b for b in Variation.objects.filter(product=product).values_list('brand__name', flat=True).distinct() if b]
+            taxonomy += [t for t in ProductTag.objects.filter(product=product, tag__isnull=False).values_list('tag__name', flat=True) if t]
+
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    "INSERT INTO shopingo_product_search (rowid, title, body, taxonomy) VALUES (%s, %s, %s, %s)",
+                    [product.id, product.title, body, " ".join(taxonomy)],
+                )
+            else:
+                cursor.execute(
+                    "INSERT INTO shopingo_product_search (product_id, document) "
+                    "VALUES (%s, setweight(to_tsvector('english', %s), 'A') "
+                    "|| setweight(to_tsvector('english', %s), 'C') "
+                    "|| setweight(to_tsvector('english', %s), 'B'))",
+                    [product.id, product.title, body, " ".join(taxonomy)],
+                )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS shopingo_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopingo', '0031_productlisting_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopingo', '0032_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales_stats', serialize=False, to='shopingo.product')),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+                ('orders_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units_7d', models.PositiveIntegerField(default=0)),
+                ('units_30d', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Product Sales Stats',
+                'indexes': [models.Index(fields=['-units_sold', '-product'], name='shopingo_pr_units_s_27e712_idx'), models.Index(fields=['-units_7d', '-product'], name='shopingo_pr_units_7_f368d4_idx'), models.Index(fields=['-units_30d', '-product'], name='shopingo_pr_units_3_b8f7f3_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_days', to='shopingo.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product Sales Days',
+                'indexes': [models.Index(fields=['day'], name='shopingo_pr_day_9465f7_idx')],
+                'unique_together': {('product', 'day')},
+            },
+        ),
+    ]
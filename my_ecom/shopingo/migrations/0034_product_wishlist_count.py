@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_wishlist_counts(apps, schema_editor):
+    Product = apps.get_model('shopingo', 'Product')
+    counts = Product.objects.annotate(n=Count('wishlist')).filter(n__gt=0).values_list('id', 'n')
+    for product_id, n in counts:
+        Product.objects.filter(id=product_id).update(wishlist_count=n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopingo', '0033_productsalesstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='wishlist_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-wishlist_count', '-id'], name='shopingo_pr_wishlis_3247c2_idx'),
+        ),
+        migrations.RunPython(populate_wishlist_counts, migrations.RunPython.noop),
+    ]
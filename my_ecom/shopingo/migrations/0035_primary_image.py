@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_primary_images(apps, schema_editor):
+    Product = apps.get_model('shopingo', 'Product')
+    ProductImage = apps.get_model('shopingo', 'ProductImage')
+    first = {}
+    for image_id, product_id in ProductImage.objects.filter(product__isnull=False).order_by('-id').values_list('id', 'product_id'):
+        first[product_id] = image_id  # lowest id wins, same as images.first() before
+    for product_id, image_id in first.items():
+        Product.objects.filter(id=product_id).update(primary_image_id=image_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopingo', '0034_product_wishlist_count'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='productimage',
+            options={'ordering': ['-is_primary', 'ordering', 'id']},
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shopingo.productimage'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='is_primary',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='ordering',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='productimage',
+            index=models.Index(fields=['product', '-is_primary', 'ordering', 'id'], name='shopingo_pr_product_87bddf_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productimage',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_primary', True)), fields=('product',), name='one_primary_image_per_product'),
+        ),
+        migrations.RunPython(populate_primary_images, migrations.RunPython.noop),
+    ]
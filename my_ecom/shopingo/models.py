@@ -10,16 +10,31 @@ from accounts.models import CountryName, Division, District
 from django.conf import settings
 import uuid
 from django.contrib.postgres.fields import JSONField  
+from .versions import TYPEAHEAD, bump_version
 
 User = get_user_model()
 
 
+def _typeahead_fields_changed(instance, fields, update_fields=None):
+    """
+    True when saving ``instance`` changes what the typeahead index shows
+    (its label / slug ``fields``): a new row, or a stored value that differs.
+    """
+    if update_fields is not None and not set(fields) & set(update_fields):
+        return False
+    if instance._state.adding or instance.pk is None:
+        return True
+    stored = type(instance).objects.filter(pk=instance.pk).values(*fields).first()
+    return stored is None or any(stored[field] != getattr(instance, field) for field in fields)
+
+
 # ===========================
 # Category Models
 # ===========================
 class Category(models.Model):
     name = models.CharField(max_length=200, unique=True)
     slug = models.SlugField(max_length=220, unique=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -33,7 +48,10 @@ class Category(models.Model):
                 slug = f"{base_slug}-{counter}"
                 counter += 1
             self.slug = slug
+        typeahead_changed = _typeahead_fields_changed(self, ("name", "slug"), kwargs.get("update_fields"))
         super().save(*args, **kwargs)
+        if typeahead_changed:
+            bump_version(TYPEAHEAD)
 
     def __str__(self):
         return self.name
@@ -45,6 +63,7 @@ class SubCategory(models.Model):
     name = models.CharField(max_length=200, unique=True)
     slug = models.SlugField(max_length=220, unique=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="subcategories")
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Sub Categories"
@@ -58,7 +77,10 @@ class SubCategory(models.Model):
                 slug = f"{base_slug}-{counter}"
                 counter += 1
             self.slug = slug
+        typeahead_changed = _typeahead_fields_changed(self, ("name", "slug"), kwargs.get("update_fields"))
         super().save(*args, **kwargs)
+        if typeahead_changed:
+            bump_version(TYPEAHEAD)
 
     def __str__(self):
         return f"{self.category.name} → {self.name}"
@@ -82,9 +104,31 @@ class Product(models.Model):
     is_featured = models.BooleanField(default=False)
     seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name="products")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained with F() by the Wishlist signals (see MAINTAINED_FIELDS); fix drift with reconcile_wishlist_counts
+    wishlist_count = models.PositiveIntegerField(default=0, editable=False)
+    # Denormalized pointer to the card image (see shopingo/images.py and MAINTAINED_FIELDS)
+    primary_image = models.ForeignKey("ProductImage", on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name="+")
 
     class Meta:
         verbose_name_plural = "Products"
+        indexes = [
+            models.Index(fields=["-wishlist_count", "-id"]),
+        ]
+
+    # Kept up to date with queryset updates (F() in popularity.py, the
+    # primary image pointer in images.py). save() still writes them like any
+    # column, so an edit of an instance loaded earlier saves edited_fields()
+    # instead (ProductAdmin does); a plain save() keeps Django's semantics.
+    MAINTAINED_FIELDS = ("wishlist_count", "primary_image")
+
+    @classmethod
+    def edited_fields(cls):
+        """Every column but the primary key and MAINTAINED_FIELDS: ``update_fields`` of an edit."""
+        return [
+            field.name for field in cls._meta.concrete_fields
+            if not field.primary_key and field.name not in cls.MAINTAINED_FIELDS
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -116,7 +160,10 @@ class Product(models.Model):
             self.orginal_price = self.price
             self.discount_price = 0
 
+        typeahead_changed = _typeahead_fields_changed(self, ("title", "slug"), kwargs.get("update_fields"))
         super().save(*args, **kwargs)
+        if typeahead_changed:
+            bump_version(TYPEAHEAD)
 
     # Optional: calculate % discount easily in frontend/admin
     @property
@@ -132,6 +179,24 @@ class Product(models.Model):
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="images", null=True, blank=True)
     image = models.ImageField(upload_to="products/")
+    is_primary = models.BooleanField(default=False)  # card / thumbnail image
+    ordering = models.PositiveIntegerField(default=0)  # gallery order
+
+    class Meta:
+        # Primary first, then gallery order: images.all() / .first() agree with Product.primary_image
+        ordering = ["-is_primary", "ordering", "id"]
+        indexes = [
+            models.Index(fields=["product", "-is_primary", "ordering", "id"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["product"], condition=models.Q(is_primary=True), name="one_primary_image_per_product"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Only one primary per product: demote the old one first
+        if self.is_primary and self.product_id:
+            ProductImage.objects.filter(product_id=self.product_id, is_primary=True).exclude(pk=self.pk).update(is_primary=False)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Image of {self.product.title}"
@@ -159,6 +224,7 @@ class Brand(models.Model):
     name = models.CharField(max_length=100, unique=True, null=True, blank=True)
     brand_logo = models.ImageField(upload_to="brands/", blank=True, null=True)
     slug = models.SlugField(max_length=150, unique=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -178,6 +244,7 @@ class Variation(models.Model):
     discount_price = models.DecimalField(max_digits=10, decimal_places=2)
     price_range = models.CharField(max_length=100, blank=True, null=True)
     stock = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ("product", "color", "size", "brand")
@@ -193,11 +260,15 @@ class Variation(models.Model):
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True, null=True, blank=True)
     slug = models.SlugField(max_length=100, unique=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        typeahead_changed = _typeahead_fields_changed(self, ("name", "slug"), kwargs.get("update_fields"))
         super().save(*args, **kwargs)
+        if typeahead_changed:
+            bump_version(TYPEAHEAD)
 
     def __str__(self):
         return self.name
@@ -430,3 +501,123 @@ class PersonalInfo(models.Model):
     def __str__(self):
         return f"Personal Info ({self.email})"
 
+
+
+# ===========================
+# Product Listing (read model)
+# ===========================
+class ProductListing(models.Model):
+    """
+    One denormalized row per product with everything a product card needs.
+
+    Kept in sync by the signals in shopingo/signals.py; rebuild it with
+    ``python manage.py rebuild_product_listings``.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="listing")
+    title = models.CharField(max_length=200)
+    slug = models.SlugField(max_length=220, unique=True)
+    image = models.ImageField(upload_to="products/", blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    orginal_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    discount_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    discount_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # min Variation.discount_price
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)  # max Variation.discount_price
+    total_stock = models.PositiveIntegerField(default=0)  # sum of Variation.stock
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="listings")
+    category_name = models.CharField(max_length=200)
+    subcategory = models.ForeignKey(SubCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name="listings")
+    brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, blank=True, related_name="listings")
+    brand_name = models.CharField(max_length=100, blank=True)
+    tag_names = models.TextField(blank=True)
+    is_featured = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "Product Listings"
+        indexes = [
+            models.Index(fields=["category", "-created_at"]),
+            models.Index(fields=["is_featured", "-created_at"]),
+            models.Index(fields=["-created_at"]),
+            models.Index(fields=["price"]),
+            # keyset pagination seeks on (price, product_id) within a scope
+            models.Index(fields=["category", "price", "product"]),
+            models.Index(fields=["subcategory", "price", "product"]),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+
+# ===========================
+# Product Sales Stats (best sellers)
+# ===========================
+class ProductSalesStats(models.Model):
+    """
+    Running sales counters of one product, updated when an order completes.
+
+    Best sellers are an ORDER BY on this small table instead of a GROUP BY
+    over every OrderItem. Rebuild with ``python manage.py backfill_sales_stats``.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="sales_stats")
+    units_sold = models.PositiveIntegerField(default=0)
+    orders_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units_7d = models.PositiveIntegerField(default=0)  # rolling window, see ProductSalesDay
+    units_30d = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Product Sales Stats"
+        indexes = [
+            models.Index(fields=["-units_sold", "-product"]),
+            models.Index(fields=["-units_7d", "-product"]),
+            models.Index(fields=["-units_30d", "-product"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.units_sold} sold"
+
+
+class ProductSalesDay(models.Model):
+    """Units / orders / revenue of one product on one day; the rolling windows are summed from these."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="sales_days")
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ("product", "day")
+        verbose_name_plural = "Product Sales Days"
+        indexes = [
+            models.Index(fields=["day"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.day}: {self.units}"
+
+
+
+# ===========================
+# Product Recommendations (item-item neighbours)
+# ===========================
+class ProductNeighbour(models.Model):
+    """
+    Top-N "customers also bought / liked" products of one product, best first.
+
+    Built offline from co-purchases and co-wishlists by
+    ``python manage.py rebuild_recommendations``.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="neighbours")
+    neighbour = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="neighbour_of")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ("product", "rank")
+        verbose_name_plural = "Product Neighbours"
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.neighbour_id} (#{self.rank})"
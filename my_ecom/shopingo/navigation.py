@@ -0,0 +1,34 @@
+from .models import Category, PersonalInfo, Tag
+from .versions import NAVIGATION, get_version
+
+
+# ===========================
+# Header / footer data (global_categories)
+# ===========================
+# Every rendered template needs the menus, so each process keeps one built
+# copy in memory and only checks the shared NAVIGATION version per request
+# (one cache read). A Category / SubCategory / Tag / PersonalInfo write in
+# admin bumps the version and every process rebuilds on its next request.
+
+# (version, data), swapped in one assignment so a reader never pairs a
+# version with another build's data
+_built = (None, None)
+
+
+def build_navigation():
+    """The context of global_categories, fully evaluated (subcategories prefetched)."""
+    return {
+        "categories": list(Category.objects.prefetch_related("subcategories").all()),
+        "tags": list(Tag.objects.all()),
+        "personal_info": PersonalInfo.objects.last(),
+    }
+
+
+def get_navigation():
+    global _built
+    version = get_version(NAVIGATION)
+    built_version, data = _built
+    if built_version != version:
+        data = build_navigation()
+        _built = (version, data)
+    return data
@@ -0,0 +1,174 @@
+import json
+
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+CURSOR_SALT = "shopingo.pagination.cursor"
+
+# Bounded count used as the "estimated" total on backends without planner stats
+ESTIMATE_LIMIT = 1000
+
+
+# ===========================
+# Cursor token
+# ===========================
+def encode_cursor(ordering, values, before=False):
+    """
+    Opaque, signed token holding the sort keys of a page's edge row: its
+    last row for the next page, or (``before``) its first row for the
+    previous one.
+    """
+    data = {"o": list(ordering), "v": [str(v) for v in values]}
+    if before:
+        data["b"] = 1
+    return signing.dumps(data, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, ordering):
+    """
+    ``(values, before)`` of ``token``, or None if it is missing, forged or
+    for another sort.
+    """
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+    if data.get("o") != list(ordering) or len(data.get("v", [])) != len(ordering):
+        return None
+    return data["v"], bool(data.get("b"))
+
+
+def _reversed_ordering(ordering):
+    return [field[1:] if field.startswith("-") else f"-{field}" for field in ordering]
+
+
+def _seek_filter(ordering, values):
+    """
+    Rows strictly after ``values`` in ``ordering``, e.g. for ("price", "product_id"):
+    price > p OR (price = p AND product_id > id).
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+# ===========================
+# Estimated count
+# ===========================
+def estimate_count(queryset, limit=ESTIMATE_LIMIT):
+    """
+    Cheap row count for a queryset.
+
+    PostgreSQL returns the planner's row estimate (no scan); other backends
+    count at most ``limit`` rows, so the caller shows "limit+" past that.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    return queryset.order_by()[:limit].count()
+
+
+# ===========================
+# Keyset page
+# ===========================
+class CursorPage:
+    """
+    One page of a keyset (seek) paginated queryset.
+
+    Quacks enough like ``django.core.paginator.Page`` for the listing
+    templates; there is no page number and no exact total.
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor, estimated_count):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.estimated_count = estimated_count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def keyset_page(queryset, ordering, per_page, cursor=None):
+    """
+    Fetch the page after (or, for a previous-page cursor, before) ``cursor``
+    using a WHERE on the sort keys instead of OFFSET, so page N costs the
+    same as page 1. ``ordering`` must end with a unique field (the primary
+    key) to make the order total.
+    """
+    estimated_count = estimate_count(queryset)
+
+    decoded = decode_cursor(cursor, ordering)
+    values, before = decoded if decoded is not None else (None, False)
+    # A previous page is the next page of the reversed order, read backwards
+    seek = _reversed_ordering(ordering) if before else list(ordering)
+    queryset = queryset.order_by(*seek)
+    if values is not None:
+        queryset = queryset.filter(_seek_filter(seek, values))
+
+    rows = list(queryset[:per_page + 1])
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before:
+        rows.reverse()
+
+    def edge(row, before=False):
+        return encode_cursor(ordering, [getattr(row, field.lstrip("-")) for field in ordering], before)
+
+    # Going forward there is a previous page whenever a cursor was followed,
+    # going back there is a next one; the other side has one if a row is left
+    has_next = more if not before else values is not None
+    has_previous = values is not None if not before else more
+    next_cursor = edge(rows[-1]) if rows and has_next else None
+    previous_cursor = edge(rows[0], before=True) if rows and has_previous else None
+    return CursorPage(rows, next_cursor, previous_cursor, estimated_count)
+
+
+# ===========================
+# Known-count paginator
+# ===========================
+class CountedPaginator(Paginator):
+    """
+    Paginator for a page rebuilt from cache: the total is already known, so
+    ``num_pages`` / ``page_range`` work without a COUNT(*) query.
+    """
+
+    def __init__(self, count, per_page):
+        super().__init__([], per_page)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        return self._count
@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Product
+
+
+# ===========================
+# Wishlist counter
+# ===========================
+def wishlist_added(product_id):
+    Product.objects.filter(id=product_id).update(wishlist_count=F("wishlist_count") + 1)
+
+
+def wishlists_added(product_ids):
+    """wishlist_added for Wishlist rows made with bulk_create (which sends no post_save)."""
+    Product.objects.filter(id__in=list(product_ids)).update(wishlist_count=F("wishlist_count") + 1)
+
+
+def wishlist_removed(product_id):
+    # Never below zero, even if the counter drifted
+    Product.objects.filter(id=product_id, wishlist_count__gt=0).update(wishlist_count=F("wishlist_count") - 1)
+
+
+def reconcile_wishlist_counts():
+    """Recount Product.wishlist_count from Wishlist; returns the number of products fixed."""
+    drifted = list(
+        Product.objects.annotate(actual=Count("wishlist"))
+        .exclude(wishlist_count=F("actual"))
+        .values_list("id", "actual")
+    )
+    with transaction.atomic():
+        for product_id, actual in drifted:
+            Product.objects.filter(id=product_id).update(wishlist_count=actual)
+    return len(drifted)
@@ -0,0 +1,124 @@
+import heapq
+import math
+from collections import defaultdict
+from itertools import combinations
+
+from django.db import transaction
+
+from .models import OrderItem, ProductListing, ProductNeighbour, Wishlist
+from .versions import CATALOG, bump_version
+
+
+# Neighbours stored per product
+TOP_N = 12
+
+# Signal weights: a purchase says more than a wishlist
+PURCHASE_WEIGHT = 1.0
+WISHLIST_WEIGHT = 0.5
+
+# Larger baskets (bulk orders, wishlist hoarders) are skipped for pairs:
+# they cost n^2 and say little about any single pair
+MAX_BASKET = 50
+
+BATCH_SIZE = 1000
+
+
+# ===========================
+# Baskets
+# ===========================
+def _baskets(rows):
+    """Group (basket_key, product_id) rows, sorted by basket_key, into sets."""
+    current, basket = None, set()
+    for key, product_id in rows:
+        if key != current:
+            if basket:
+                yield basket
+            current, basket = key, set()
+        basket.add(product_id)
+    if basket:
+        yield basket
+
+
+def order_baskets():
+    rows = OrderItem.objects.order_by("order_id").values_list("order_id", "product_id").iterator(chunk_size=BATCH_SIZE)
+    return _baskets(rows)
+
+
+def wishlist_baskets():
+    rows = Wishlist.objects.order_by("user_id").values_list("user_id", "product_id").iterator(chunk_size=BATCH_SIZE)
+    return _baskets(rows)
+
+
+# ===========================
+# Scoring
+# ===========================
+def co_occurrence(weighted_baskets):
+    """
+    Sparse item-item matrix from ``(baskets, weight)`` pairs.
+
+    Returns ``(pairs, totals)``: ``pairs[i][j]`` is the weighted number of
+    baskets holding both i and j (symmetric), ``totals[i]`` the weighted
+    number of baskets holding i. Only non-zero cells are stored.
+    """
+    pairs = defaultdict(lambda: defaultdict(float))
+    totals = defaultdict(float)
+    for baskets, weight in weighted_baskets:
+        for basket in baskets:
+            for product_id in basket:
+                totals[product_id] += weight
+            if len(basket) > MAX_BASKET:
+                continue
+            for i, j in combinations(basket, 2):
+                pairs[i][j] += weight
+                pairs[j][i] += weight
+    return pairs, totals
+
+
+def top_neighbours(pairs, totals, n=TOP_N):
+    """
+    ``{product_id: [(neighbour_id, score), ...]}``, best first.
+
+    Score is cosine similarity of the two products' basket vectors,
+    co(i, j) / sqrt(total(i) * total(j)), so best sellers don't become
+    everyone's neighbour just by being everywhere.
+    """
+    result = {}
+    for i, row in pairs.items():
+        scored = (
+            (co / math.sqrt(totals[i] * totals[j]), j)
+            for j, co in row.items()
+        )
+        result[i] = [(j, score) for score, j in heapq.nlargest(n, scored)]
+    return result
+
+
+# ===========================
+# Build
+# ===========================
+def rebuild_recommendations(n=TOP_N):
+    """Recompute and store every product's neighbours. Returns the row count."""
+    pairs, totals = co_occurrence([
+        (order_baskets(), PURCHASE_WEIGHT),
+        (wishlist_baskets(), WISHLIST_WEIGHT),
+    ])
+    neighbours = top_neighbours(pairs, totals, n)
+
+    rows = [
+        ProductNeighbour(product_id=product_id, neighbour_id=neighbour_id, rank=rank, score=score)
+        for product_id, ranked in neighbours.items()
+        for rank, (neighbour_id, score) in enumerate(ranked, start=1)
+    ]
+    with transaction.atomic():
+        ProductNeighbour.objects.all().delete()
+        ProductNeighbour.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    # bulk_create sends no signals; detail pages show the neighbours
+    bump_version(CATALOG)
+    return len(rows)
+
+
+def recommended_listings(product_id, limit):
+    """Listing cards of the stored neighbours, best first (one indexed query)."""
+    return list(
+        ProductListing.objects.filter(product__neighbour_of__product_id=product_id)
+        .order_by("product__neighbour_of__rank")[:limit]
+    )
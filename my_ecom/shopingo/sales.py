@@ -0,0 +1,140 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import OrderItem, ProductSalesDay, ProductSalesStats
+
+
+BATCH_SIZE = 500
+
+# Rolling windows kept on ProductSalesStats: field -> days
+WINDOWS = {"units_7d": 7, "units_30d": 30}
+
+
+def _per_product(items):
+    """{product_id: [units, revenue]} of (product_id, quantity, item_total) rows."""
+    totals = defaultdict(lambda: [0, Decimal("0")])
+    for product_id, quantity, item_total in items:
+        totals[product_id][0] += quantity
+        totals[product_id][1] += item_total or 0
+    return totals
+
+
+# ===========================
+# Incremental update (checkout)
+# ===========================
+def record_order_sales(order_items, day=None):
+    """
+    Add one completed order to the counters.
+
+    Called inside the checkout transaction, so the order and its counters
+    commit (or roll back) together. Increments are F() expressions: two
+    checkouts of the same product never lose an update.
+    """
+    day = day or timezone.localdate()
+    totals = _per_product(order_items.values_list("product_id", "quantity", "item_total"))
+
+    with transaction.atomic():
+        for product_id, (units, revenue) in totals.items():
+            ProductSalesDay.objects.get_or_create(product_id=product_id, day=day)
+            ProductSalesDay.objects.filter(product_id=product_id, day=day).update(
+                units=F("units") + units,
+                orders=F("orders") + 1,
+                revenue=F("revenue") + revenue,
+            )
+
+            ProductSalesStats.objects.get_or_create(product_id=product_id)
+            ProductSalesStats.objects.filter(product_id=product_id).update(
+                units_sold=F("units_sold") + units,
+                orders_count=F("orders_count") + 1,
+                revenue=F("revenue") + revenue,
+                units_7d=F("units_7d") + units,
+                units_30d=F("units_30d") + units,
+                updated_at=timezone.now(),
+            )
+
+
+# ===========================
+# Rolling windows
+# ===========================
+def refresh_sales_windows(today=None):
+    """
+    Recompute units_7d / units_30d from the day rows.
+
+    Sales only ever add to the windows; days falling out of a window are
+    removed here, so run this daily (``backfill_sales_stats --windows``).
+    """
+    today = today or timezone.localdate()
+    longest = max(WINDOWS.values())
+    sums = ProductSalesDay.objects.filter(day__gt=today - timedelta(days=longest)).values("product_id").annotate(
+        **{
+            field: Sum("units", filter=Q(day__gt=today - timedelta(days=days)))
+            for field, days in WINDOWS.items()
+        }
+    )
+    windows = {row["product_id"]: row for row in sums}
+
+    with transaction.atomic():
+        # Products with nothing in the window drop to zero in one UPDATE
+        ProductSalesStats.objects.exclude(product_id__in=list(windows)).update(**{field: 0 for field in WINDOWS})
+        stats = list(ProductSalesStats.objects.filter(product_id__in=list(windows)))
+        for stat in stats:
+            for field in WINDOWS:
+                setattr(stat, field, windows[stat.product_id][field] or 0)
+        ProductSalesStats.objects.bulk_update(stats, list(WINDOWS), batch_size=BATCH_SIZE)
+    return len(stats)
+
+
+# ===========================
+# Backfill
+# ===========================
+def rebuild_sales_stats():
+    """
+    Rebuild both tables from every completed order. Returns the product count.
+
+    An order counts as a sale once it has a CompletedOrder, the same moment
+    checkout_complete records it.
+    """
+    days = defaultdict(lambda: [0, 0, Decimal("0")])
+    stats = defaultdict(lambda: [0, 0, Decimal("0")])
+    rows = (
+        OrderItem.objects.filter(order__completion__isnull=False)
+        .values_list("order_id", "product_id", "quantity", "item_total", "order__completion__completed_at")
+        .order_by("order_id")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    current_order, seen = None, set()
+    for order_id, product_id, quantity, item_total, completed_at in rows:
+        if order_id != current_order:
+            current_order, seen = order_id, set()
+        day = timezone.localdate(completed_at)
+        first_in_order = product_id not in seen
+        seen.add(product_id)
+        for bucket in (days[(product_id, day)], stats[product_id]):
+            bucket[0] += quantity
+            bucket[1] += 1 if first_in_order else 0
+            bucket[2] += item_total or 0
+
+    with transaction.atomic():
+        ProductSalesDay.objects.all().delete()
+        ProductSalesStats.objects.all().delete()
+        ProductSalesDay.objects.bulk_create(
+            (
+                ProductSalesDay(product_id=product_id, day=day, units=units, orders=orders, revenue=revenue)
+                for (product_id, day), (units, orders, revenue) in days.items()
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        ProductSalesStats.objects.bulk_create(
+            (
+                ProductSalesStats(product_id=product_id, units_sold=units, orders_count=orders, revenue=revenue)
+                for product_id, (units, orders, revenue) in stats.items()
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        refresh_sales_windows()
+    return len(stats)
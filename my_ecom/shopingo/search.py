@@ -0,0 +1,197 @@
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+from .models import Product, ProductListing, ProductTag, Variation
+from .versions import CATALOG, bump_version
+
+
+SEARCH_TABLE = "shopingo_product_search"
+
+
+# ===========================
+# Document
+# ===========================
+def _document(product):
+    """(title, body, taxonomy) text of one product for the search index."""
+    body = " ".join(
+        strip_tags(text)
+        for text in (product.description, product.description_details)
+        if text
+    )
+    brands = (
+        Variation.objects.filter(product=product)
+        .values_list("brand__name", flat=True)
+        .distinct()
+    )
+    tags = ProductTag.objects.filter(product=product, tag__isnull=False).values_list("tag__name", flat=True)
+    taxonomy = [product.category.name]
+    if product.subcategory_id:
+        taxonomy.append(product.subcategory.name)
+    taxonomy += [b for b in brands if b]
+    taxonomy += [t for t in tags if t]
+    return product.title, body, " ".join(taxonomy)
+
+
+def _terms(query):
+    return re.findall(r"\w+", query or "")
+
+
+# ===========================
+# Index maintenance
+# ===========================
+def index_product(product):
+    """Add or replace one product in the search index."""
+    title, body, taxonomy = _document(product)
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product.id])
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, title, body, taxonomy) VALUES (%s, %s, %s, %s)",
+                [product.id, title, body, taxonomy],
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                f"""
+                INSERT INTO {SEARCH_TABLE} (product_id, document)
+                VALUES (%s, setweight(to_tsvector('english', %s), 'A')
+                         || setweight(to_tsvector('english', %s), 'C')
+                         || setweight(to_tsvector('english', %s), 'B'))
+                ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document
+                """,
+                [product.id, title, body, taxonomy],
+            )
+
+
+def index_product_id(product_id):
+    product = Product.objects.select_related("category", "subcategory").filter(id=product_id).first()
+    if product is not None:
+        index_product(product)
+
+
+def remove_product(product_id):
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product_id])
+        elif connection.vendor == "postgresql":
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE product_id = %s", [product_id])
+
+
+def rebuild_index():
+    """Re-index every product. Returns the number of indexed products."""
+    with connection.cursor() as cursor:
+        if connection.vendor in ("sqlite", "postgresql"):
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    total = 0
+    for product in Product.objects.select_related("category", "subcategory").iterator():
+        index_product(product)
+        total += 1
+    # Search pages carry CATALOG in their ETag
+    bump_version(CATALOG)
+    return total
+
+
+# ===========================
+# Query
+# ===========================
+def _match(terms):
+    if connection.vendor == "sqlite":
+        return " ".join(f'"{term}"*' for term in terms)
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def search_listings(query):
+    """
+    ProductListing queryset of every match (every term must match, as a
+    prefix). Nothing is capped: the search table is an ``id__in`` subquery,
+    so filters, the page count and the sidebar facets cover the whole
+    result. Page it through ranked_listings() for best-match-first order.
+    """
+    terms = _terms(query)
+    if not terms:
+        return ProductListing.objects.none()
+
+    if connection.vendor == "sqlite":
+        return ProductListing.objects.filter(
+            product_id__in=RawSQL(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", [_match(terms)])
+        )
+
+    if connection.vendor == "postgresql":
+        return ProductListing.objects.filter(
+            product_id__in=RawSQL(
+                f"SELECT product_id FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('english', %s)", [_match(terms)]
+            )
+        )
+
+    # Other backends: no index, plain substring match on the listing rows
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(category_name__icontains=term) | Q(tag_names__icontains=term)
+    return ProductListing.objects.filter(condition).order_by("-product_id")
+
+
+class RankedListings:
+    """
+    A (filtered) search result as Paginator sees it: ``count()`` is the
+    queryset's COUNT, and a slice runs the ranked search query itself with
+    LIMIT/OFFSET, restricted to the queryset's ids. Only one page of ids is
+    ranked and loaded, however many products match.
+    """
+
+    def __init__(self, queryset, query):
+        self.queryset = queryset
+        self.match = _match(_terms(query))
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        offset = key.start or 0
+        limit = max((key.stop - offset) if key.stop is not None else self.count(), 0)
+        ids = self._ranked_ids(limit, offset)
+        rows = self.queryset.model.objects.in_bulk(ids)
+        return [rows[pid] for pid in ids if pid in rows]
+
+    def _ranked_ids(self, limit, offset):
+        try:
+            subquery, params = self.queryset.order_by().values("product_id").query.sql_with_params()
+        except EmptyResultSet:
+            return []
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                # bm25: lower is better; weights for title, body, taxonomy.
+                # "+rowid": test the ids while scanning the match, not one
+                # full-text lookup per id
+                cursor.execute(
+                    f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND +rowid IN ({subquery}) "
+                    f"ORDER BY bm25({SEARCH_TABLE}, 10.0, 1.0, 4.0), rowid DESC LIMIT %s OFFSET %s",
+                    [self.match, *params, limit, offset],
+                )
+            else:
+                cursor.execute(
+                    f"SELECT product_id FROM {SEARCH_TABLE}, to_tsquery('english', %s) query "
+                    f"WHERE document @@ query AND product_id IN ({subquery}) "
+                    f"ORDER BY ts_rank(document, query) DESC, product_id DESC LIMIT %s OFFSET %s",
+                    [self.match, *params, limit, offset],
+                )
+            return [row[0] for row in cursor.fetchall()]
+
+
+def ranked_listings(query):
+    """
+    ``rank`` argument for catalog.listing_context(): wraps the filtered
+    search result so pages come best match first. None (keep the
+    queryset's order) when the backend has no search index.
+    """
+    if connection.vendor not in ("sqlite", "postgresql") or not _terms(query):
+        return None
+    return lambda queryset: RankedListings(queryset, query)
@@ -0,0 +1,308 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from accounts.models import CountryName, District, Division
+
+from .models import (
+    Brand, Cart, Category, Color, PersonalInfo, Product, ProductImage, ProductListing, ProductTag,
+    ShippingCharge, Size, SubCategory, Tag, Variation, Wishlist,
+)
+from .listings import refresh_listing, refresh_tag_names
+from . import facets, images, popularity, search
+from .catalog import invalidate_listings, invalidate_product_listings
+from .versions import CATALOG, GEOGRAPHY, NAVIGATION, SITE, TYPEAHEAD, VARIATION_LABELS, bump_version, product_content, product_variations, user_cart
+
+
+# ===========================
+# ProductListing sync
+# ===========================
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    refresh_listing(instance.id)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Variation)
+@receiver(post_save, sender=ProductTag)
+def product_part_saved(sender, instance, **kwargs):
+    if instance.product_id:
+        refresh_listing(instance.product_id)
+
+
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Variation)
+@receiver(post_delete, sender=ProductTag)
+def product_part_deleted(sender, instance, **kwargs):
+    if instance.product_id:
+        refresh_listing(instance.product_id, create=False)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    if not created:
+        ProductListing.objects.filter(category=instance).update(category_name=instance.name)
+
+
+@receiver(post_save, sender=Brand)
+def brand_saved(sender, instance, created, **kwargs):
+    if not created:
+        ProductListing.objects.filter(brand=instance).update(brand_name=instance.name or "")
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    if not created:
+        refresh_tag_names(ProductTag.objects.filter(tag=instance, product__isnull=False).values_list("product_id", flat=True))
+
+
+
+# ===========================
+# Search index sync
+# ===========================
+@receiver(post_save, sender=Product)
+def product_saved_search(sender, instance, **kwargs):
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted_search(sender, instance, **kwargs):
+    search.remove_product(instance.id)
+
+
+@receiver(post_save, sender=Variation)
+@receiver(post_save, sender=ProductTag)
+@receiver(post_delete, sender=Variation)
+@receiver(post_delete, sender=ProductTag)
+def product_taxonomy_changed(sender, instance, **kwargs):
+    if instance.product_id:
+        search.index_product_id(instance.product_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Tag)
+def taxonomy_renamed(sender, instance, created, **kwargs):
+    if created:
+        return
+    if sender is Category:
+        products = Product.objects.filter(category=instance)
+    elif sender is SubCategory:
+        products = Product.objects.filter(subcategory=instance)
+    elif sender is Brand:
+        products = Product.objects.filter(variations__brand=instance)
+    else:
+        products = Product.objects.filter(tags__tag=instance)
+    for product_id in products.values_list("id", flat=True).distinct():
+        search.index_product_id(product_id)
+
+
+
+# ===========================
+# Typeahead version (saves bump it in the models' save())
+# ===========================
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_delete, sender=Tag)
+def typeahead_source_deleted(sender, instance, **kwargs):
+    bump_version(TYPEAHEAD)
+
+
+
+# ===========================
+# Bitmap facet index change log
+# ===========================
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed_facets(sender, instance, **kwargs):
+    if facets.facet_index_enabled():
+        facets.record_change(instance.id)
+
+
+@receiver(post_save, sender=Variation)
+@receiver(post_save, sender=ProductTag)
+@receiver(post_delete, sender=Variation)
+@receiver(post_delete, sender=ProductTag)
+def product_facets_changed(sender, instance, **kwargs):
+    if instance.product_id and facets.facet_index_enabled():
+        facets.record_change(instance.product_id)
+
+
+
+# ===========================
+# Listing result cache versions
+# ===========================
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=ProductTag)
+def listing_scope_moving(sender, instance, **kwargs):
+    # An edit can move a product out of a category / subcategory (or a
+    # ProductTag to another tag): the old scope has to be bumped as well.
+    if not instance.pk:
+        return
+    if sender is Product:
+        old = Product.objects.filter(pk=instance.pk).values_list("category_id", "subcategory_id").first()
+        if old:
+            invalidate_listings(category_ids=[old[0]], subcategory_ids=[old[1]])
+    else:
+        old_tag = ProductTag.objects.filter(pk=instance.pk).values_list("tag_id", flat=True).first()
+        invalidate_listings(tag_ids=[old_tag])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_listing_scopes_changed(sender, instance, **kwargs):
+    invalidate_listings(
+        category_ids=[instance.category_id],
+        subcategory_ids=[instance.subcategory_id],
+        tag_ids=ProductTag.objects.filter(product_id=instance.id).values_list("tag_id", flat=True),
+    )
+
+
+@receiver(post_save, sender=Variation)
+@receiver(post_delete, sender=Variation)
+def variation_listing_scopes_changed(sender, instance, **kwargs):
+    invalidate_product_listings(instance.product_id)
+
+
+@receiver(post_save, sender=ProductTag)
+@receiver(post_delete, sender=ProductTag)
+def product_tag_listing_scope_changed(sender, instance, **kwargs):
+    invalidate_listings(tag_ids=[instance.tag_id])
+
+
+
+# ===========================
+# Catalog version (home feed snapshot, page ETags)
+# ===========================
+@receiver(post_save, sender=ProductListing)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=ProductTag)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Color)
+@receiver(post_save, sender=Size)
+@receiver(post_delete, sender=ProductListing)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=ProductTag)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Color)
+@receiver(post_delete, sender=Size)
+def catalog_changed(sender, instance, **kwargs):
+    bump_version(CATALOG)
+
+
+# ===========================
+# Site / navigation / geography versions (page ETags, menus)
+# ===========================
+@receiver(post_save, sender=PersonalInfo)
+@receiver(post_save, sender=ShippingCharge)
+@receiver(post_save, sender=CountryName)
+@receiver(post_delete, sender=PersonalInfo)
+@receiver(post_delete, sender=ShippingCharge)
+@receiver(post_delete, sender=CountryName)
+def site_changed(sender, instance, **kwargs):
+    # Header / footer data every page renders
+    bump_version(SITE)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=PersonalInfo)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=PersonalInfo)
+def navigation_changed(sender, instance, **kwargs):
+    bump_version(NAVIGATION)
+
+
+@receiver(post_save, sender=CountryName)
+@receiver(post_save, sender=Division)
+@receiver(post_save, sender=District)
+@receiver(post_delete, sender=CountryName)
+@receiver(post_delete, sender=Division)
+@receiver(post_delete, sender=District)
+def geography_changed(sender, instance, **kwargs):
+    bump_version(GEOGRAPHY)
+
+
+
+# ===========================
+# Wishlist counter (covers the views, queryset deletes and cascades)
+# ===========================
+@receiver(post_save, sender=Wishlist)
+def wishlist_saved(sender, instance, created, **kwargs):
+    if created:
+        popularity.wishlist_added(instance.product_id)
+
+
+@receiver(post_delete, sender=Wishlist)
+def wishlist_deleted(sender, instance, **kwargs):
+    popularity.wishlist_removed(instance.product_id)
+
+
+
+# ===========================
+# Primary image pointer
+# ===========================
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def product_image_changed(sender, instance, **kwargs):
+    if instance.product_id:
+        images.refresh_primary_image(instance.product_id)
+
+
+
+# ===========================
+# Variation matrix versions
+# ===========================
+@receiver(post_save, sender=Variation)
+@receiver(post_delete, sender=Variation)
+def variation_matrix_changed(sender, instance, **kwargs):
+    bump_version(product_variations(instance.product_id))
+
+
+@receiver(post_save, sender=Color)
+@receiver(post_save, sender=Size)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Color)
+@receiver(post_delete, sender=Size)
+@receiver(post_delete, sender=Brand)
+def variation_labels_changed(sender, instance, **kwargs):
+    bump_version(VARIATION_LABELS)
+
+
+
+# ===========================
+# Product content version (quick view fragment / ETag)
+# ===========================
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_content_changed(sender, instance, **kwargs):
+    bump_version(product_content(instance.id))
+
+
+@receiver(post_save, sender=Variation)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=Variation)
+@receiver(post_delete, sender=ProductImage)
+def product_part_content_changed(sender, instance, **kwargs):
+    if instance.product_id:
+        bump_version(product_content(instance.product_id))
+
+
+
+# ===========================
+# Per-user cart summary
+# ===========================
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    # Mutation paths save or delete Cart rows (queryset deletes send
+    # post_delete per row too); carts.set_cart_quantity bumps by itself
+    bump_version(user_cart(instance.user_id))
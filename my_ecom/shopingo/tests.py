@@ -1,3 +1,1095 @@
-from django.test import TestCase
+import json
+import math
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import CountryName
+
+from .admin import ProductAdmin
+from .carts import (
+    MAX_CART_OPERATIONS, MAX_LINE_QUANTITY, apply_cart_operations, build_cart_lines, cart_totals, get_cart_lines,
+    set_cart_quantity,
+)
+from .catalog import (
+    DISCOUNT_BUCKETS, PRICE_BUCKETS, SORT_ORDERING, STOCK_BUCKETS, _run_listing, histogram, listing_cache_key, listing_context,
+    parse_listing_filters, run_listing, top_k_per_group,
+)
+from .checks import check_shared_cache
+from .context_processors import cart_context, cart_summary
+from .facets import FacetIndex, get_facet_index
+from .guest_cart import GUEST_CART_COOKIE, MAX_GUEST_LINES, merge_guest_cart, read_guest_cart, write_guest_cart
+from .listings import rebuild_listings
+from .models import (
+    Brand, Cart, Category, Color, CompletedOrder, Order, OrderItem, Product, ProductImage, ProductListing,
+    ProductSalesDay, ProductSalesStats, ProductTag, Size, Tag, Variation, Wishlist,
+)
+from .navigation import get_navigation
+from .pagination import encode_cursor
+from .sales import record_order_sales, rebuild_sales_stats, refresh_sales_windows
+from .recommendations import MAX_BASKET, co_occurrence, rebuild_recommendations, recommended_listings, top_neighbours
+from .search import ranked_listings, search_listings
+from .typeahead import suggest
+from .variants import get_variation_matrix
+from .versions import (
+    CATALOG, FACETS, GEOGRAPHY, NAVIGATION, SITE, TYPEAHEAD, bump_version, get_version, get_versions,
+    listing_scope, product_content, product_variations, user_cart,
+)
+
+User = get_user_model()
+
+
+# ===========================
+# Fixtures
+# ===========================
+class CatalogTestCase(TestCase):
+    """
+    A small catalog:
+
+    ======  ==========================================
+    one     Alpha / red / S / 30,  Beta / blue / M / 80
+    two     Alpha / blue / S / 15
+    three   Beta / red / M / 45
+    four    Alpha / red / M / 95,  Alpha / blue / S / 5
+    ======  ==========================================
+    """
+
+    def setUp(self):
+        # Versions and built copies live in the cache, not in the test transaction
+        cache.clear()
+        self.seller = User.objects.create_user(email="seller@example.com", password="x", username="seller")
+        self.category = Category.objects.create(name="Shoes")
+        self.alpha = Brand.objects.create(name="Alpha")
+        self.beta = Brand.objects.create(name="Beta")
+        self.red = Color.objects.create(name="Red")
+        self.blue = Color.objects.create(name="Blue")
+        self.small = Size.objects.create(name="S")
+        self.medium = Size.objects.create(name="M")
+
+        self.one = self.make_product("One", [(self.alpha, self.red, self.small, 30), (self.beta, self.blue, self.medium, 80)])
+        self.two = self.make_product("Two", [(self.alpha, self.blue, self.small, 15)])
+        self.three = self.make_product("Three", [(self.beta, self.red, self.medium, 45)])
+        self.four = self.make_product("Four", [(self.alpha, self.red, self.medium, 95), (self.alpha, self.blue, self.small, 5)])
+
+    def make_product(self, title, variations=(), price=100):
+        product = Product.objects.create(title=title, price=Decimal(price), category=self.category, seller=self.seller)
+        for brand, color, size, discount in variations:
+            Variation.objects.create(
+                product=product, brand=brand, color=color, size=size,
+                price=Decimal(price), discount_price=Decimal(discount),
+            )
+        return product
+
+    def filters(self, **params):
+        return parse_listing_filters(RequestFactory().get("/", params))
+
+
+# ===========================
+# Faceted listing (catalog.py / facets.py)
+# ===========================
+class ListingFilterTests(CatalogTestCase):
+    def listing(self, filters, bitmap=False):
+        with self.settings(SHOPINGO_FACET_INDEX=bitmap):
+            result = _run_listing(
+                ProductListing.objects.filter(category_id=self.category.id), filters, ("category", [self.category.id])
+            )
+        page_obj = result["page_obj"]
+        return (
+            [row.product_id for row in page_obj],
+            page_obj.paginator.count,
+            {brand.id: brand.product_count for brand in result["brands"]},
+            {color.id: color.product_count for color in result["colors"]},
+            result["discount_data"],
+        )
+
+    def test_filters_match_any_variation_of_a_product(self):
+        # One has a Beta variation and a (different) red variation
+        products = self.listing(self.filters(brand=self.beta.id, color=self.red.id))[0]
+        self.assertEqual(sorted(products), [self.one.id, self.three.id])
+
+    def test_discount_bucket_narrows_the_page_not_the_counts(self):
+        products, count, brands, colors, discount_data = self.listing(self.filters(brand=self.alpha.id, discount=10))
+        self.assertEqual(products, [self.four.id])
+        self.assertEqual(brands[self.alpha.id], 3)
+        self.assertEqual({row["value"]: row["count"] for row in discount_data}[20], 1)
+
+    def test_orm_and_bitmap_paths_agree(self):
+        cases = [
+            {},
+            {"brand": self.alpha.id},
+            {"brand": self.beta.id, "color": self.red.id},
+            {"brand": [self.alpha.id, self.beta.id], "size": self.medium.id},
+            {"color": self.blue.id, "discount": 20},
+            {"top_color": self.red.id},
+            {"price_range": "5-49"},
+            {"price_range": "49-99", "brand": self.alpha.id},
+            {"discount": 90},
+            {"color": self.red.id, "per_page": 1, "page": 2},
+        ]
+        self.three.price = Decimal(60)
+        self.three.save()
+        for params in cases:
+            for sort in ("", "price_asc", "price_desc", "newest"):
+                with self.subTest(params=params, sort=sort):
+                    filters = self.filters(sort=sort, **params)
+                    self.assertEqual(self.listing(filters), self.listing(filters, bitmap=True))
+
+    def cursor_page(self, sort, per_page, cursor=""):
+        return _run_listing(
+            ProductListing.objects.filter(category_id=self.category.id),
+            self.filters(sort=sort, paging="cursor", per_page=per_page, cursor=cursor),
+            ("category", [self.category.id]),
+        )["page_obj"]
+
+    def cursor_pages(self, sort, per_page=9):
+        """Every page of a ?paging=cursor listing, following next_cursor, then back along previous_cursor."""
+        pages = [self.cursor_page(sort, per_page)]
+        while pages[-1].has_next():
+            pages.append(self.cursor_page(sort, per_page, pages[-1].next_cursor))
+        backwards = [pages[-1]]
+        while backwards[-1].has_previous():
+            backwards.append(self.cursor_page(sort, per_page, backwards[-1].previous_cursor))
+        self.assertEqual(
+            [[row.product_id for row in page] for page in reversed(backwards)],
+            [[row.product_id for row in page] for page in pages],
+        )
+        return [[row.product_id for row in page] for page in pages]
+
+    def test_cursor_pages_walk_the_whole_listing_once(self):
+        # Ties on price are broken by product id, across page boundaries too
+        self.three.price = Decimal(60)
+        self.three.save()
+        for title in ("Five", "Six", "Seven", "Eight", "Nine", "Ten", "Eleven", "Twelve", "Thirteen", "Fourteen"):
+            self.make_product(title, [(self.beta, self.blue, self.small, 10)], price=60)
+        for sort in ("price_asc", "price_desc", "newest"):
+            with self.subTest(sort=sort):
+                offset_order = self.listing(self.filters(sort=sort, per_page=100))[0]
+                for per_page in (9, 12):
+                    pages = self.cursor_pages(sort, per_page)
+                    self.assertEqual([pid for page in pages for pid in page], offset_order)
+                    self.assertTrue(all(len(page) == per_page for page in pages[:-1]))
+
+    def test_forged_or_foreign_cursor_starts_over(self):
+        first = self.cursor_pages("price_asc")[0]
+        newest_cursor = encode_cursor(SORT_ORDERING["newest"], [self.three.id])
+        for cursor in ("garbage", newest_cursor[:-2] + "xx", newest_cursor):
+            with self.subTest(cursor=cursor):
+                page_obj = self.cursor_page("price_asc", 9, cursor)
+                self.assertEqual([row.product_id for row in page_obj], first)
+                self.assertFalse(page_obj.has_previous())
+
+    def test_page_size_outside_the_select_falls_back(self):
+        for per_page in ("0", "-3", "100000", "lots"):
+            with self.subTest(per_page=per_page):
+                self.assertEqual(self.filters(per_page=per_page)["per_page"], 12)
+                response = self.client.get(
+                    f"/category/{self.category.slug}/", {"paging": "cursor", "sort": "newest", "per_page": per_page}
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_listing_pages_link_to_their_neighbours(self):
+        for title in ("Five", "Six", "Seven", "Eight", "Nine", "Ten"):
+            self.make_product(title, [(self.beta, self.blue, self.small, 10)])
+        url = f"/category/{self.category.slug}/"
+
+        response = self.client.get(url, {"sort": "newest", "per_page": 9, "page": 2})
+        self.assertContains(response, "?sort=newest&amp;per_page=9&amp;page=1")
+
+        response = self.client.get(url, {"paging": "cursor", "sort": "newest", "per_page": 9})
+        next_cursor = response.context["page_obj"].next_cursor
+        self.assertContains(response, urlencode({"cursor": next_cursor}))
+        response = self.client.get(url, {"paging": "cursor", "sort": "newest", "per_page": 9, "cursor": next_cursor})
+        self.assertEqual(len(response.context["page_obj"]), 1)
+        self.assertContains(response, urlencode({"cursor": response.context["page_obj"].previous_cursor}))
+
+
+@override_settings(SHOPINGO_FACET_INDEX=True)
+class FacetIndexTests(CatalogTestCase):
+    def test_ids_walks_every_set_bit(self):
+        ids = [0, 1, 7, 8, 63, 64, 65, 1000, 4095]
+        bits = sum(1 << pid for pid in ids)
+        self.assertEqual(list(FacetIndex.ids(bits)), ids)
+        self.assertEqual(list(FacetIndex.ids(bits, reverse=True)), ids[::-1])
+        self.assertEqual(list(FacetIndex.ids(0)), [])
+
+    def test_changes_of_one_transaction_are_one_version_applied_to_a_copy(self):
+        index = get_facet_index()
+        version = get_version(FACETS)
+        beta_two = 1 << self.two.id
+        with self.captureOnCommitCallbacks(execute=True):
+            Variation.objects.create(
+                product=self.two, brand=self.beta, color=self.red, size=self.medium,
+                price=Decimal(100), discount_price=Decimal(45),
+            )
+            self.two.title = "Two and a half"
+            self.two.save()
+        self.assertEqual(get_version(FACETS), version + 1)
+
+        replayed = get_facet_index()
+        self.assertIsNot(replayed, index)
+        self.assertEqual(replayed.count("brand", self.beta.id, beta_two), 1)
+        # Readers still holding the old copy never see a half-applied change
+        self.assertEqual(index.count("brand", self.beta.id, beta_two), 0)
+
+    def test_nothing_is_published_for_a_rolled_back_transaction(self):
+        version = get_version(FACETS)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.two.title = "Renamed"
+                    self.two.save()
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+        self.assertEqual(get_version(FACETS), version)
+
+
+# ===========================
+# Full-text search (search.py)
+# ===========================
+class SearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.titled = self.make_product("Canvas boot", [(self.alpha, self.red, self.small, 30)])
+        self.described = self.make_product("Garden hose", [(self.beta, self.blue, self.small, 30)])
+        self.described.description = "<p>Rinse any boot clean</p>"
+        self.described.save()
+
+    def search(self, query, **params):
+        context = listing_context(search_listings(query), self.filters(**params), "left", rank=ranked_listings(query))
+        return [row.product_id for row in context["page_obj"]], context
+
+    def test_title_match_ranks_above_body_match(self):
+        self.assertEqual(self.search("boot")[0], [self.titled.id, self.described.id])
+
+    def test_every_term_must_match_as_a_prefix(self):
+        self.assertEqual(self.search("gard ho")[0], [self.described.id])
+        self.assertEqual(self.search("garden boot polish")[0], [])
+
+    def test_pages_are_ranked_and_counted_over_every_match(self):
+        for n in range(9):
+            self.make_product(f"Leather boot {n}")
+        ids, context = self.search("boot", per_page=9, page=2)
+        self.assertEqual((len(ids), ids[-1]), (2, self.described.id))
+        self.assertEqual(context["page_obj"].paginator.count, 11)
+
+    def test_filters_and_facets_apply_to_the_matches(self):
+        ids, context = self.search("boot", brand=self.beta.id)
+        self.assertEqual(ids, [self.described.id])
+        counts = {brand.id: brand.product_count for brand in context["brands"]}
+        self.assertEqual(counts, {self.alpha.id: 0, self.beta.id: 1})
+
+    def test_explicit_sort_replaces_relevance(self):
+        self.assertEqual(self.search("boot", sort="newest")[0], [self.described.id, self.titled.id])
+
+
+# ===========================
+# Typeahead (typeahead.py)
+# ===========================
+class TypeaheadTests(CatalogTestCase):
+    def test_saves_that_keep_title_and_slug_leave_the_index_alone(self):
+        version = get_version(TYPEAHEAD)
+        self.one.price = Decimal(120)
+        self.one.save()
+        self.category.save()
+        self.assertEqual(get_version(TYPEAHEAD), version)
+
+    def test_rename_is_suggested(self):
+        self.assertEqual(suggest("one")[0]["label"], "One")
+        version = get_version(TYPEAHEAD)
+        self.one.title = "Oneiric sneaker"
+        self.one.save()
+        self.assertNotEqual(get_version(TYPEAHEAD), version)
+        self.assertEqual([row["label"] for row in suggest("sneak")], ["Oneiric sneaker"])
+
+
+# ===========================
+# Cache invalidation (versions.py / signals.py)
+# ===========================
+class InvalidationTests(CatalogTestCase):
+    def test_a_read_before_the_commit_is_not_served_after_it(self):
+        scope = ProductListing.objects.filter(category_id=self.category.id)
+        scope_key = ("category", [self.category.id])
+        filters = self.filters(brand=self.beta.id)
+        run_listing(scope, filters, scope_key)
+        old = cache.get(listing_cache_key(scope_key, filters))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Variation.objects.create(
+                product=self.two, brand=self.beta, color=self.red, size=self.medium,
+                price=Decimal(100), discount_price=Decimal(45),
+            )
+            # A request in the gap still reads the old rows, and caches them
+            # under the version it sees now
+            cache.set(listing_cache_key(scope_key, filters), old)
+
+        result = run_listing(scope, filters, scope_key)
+        self.assertIn(self.two.id, [row.product_id for row in result["page_obj"]])
+
+    def test_bitmap_results_are_keyed_on_the_facet_index_version(self):
+        scope_key = ("category", [self.category.id])
+        filters = self.filters(brand=self.beta.id)
+        for enabled in (True, False):
+            with self.subTest(bitmap=enabled), self.settings(SHOPINGO_FACET_INDEX=enabled):
+                key = listing_cache_key(scope_key, filters)
+                # The scope version's commit bump can land before the index is republished
+                bump_version(FACETS, again_on_commit=False)
+                self.assertEqual(listing_cache_key(scope_key, filters) != key, enabled)
+
+    def test_every_write_bumps_again_on_commit_once_per_version(self):
+        customer = User.objects.create_user(email="customer@example.com", password="x", username="customer")
+        writes = [
+            ("category", lambda: Category.objects.filter(pk=self.category.pk).first().save(), [CATALOG, NAVIGATION]),
+            ("variations", lambda: [v.save() for v in self.one.variations.all()], [
+                product_variations(self.one.id), product_content(self.one.id), listing_scope("category", self.category.id),
+            ]),
+            ("cart", lambda: Cart.objects.create(user=customer, product=self.one, quantity=2), [user_cart(customer.id)]),
+            ("country", lambda: CountryName.objects.create(nameName="Bangladesh"), [GEOGRAPHY, SITE]),
+        ]
+        for label, write, names in writes:
+            with self.subTest(label):
+                with self.captureOnCommitCallbacks(execute=True):
+                    write()
+                    between = get_versions(names)
+                after = get_versions(names)
+                self.assertEqual(after, {name: between[name] + 1 for name in names})
+
+    def test_navigation_follows_a_rename(self):
+        self.assertEqual([c.name for c in get_navigation()["categories"]], ["Shoes"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Boots"
+            self.category.save()
+        self.assertEqual([c.name for c in get_navigation()["categories"]], ["Boots"])
+
+    def test_process_local_cache_is_reported_outside_debug(self):
+        with self.settings(DEBUG=False):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ["shopingo.W001"])
+            shared = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "shared"}}
+            with self.settings(CACHES=shared):
+                self.assertEqual(check_shared_cache(None), [])
+        with self.settings(DEBUG=True):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+# ===========================
+# Home feed (feeds.py)
+# ===========================
+class HomeFeedTests(CatalogTestCase):
+    def test_a_cached_home_page_runs_no_query(self):
+        Category.objects.create(name="Empty shelf")
+        response = self.client.get("/")
+        self.assertEqual([c.name for c in response.context["carousel_categories"]], ["Shoes"])
+        # The header menu lists every category, not only the carousel's
+        self.assertContains(response, "Empty shelf")
+
+        with self.assertNumQueries(0):
+            self.client.get("/")
+
+
+# ===========================
+# ProductListing read model (listings.py)
+# ===========================
+class ListingSyncTests(CatalogTestCase):
+    def listing(self, product):
+        return ProductListing.objects.get(product=product)
+
+    def test_renames_reach_the_listing_rows(self):
+        boots, sale = Tag.objects.create(name="Boots"), Tag.objects.create(name="Sale")
+        ProductTag.objects.create(product=self.one, tag=boots)
+        ProductTag.objects.create(product=self.one, tag=sale)
+        self.assertEqual(self.listing(self.one).tag_names, "Boots, Sale")
+
+        self.category.name = "Footwear"
+        self.category.save()
+        self.beta.name = "Bravo"
+        self.beta.save()
+        sale.name = "Clearance"
+        sale.save()
+        one, three = self.listing(self.one), self.listing(self.three)
+        self.assertEqual((one.category_name, one.tag_names), ("Footwear", "Boots, Clearance"))
+        self.assertEqual(three.brand_name, "Bravo")
+
+        boots.delete()
+        self.assertEqual(self.listing(self.one).tag_names, "Clearance")
+
+    def test_rebuild_restores_every_row_in_batches(self):
+        ProductTag.objects.create(product=self.two, tag=Tag.objects.create(name="Boots"))
+        expected = list(ProductListing.objects.order_by("product_id").values())
+
+        ProductListing.objects.filter(product=self.one).update(title="stale", tag_names="stale")
+        ProductListing.objects.filter(product=self.two).delete()
+        # A stale row (later batch) holding the slug an earlier product uses now
+        ProductListing.objects.filter(product=self.one).update(slug="old-one")
+        ProductListing.objects.filter(product=self.four).update(slug=self.one.slug)
+
+        with mock.patch("shopingo.listings.BATCH_SIZE", 2):
+            self.assertEqual(rebuild_listings(), 4)
+        self.assertEqual(list(ProductListing.objects.order_by("product_id").values()), expected)
+
+
+# ===========================
+# Denormalized product fields
+# ===========================
+class MaintainedFieldTests(CatalogTestCase):
+    def admin_save(self, product):
+        ProductAdmin(Product, admin.site).save_model(RequestFactory().post("/"), product, None, change=True)
+
+    def test_admin_edit_of_a_stale_instance_keeps_the_wishlist_count(self):
+        stale = Product.objects.get(pk=self.one.pk)
+        customer = User.objects.create_user(email="customer@example.com", password="x", username="customer")
+        Wishlist.objects.create(user=customer, product=self.one)
+
+        stale.title = "One, renamed"
+        self.admin_save(stale)
+
+        self.one.refresh_from_db()
+        self.assertEqual((self.one.title, self.one.wishlist_count), ("One, renamed", 1))
+
+    def test_admin_edit_of_a_stale_instance_keeps_the_primary_image(self):
+        stale = Product.objects.get(pk=self.one.pk)
+        image = ProductImage.objects.create(product=self.one, image="products/one.jpg", is_primary=True)
+
+        stale.title = "One, renamed"
+        self.admin_save(stale)
+
+        self.one.refresh_from_db()
+        self.assertEqual(self.one.primary_image_id, image.id)
+
+    def test_plain_save_keeps_django_semantics(self):
+        # The pk=None copy idiom inserts a new row
+        copy = Product.objects.get(pk=self.two.pk)
+        copy.pk, copy.slug = None, "two-copy"
+        copy.save()
+        self.assertEqual(Product.objects.filter(title="Two").count(), 2)
+
+        # A row deleted under an instance is inserted again
+        gone = Product.objects.get(pk=self.three.pk)
+        Product.objects.filter(pk=self.three.pk).delete()
+        gone.save()
+        self.assertTrue(Product.objects.filter(pk=self.three.pk).exists())
+
+
+# ===========================
+# Guest cart (guest_cart.py)
+# ===========================
+class GuestCartTests(CatalogTestCase):
+    ajax = {"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"}
+
+    def set_guest_cart(self, lines):
+        response = HttpResponse()
+        write_guest_cart(response, lines)
+        self.client.cookies[GUEST_CART_COOKIE] = response.cookies[GUEST_CART_COOKIE].value
+
+    def guest_lines(self):
+        request = RequestFactory().get("/")
+        request.COOKIES[GUEST_CART_COOKIE] = self.client.cookies[GUEST_CART_COOKIE].value
+        return read_guest_cart(request)
+
+    def add(self, product, quantity=1):
+        return self.client.post(
+            "/handle-product-action/", {"action": "cart", "product_id": product.id, "quantity": quantity}, **self.ajax
+        )
+
+    def test_add_and_remove_only_touch_the_cookie(self):
+        with self.assertNumQueries(1):  # the product lookup
+            self.assertTrue(self.add(self.one, 2).json()["success"])
+        self.add(self.two)
+        self.add(self.one)
+        self.assertEqual([line[:2] for line in self.guest_lines()], [[self.one.id, 3], [self.two.id, 1]])
+
+        response = self.client.post(f"/remove-cart-item/{self.one.id}/", **self.ajax)
+        self.assertEqual(response.json()["cart_total_items"], 1)
+        self.assertEqual([line[:2] for line in self.guest_lines()], [[self.two.id, 1]])
+
+    def test_remove_is_refused_on_get(self):
+        self.set_guest_cart([[self.one.id, 1, "", ""]])
+        response = self.client.get(f"/remove-cart-item/{self.one.id}/")
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(len(self.guest_lines()), 1)
+
+    def test_a_full_cart_refuses_new_products(self):
+        self.set_guest_cart([[1000 + i, 1, "", ""] for i in range(MAX_GUEST_LINES)])
+        response = self.add(self.one)
+        self.assertFalse(response.json()["success"])
+        self.assertNotIn(GUEST_CART_COOKIE, response.cookies)
+        self.assertEqual(len(self.guest_lines()), MAX_GUEST_LINES)
+
+    def test_login_merges_the_guest_cart(self):
+        customer = User.objects.create_user(email="customer@example.com", password="x", username="customer")
+        Cart.objects.create(user=customer, product=self.one, quantity=1)
+        # Three is gone by the time the visitor logs in
+        self.set_guest_cart([[self.one.id, 2, "", ""], [self.two.id, 1, "Red", "S"], [999999, 1, "", ""]])
+
+        self.client.force_login(customer)
+        response = self.client.get("/about/")
+
+        self.assertEqual(response.cookies[GUEST_CART_COOKIE].value, "")
+        self.assertEqual(
+            sorted(Cart.objects.filter(user=customer).values_list("product_id", "quantity")),
+            [(self.one.id, 3), (self.two.id, 1)],
+        )
+
+    def test_a_failed_merge_drops_the_cookie_instead_of_failing_every_request(self):
+        customer = User.objects.create_user(email="customer@example.com", password="x", username="customer")
+        self.set_guest_cart([[self.one.id, 2, "", ""]])
+        self.client.force_login(customer)
+
+        error = ValueError(f"Unknown product(s): {self.one.id}.")
+        with mock.patch("shopingo.guest_cart.apply_cart_operations", side_effect=error), \
+                self.assertLogs("shopingo.guest_cart", "WARNING"):
+            response = self.client.get("/about/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies[GUEST_CART_COOKIE].value, "")
+        self.assertFalse(Cart.objects.filter(user=customer).exists())
+
+    def test_merge_skips_products_deleted_since(self):
+        customer = User.objects.create_user(email="customer@example.com", password="x", username="customer")
+        merge_guest_cart(customer.id, [[999999, 1, "", ""]])
+        self.assertFalse(Cart.objects.filter(user=customer).exists())
+
+
+# ===========================
+# Cart batch operations (carts.py)
+# ===========================
+class CartOperationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = User.objects.create_user(email="customer@example.com", password="x", username="customer")
+        self.line = Cart.objects.create(user=self.customer, product=self.one, quantity=1)
+
+    def cart(self):
+        return sorted(Cart.objects.filter(user=self.customer).values_list("product_id", "quantity"))
+
+    def test_operations_apply_together(self):
+        Wishlist.objects.create(user=self.customer, product=self.two)
+        apply_cart_operations(self.customer.id, [
+            {"op": "add", "product_id": self.two.id, "quantity": 2},
+            {"op": "add", "product_id": self.two.id},
+            {"op": "set", "item_id": self.line.id, "quantity": 5},
+            {"op": "add", "product_id": self.three.id},
+            {"op": "wishlist", "product_id": self.three.id},
+        ])
+        self.assertEqual(self.cart(), [(self.one.id, 5), (self.two.id, 3)])
+        # Added to the cart: off the wishlist; moved to the wishlist: on it, and counted
+        self.assertEqual(list(Wishlist.objects.filter(user=self.customer).values_list("product_id", flat=True)), [self.three.id])
+        self.three.refresh_from_db()
+        self.assertEqual(self.three.wishlist_count, 1)
+
+    def test_an_invalid_operation_writes_nothing(self):
+        batches = {
+            "empty": [],
+            "not a list": {"op": "add"},
+            "unknown op": [{"op": "add", "product_id": self.two.id}, {"op": "explode"}],
+            "missing item": [{"op": "add", "product_id": self.two.id}, {"op": "remove", "item_id": 999999}],
+            "bad quantity": [{"op": "set", "item_id": self.line.id, "quantity": "lots"}],
+            "unknown product": [{"op": "set", "item_id": self.line.id, "quantity": 4}, {"op": "add", "product_id": 999999}],
+            "too many": [{"op": "add", "product_id": self.two.id}] * (MAX_CART_OPERATIONS + 1),
+            "huge quantity": [{"op": "set", "item_id": self.line.id, "quantity": 10 ** 30}],
+            "too many of one product": [{"op": "add", "product_id": self.one.id, "quantity": MAX_LINE_QUANTITY}],
+            "huge id": [{"op": "add", "product_id": 2 ** 64}],
+            "color not text": [{"op": "add", "product_id": self.two.id, "color": ["red"]}],
+            "size too long": [{"op": "add", "product_id": self.two.id, "size": "x" * 51}],
+        }
+        for label, operations in batches.items():
+            with self.subTest(label):
+                with self.assertRaises(ValueError):
+                    apply_cart_operations(self.customer.id, operations)
+                self.assertEqual(self.cart(), [(self.one.id, 1)])
+
+    def test_a_removed_line_cannot_be_changed_later_in_the_batch(self):
+        with self.assertRaises(ValueError):
+            apply_cart_operations(self.customer.id, [
+                {"op": "remove", "item_id": self.line.id},
+                {"op": "set", "item_id": self.line.id, "quantity": 2},
+            ])
+        self.assertEqual(self.cart(), [(self.one.id, 1)])
+
+    def test_the_cached_summary_follows_the_batch(self):
+        self.assertEqual(get_cart_lines(self.customer.id)["cart_total_items"], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_cart_operations(self.customer.id, [{"op": "add", "product_id": self.two.id, "quantity": 2}])
+        self.assertEqual(get_cart_lines(self.customer.id)["cart_total_items"], 3)
+
+    def test_endpoint_answers_400_for_an_invalid_batch(self):
+        self.client.force_login(self.customer)
+        response = self.client.post("/api/cart/batch/", "{not json", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            "/api/cart/batch/", {"operations": [{"op": "add", "product_id": 999999}]}, content_type="application/json"
+        )
+        self.assertEqual((response.status_code, response.json()["success"]), (400, False))
+
+        response = self.client.post(
+            "/api/cart/batch/", {"operations": [{"op": "add", "product_id": self.two.id}]}, content_type="application/json"
+        )
+        self.assertEqual(response.json()["cart_total_items"], 2)
+
+
+# ===========================
+# Sales counters (sales.py)
+# ===========================
+class SalesCounterTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = User.objects.create_user(email="customer@example.com", password="x", username="customer")
+
+    def checkout(self, *lines, tracking_id):
+        """A completed order of (product, quantity, unit price) lines, recorded like checkout_complete does."""
+        order = Order.objects.create(
+            user=self.customer, subtotal=Decimal(0), shipping_charge=Decimal(0), total_amount=Decimal(0),
+        )
+        for product, quantity, price in lines:
+            OrderItem.objects.create(
+                order=order, user=self.customer, product=product, quantity=quantity,
+                price=Decimal(price), item_total=Decimal(price) * quantity,
+            )
+        CompletedOrder.objects.create(order=order, tracking_id=tracking_id, total_amount=Decimal(0))
+        record_order_sales(order.items.all())
+
+    def counters(self):
+        return (
+            sorted(ProductSalesStats.objects.values_list("product_id", "units_sold", "orders_count", "revenue", "units_7d", "units_30d")),
+            sorted(ProductSalesDay.objects.values_list("product_id", "day", "units", "orders", "revenue")),
+        )
+
+    def test_checkouts_add_up_and_match_a_rebuild(self):
+        self.checkout((self.one, 2, 30), (self.two, 1, 15), tracking_id="A")
+        # Same product twice in one order: one more order, both lines' units
+        self.checkout((self.one, 1, 30), (self.one, 3, 25), tracking_id="B")
+        stats = ProductSalesStats.objects.get(product=self.one)
+        self.assertEqual((stats.units_sold, stats.orders_count, stats.revenue), (6, 2, Decimal(165)))
+
+        incremental = self.counters()
+        self.assertEqual(rebuild_sales_stats(), 2)
+        self.assertEqual(self.counters(), incremental)
+
+    def test_counters_roll_back_with_the_checkout(self):
+        self.checkout((self.one, 1, 30), tracking_id="A")
+        before = self.counters()
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                self.checkout((self.one, 5, 30), (self.three, 1, 45), tracking_id="B")
+                raise DatabaseError("payment failed")
+        self.assertEqual(self.counters(), before)
+
+    def test_windows_drop_old_days(self):
+        today = timezone.localdate()
+        ProductSalesStats.objects.create(product=self.one, units_sold=9, units_7d=9, units_30d=9)
+        ProductSalesStats.objects.create(product=self.two, units_sold=4, units_7d=4, units_30d=4)
+        ProductSalesDay.objects.create(product=self.one, day=today, units=2)
+        ProductSalesDay.objects.create(product=self.one, day=today - timedelta(days=10), units=3)
+        ProductSalesDay.objects.create(product=self.one, day=today - timedelta(days=40), units=4)
+        ProductSalesDay.objects.create(product=self.two, day=today - timedelta(days=40), units=4)
+
+        refresh_sales_windows(today)
+        self.assertEqual(
+            sorted(ProductSalesStats.objects.values_list("product_id", "units_sold", "units_7d", "units_30d")),
+            [(self.one.id, 9, 2, 5), (self.two.id, 4, 0, 0)],
+        )
+
+
+# ===========================
+# Quick view fragments (fragments.py)
+# ===========================
+class QuickViewTests(CatalogTestCase):
+    def quick_view(self, product, **headers):
+        return self.client.get(f"/quick-view/{product.slug}/", **headers)
+
+    def test_unchanged_fragment_answers_304(self):
+        response = self.quick_view(self.one)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("One", response.json()["html"])
+        etag = response["ETag"]
+
+        response = self.quick_view(self.one, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_product_and_label_writes_change_the_fragment(self):
+        etag, other_etag = self.quick_view(self.one)["ETag"], self.quick_view(self.two)["ETag"]
+        self.one.title = "One, renamed"
+        self.one.save()
+        response = self.quick_view(self.one, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("One, renamed", response.json()["html"])
+        # Another product's fragment stays valid
+        self.assertEqual(self.quick_view(self.two, HTTP_IF_NONE_MATCH=other_etag).status_code, 304)
+
+        etag = response["ETag"]
+        self.red.name = "Crimson"
+        self.red.save()
+        response = self.quick_view(self.one, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('data-color="Crimson"', response.json()["html"])
+        # Labels are shared by every fragment
+        self.assertEqual(self.quick_view(self.two, HTTP_IF_NONE_MATCH=other_etag).status_code, 200)
+
+    def test_fragment_is_rendered_once_per_version(self):
+        self.quick_view(self.one)
+        with mock.patch("shopingo.fragments.render_quick_view") as render:
+            self.quick_view(self.one)
+            self.assertEqual(render.call_count, 0)
+
+    def test_batch_serves_the_same_fragments(self):
+        single = self.quick_view(self.one).json()["html"]
+        response = self.client.get("/quick-view/batch/", {"slug": [self.one.slug, self.two.slug, "no-such-product"]})
+        fragments = response.json()["fragments"]
+        self.assertEqual(set(fragments), {self.one.slug, self.two.slug})
+        self.assertEqual(fragments[self.one.slug], single)
+        self.assertEqual(fragments[self.two.slug], self.quick_view(self.two).json()["html"])
+
+
+# ===========================
+# Conditional GET (conditional.py)
+# ===========================
+class ConditionalPageTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        # The first page sets the CSRF cookie, which is part of the ETag
+        self.client.get(f"/category/{self.category.slug}/")
+
+    def category_page(self, **headers):
+        return self.client.get(f"/category/{self.category.slug}/", **headers)
+
+    def test_unchanged_page_answers_304_until_the_catalog_changes(self):
+        response = self.category_page()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+        etag = response["ETag"]
+        self.assertEqual(self.category_page(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.two.title = "Two, renamed"
+        self.two.save()
+        response = self.category_page(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Two, renamed")
+
+    def test_detail_page_validates_on_its_product(self):
+        url = f"/product-detail/{self.one.slug}/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        variation = self.one.variations.first()
+        variation.stock = 7
+        variation.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_per_visitor_pages_are_not_validated(self):
+        etag = self.category_page()["ETag"]
+
+        # The guest cart is part of the ETag and drops Last-Modified
+        self.client.cookies[GUEST_CART_COOKIE] = "anything"
+        response = self.category_page(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Last-Modified"))
+        del self.client.cookies[GUEST_CART_COOKIE]
+
+        customer = User.objects.create_user(email="customer@example.com", password="x", username="customer")
+        self.client.force_login(customer)
+        response = self.category_page(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+
+
+# ===========================
+# Variation matrix (variants.py)
+# ===========================
+class VariationMatrixTests(CatalogTestCase):
+    def test_matrix_lists_each_option_once_in_variation_order(self):
+        matrix = get_variation_matrix(self.four.id)
+        self.assertEqual([color["name"] for color in matrix["colors"]], ["Red", "Blue"])
+        self.assertEqual(matrix["sizes"], ["M", "S"])
+        self.assertEqual(matrix["brands"], ["Alpha"])
+        self.assertEqual(
+            [(v["color"], v["size"], v["discount_price"]) for v in matrix["variants"]],
+            [("Red", "M", "95.00"), ("Blue", "S", "5.00")],
+        )
+        self.assertEqual(matrix["default"], matrix["variants"][0])
+        self.assertEqual(get_variation_matrix(self.make_product("Bare").id)["default"], None)
+
+    def test_matrix_is_cached_until_a_variation_or_label_changes(self):
+        get_variation_matrix(self.one.id)
+        with self.assertNumQueries(0):
+            get_variation_matrix(self.one.id)
+
+        variation = self.one.variations.get(color=self.red)
+        variation.stock = 4
+        variation.save()
+        self.assertEqual(get_variation_matrix(self.one.id)["variants"][0]["stock"], 4)
+
+        self.small.name = "Small"
+        self.small.save()
+        self.assertIn("Small", get_variation_matrix(self.one.id)["sizes"])
+
+    def test_api_serves_the_matrix(self):
+        response = self.client.get(f"/api/products/{self.two.slug}/variations/")
+        self.assertEqual(response.json(), json.loads(json.dumps(get_variation_matrix(self.two.id))))
+        self.assertEqual(self.client.get("/api/products/no-such-product/variations/").status_code, 404)
+
+
+# ===========================
+# Top-K per group (catalog.top_k_per_group)
+# ===========================
+class TopKPerGroupTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.boots = Category.objects.create(name="Boots")
+        self.boot = Product.objects.create(title="Boot", price=Decimal(50), category=self.boots, seller=self.seller)
+        self.three.price = Decimal(60)
+        self.three.save()
+
+    def top(self, k, ordering):
+        groups = top_k_per_group(ProductListing.objects.all(), "category_id", k, ordering)
+        return {category_id: [row.product_id for row in rows] for category_id, rows in groups.items()}
+
+    def test_window_query_and_fallback_agree(self):
+        expected = {
+            ("-product_id",): {self.category.id: [self.four.id, self.three.id], self.boots.id: [self.boot.id]},
+            ("price", "product_id"): {self.category.id: [self.three.id, self.one.id], self.boots.id: [self.boot.id]},
+        }
+        for window in (True, False):
+            with self.subTest(window=window), mock.patch.object(connection.features, "supports_over_clause", window):
+                for ordering, groups in expected.items():
+                    self.assertEqual(self.top(2, ordering), groups)
+
+    def test_window_query_is_one_query(self):
+        if not connection.features.supports_over_clause:
+            self.skipTest("no window functions")
+        with self.assertNumQueries(1):
+            self.top(2, ["-product_id"])
+
+
+# ===========================
+# Item-item recommendations (recommendations.py)
+# ===========================
+class RecommendationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = User.objects.create_user(email="customer@example.com", password="x", username="customer")
+
+    def order(self, *products):
+        order = Order.objects.create(
+            user=self.customer, subtotal=Decimal(0), shipping_charge=Decimal(0), total_amount=Decimal(0),
+        )
+        for product in products:
+            OrderItem.objects.create(
+                order=order, user=self.customer, product=product, quantity=1, price=Decimal(1), item_total=Decimal(1),
+            )
+
+    def test_scores_are_cosine_over_weighted_baskets(self):
+        pairs, totals = co_occurrence([([{1, 2}, {1, 2}, {1, 3}], 1.0), ([{1, 4}], 0.5)])
+        self.assertEqual(dict(totals), {1: 3.5, 2: 2.0, 3: 1.0, 4: 0.5})
+        neighbours = top_neighbours(pairs, totals, n=2)
+        self.assertEqual([j for j, _ in neighbours[1]], [2, 3])
+        self.assertAlmostEqual(neighbours[1][0][1], 2 / math.sqrt(3.5 * 2))
+        self.assertEqual(neighbours[4], [(1, 0.5 / math.sqrt(0.5 * 3.5))])
+
+    def test_oversized_baskets_count_but_pair_nothing(self):
+        pairs, totals = co_occurrence([([set(range(MAX_BASKET + 1))], 1.0)])
+        self.assertEqual((len(pairs), totals[0]), (0, 1.0))
+
+    def test_rebuild_stores_neighbours_best_first(self):
+        self.order(self.one, self.two)
+        self.order(self.one, self.two)
+        self.order(self.one, self.three)
+        fan = User.objects.create_user(email="fan@example.com", password="x", username="fan")
+        Wishlist.objects.create(user=fan, product=self.one)
+        Wishlist.objects.create(user=fan, product=self.four)
+
+        version = get_version(CATALOG)
+        self.assertEqual(rebuild_recommendations(), 6)
+        self.assertNotEqual(get_version(CATALOG), version)
+        self.assertEqual(
+            [row.product_id for row in recommended_listings(self.one.id, 8)], [self.two.id, self.three.id, self.four.id],
+        )
+        self.assertEqual([row.product_id for row in recommended_listings(self.one.id, 1)], [self.two.id])
+        self.assertEqual([row.product_id for row in recommended_listings(self.four.id, 8)], [self.one.id])
+
+        # A rebuild replaces, it does not add
+        self.assertEqual(rebuild_recommendations(), 6)
+
+    def test_detail_page_pads_with_the_category(self):
+        self.order(self.one, self.three)
+        rebuild_recommendations()
+        similar = [row.product_id for row in self.client.get(f"/product-detail/{self.one.slug}/").context["similar_products"]]
+        self.assertEqual(similar[0], self.three.id)
+        self.assertEqual(sorted(similar), sorted([self.two.id, self.three.id, self.four.id]))
+
+
+# ===========================
+# Lazy cart context (context_processors.py)
+# ===========================
+class CartContextTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = User.objects.create_user(email="customer@example.com", password="x", username="customer")
+        Cart.objects.create(user=self.customer, product=self.one, quantity=2)
+        self.request = RequestFactory().get("/")
+        self.request.user = self.customer
+        self.request.session = {}
+
+    def test_nothing_is_computed_until_a_key_is_used(self):
+        with self.assertNumQueries(0):
+            context = cart_context(self.request)
+        self.assertEqual(context["cart_total_items"](), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(context["cart_subtotal"](), Decimal(200))
+            self.assertEqual(len(context["cart_items_base"]()), 1)
+
+    def test_totals_are_built_from_the_rows_once_per_request(self):
+        context = cart_context(self.request)
+        context["cart_total_items"]()
+        # The cached summary may lag a racing write: money is computed from the rows
+        Cart.objects.filter(user=self.customer).update(quantity=3)
+        self.assertEqual(context["cart_order_total"](), Decimal(300))
+        with self.assertNumQueries(0):
+            self.assertEqual(context["cart_shipping"](), Decimal(0))
+            # The mini-cart now shows the same rows the totals came from
+            self.assertEqual(context["cart_total_items"](), 3)
+            self.assertIs(cart_summary(self.request), cart_summary(self.request))
+
+
+# ===========================
+# Per-user cart summary cache (carts.py)
+# ===========================
+class CartSummaryCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = User.objects.create_user(email="customer@example.com", password="x", username="customer")
+        self.line = Cart.objects.create(user=self.customer, product=self.one, quantity=2)
+
+    def summary(self):
+        lines = get_cart_lines(self.customer.id)
+        return lines["cart_total_items"], lines["cart_subtotal"]
+
+    def test_summary_is_served_from_the_cache(self):
+        self.assertEqual(self.summary(), (2, Decimal(200)))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.summary(), (2, Decimal(200)))
+
+    def test_cart_writes_rebuild_the_summary(self):
+        self.summary()
+        Cart.objects.create(user=self.customer, product=self.two, quantity=1)
+        self.assertEqual(self.summary(), (3, Decimal(300)))
+
+        set_cart_quantity(self.customer.id, self.line.id, 5)
+        self.assertEqual(self.summary(), (6, Decimal(600)))
+
+        self.line.delete()
+        self.assertEqual(self.summary(), (1, Decimal(100)))
+
+    def test_product_edits_rebuild_only_the_carts_holding_them(self):
+        other = User.objects.create_user(email="other@example.com", password="x", username="other")
+        Cart.objects.create(user=other, product=self.three, quantity=1)
+        self.summary()
+        get_cart_lines(other.id)
+
+        # Carts charge the price after discount
+        self.one.orginal_price = Decimal(50)
+        self.one.save()
+        self.assertEqual(self.summary(), (2, Decimal(100)))
+        with self.assertNumQueries(0):
+            get_cart_lines(other.id)
+
+        # Someone else's cart leaves this one cached
+        Cart.objects.create(user=other, product=self.two, quantity=1)
+        with self.assertNumQueries(0):
+            self.summary()
+
+
+# ===========================
+# AJAX cart totals (carts.cart_totals)
+# ===========================
+class CartTotalsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = User.objects.create_user(email="customer@example.com", password="x", username="customer")
+        self.two.orginal_price = Decimal("12.50")
+        self.two.save()
+        self.line = Cart.objects.create(user=self.customer, product=self.one, quantity=2)
+        Cart.objects.create(user=self.customer, product=self.two, quantity=3)
+        other = User.objects.create_user(email="other@example.com", password="x", username="other")
+        Cart.objects.create(user=other, product=self.one, quantity=9)
+
+    def test_totals_and_line_total_come_from_one_query(self):
+        with self.assertNumQueries(1):
+            totals = cart_totals(self.customer.id, self.line.id)
+        self.assertEqual(
+            totals, {"cart_total_items": 5, "cart_subtotal": Decimal("237.50"), "item_total": Decimal("200.00")},
+        )
+        self.assertEqual(cart_totals(self.customer.id)["cart_subtotal"], build_cart_lines(self.customer.id)["cart_subtotal"])
+
+    def test_empty_cart_totals_are_zero(self):
+        nobody = User.objects.create_user(email="nobody@example.com", password="x", username="nobody")
+        self.assertEqual(cart_totals(nobody.id), {"cart_total_items": 0, "cart_subtotal": Decimal("0.00")})
+
+    def test_quantity_endpoint_answers_with_the_new_totals(self):
+        self.client.force_login(self.customer)
+        response = self.client.post("/update-cart-quantity/", {"item_id": self.line.id, "quantity": 4})
+        self.assertEqual(
+            response.json(),
+            {"success": True, "item_total": "400.00", "cart_subtotal": "437.50", "cart_total_items": 7},
+        )
+        self.assertEqual(get_cart_lines(self.customer.id)["cart_total_items"], 7)
+
+
+# ===========================
+# Bucket counts (catalog.histogram)
+# ===========================
+class HistogramTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        # A second variation of One in the 21-30 bucket
+        Variation.objects.create(
+            product=self.one, brand=self.alpha, color=self.blue, size=self.small, price=Decimal(100), discount_price=Decimal(25),
+        )
+
+    def test_every_bucket_in_one_query_matches_a_count_per_bucket(self):
+        variations = Variation.objects.filter(product__category=self.category)
+        with self.assertNumQueries(1):
+            rows = histogram(variations, "discount_price", DISCOUNT_BUCKETS)
+        self.assertEqual(rows, [
+            {"value": value, "count": variations.filter(discount_price__gte=start, discount_price__lte=end).count()}
+            for value, start, end in DISCOUNT_BUCKETS
+        ])
+        self.assertEqual({row["value"]: row["count"] for row in rows if row["count"]}, {10: 1, 20: 1, 30: 2, 50: 1, 80: 1, 90: 1})
+
+        products = histogram(variations, "discount_price", DISCOUNT_BUCKETS, count="product")
+        self.assertEqual({row["value"]: row["count"] for row in products}[30], 1)
+
+    def test_open_ended_buckets_and_values_outside_every_bucket(self):
+        stocks = {self.one: 0, self.two: 7, self.three: 400}
+        for product, stock in stocks.items():
+            Variation.objects.filter(product=product).update(stock=stock)
+        Variation.objects.filter(product=self.four).update(price=Decimal(2000))
+
+        stock_counts = histogram(Variation.objects.all(), "stock", STOCK_BUCKETS, count="product")
+        self.assertEqual(
+            [(row["value"], row["count"]) for row in stock_counts],
+            [("out", 2), ("low", 1), ("medium", 0), ("high", 1)],
+        )
+        # 100 falls in 99-149; 2000 only in the open "1000+" band
+        price_counts = {row["value"]: row["count"] for row in histogram(Variation.objects.all(), "price", PRICE_BUCKETS)}
+        self.assertEqual((price_counts["99-149"], price_counts["1000+"], price_counts["300-500"]), (5, 2, 0))
+
+        # A value in no bucket is counted nowhere
+        Variation.objects.filter(product=self.two).update(price=Decimal(700))
+        price_counts = histogram(Variation.objects.all(), "price", PRICE_BUCKETS)
+        self.assertEqual(sum(row["count"] for row in price_counts), Variation.objects.count() - 1)
+
+    def test_no_buckets_no_query(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(histogram(Variation.objects.all(), "price", []), [])
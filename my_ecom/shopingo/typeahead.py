@@ -0,0 +1,109 @@
+import re
+import threading
+from bisect import bisect_left
+
+from django.urls import reverse
+
+from .models import Category, Product, SubCategory, Tag
+from .versions import TYPEAHEAD, get_version
+
+
+# Kinds are suggested in this order
+KINDS = ("category", "subcategory", "tag", "product")
+
+
+def _normalize(text):
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+
+class PrefixIndex:
+    """
+    Sorted array of (key, entry) pairs searched with bisect.
+
+    Every word start of a label is a key ("blue denim jacket" is found by
+    "blu", "denim j" and "jack"), so a lookup is a binary search plus a scan
+    that stops after ``limit`` hits, and never touches the database.
+    """
+
+    def __init__(self, entries):
+        # entries: (label, url)
+        keys = []
+        for label, url in entries:
+            words = _normalize(label).split()
+            for i in range(len(words)):
+                keys.append((" ".join(words[i:]), label, url))
+        keys.sort()
+        self.keys = [k[0] for k in keys]
+        self.entries = [(k[1], k[2]) for k in keys]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def suggest(self, prefix, limit=10):
+        results = []
+        seen = set()
+        i = bisect_left(self.keys, prefix)
+        while i < len(self.keys) and len(results) < limit and self.keys[i].startswith(prefix):
+            entry = self.entries[i]
+            if entry not in seen:
+                seen.add(entry)
+                results.append(entry)
+            i += 1
+        return results
+
+
+def build_index():
+    """One PrefixIndex per kind, built from a handful of values_list queries."""
+    return {
+        "category": PrefixIndex(
+            (name, reverse("produc_category_view", args=[slug]))
+            for name, slug in Category.objects.values_list("name", "slug")
+        ),
+        "subcategory": PrefixIndex(
+            (name, reverse("produc_subCategory_view", args=[slug]))
+            for name, slug in SubCategory.objects.values_list("name", "slug")
+        ),
+        "tag": PrefixIndex(
+            (name, reverse("produc_tag_view", args=[slug]))
+            for name, slug in Tag.objects.exclude(name__isnull=True).values_list("name", "slug")
+        ),
+        "product": PrefixIndex(
+            (title, reverse("product-detail", args=[slug]))
+            for title, slug in Product.objects.values_list("title", "slug")
+        ),
+    }
+
+
+# ===========================
+# Process-local copy
+# ===========================
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def get_index():
+    """The in-process index, rebuilt only when the typeahead version was bumped."""
+    global _index, _index_version
+    version = get_version(TYPEAHEAD)
+    if _index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = build_index()
+                _index_version = version
+    return _index
+
+
+def suggest(prefix, limit=10):
+    """Top ``limit`` suggestions for a typed prefix: categories, subcategories, tags, then products."""
+    prefix = _normalize(prefix)
+    if not prefix:
+        return []
+    index = get_index()
+    results = []
+    for kind in KINDS:
+        for label, url in index[kind].suggest(prefix, limit - len(results)):
+            results.append({"type": kind, "label": label, "url": url})
+        if len(results) >= limit:
+            break
+    return results
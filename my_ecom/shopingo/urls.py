@@ -24,9 +24,14 @@ urlpatterns = [
     path('tag/<slug:slug>/', views.produc_tag_view, name='produc_tag_view'),
     path('category/<slug:slug>/', views.produc_category_view, name='produc_category_view'),
     path('subCategory/<slug:slug>/', views.produc_subCategory_view, name='produc_subCategory_view'),
+    path('search/', views.product_search, name='product_search'),
+    path('api/search/', views.product_search_api, name='product_search_api'),
+    path('api/search/suggest/', views.search_suggestions, name='search_suggestions'),
     
     #modal quick view product
+    path('quick-view/batch/', views.quick_view_batch_view, name='quick-view-batch'),
     path('quick-view/<slug:slug>/', views.quick_view_product, name='quick-view-product'),
+    path('api/products/<slug:slug>/variations/', views.product_variations_api, name='product_variations_api'),
     
     path('apply-coupon/', views.apply_coupon, name='apply_coupon'),
     path('remove-coupon/', views.remove_coupon, name='remove_coupon'),
@@ -38,8 +43,10 @@ urlpatterns = [
     path('delete-order-item/<int:item_id>/', views.delete_order_item, name='delete_order_item'),
     path('remove-to-wishlist/<int:item_id>/', views.remove_to_wishlist, name='remove_to_wishlist'),
     path('update-cart-quantity/', views.update_cart_quantity, name='update_cart_quantity'),
+    path('api/cart/batch/', views.cart_batch, name='cart_batch'),
 
     path("ajax/get-divisions/", views.get_divisions, name="get_divisions"),
     path("ajax/get-districts/", views.get_districts, name="get_districts"),
+    path("ajax/geography/<int:version>/", views.geography_document, name="geography_document"),
     
 ]
\ No newline at end of file
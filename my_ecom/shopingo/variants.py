@@ -0,0 +1,74 @@
+from django.core.cache import cache
+
+from .models import Variation
+from .versions import VARIATION_LABELS, get_versions, product_variations
+
+
+VARIATION_MATRIX_TIMEOUT = 60 * 60
+
+
+def _key(product_id, versions):
+    return f"shopingo:variations:{product_id}:{versions[0]}:{versions[1]}"
+
+
+# ===========================
+# Variation matrix
+# ===========================
+def build_variation_matrix(product_id):
+    """
+    color × size × brand -> price / discount_price / stock of one product,
+    from a single query. JSON-ready (prices are strings).
+    """
+    rows = (
+        Variation.objects.filter(product_id=product_id)
+        .order_by("id")
+        .values("id", "color__name", "color__code", "size__name", "brand__name", "price", "discount_price", "stock")
+    )
+    colors, sizes, brands, variants = {}, {}, {}, []
+    for row in rows:
+        colors.setdefault(row["color__name"], {"name": row["color__name"], "code": row["color__code"]})
+        sizes.setdefault(row["size__name"], row["size__name"])
+        brands.setdefault(row["brand__name"], row["brand__name"])
+        variants.append({
+            "id": row["id"],
+            "color": row["color__name"],
+            "size": row["size__name"],
+            "brand": row["brand__name"],
+            "price": str(row["price"]),
+            "discount_price": str(row["discount_price"]),
+            "stock": row["stock"],
+        })
+
+    return {
+        "product_id": product_id,
+        "colors": list(colors.values()),
+        "sizes": list(sizes.values()),
+        "brands": list(brands.values()),
+        "variants": variants,
+        # Same default as before: the first variation
+        "default": variants[0] if variants else None,
+    }
+
+
+def get_variation_matrix(product_id):
+    """Cached matrix; a Variation write (or a color/size/brand rename) bumps its version."""
+    names = [product_variations(product_id), VARIATION_LABELS]
+    versions = get_versions(names)
+    key = _key(product_id, [versions[name] for name in names])
+    matrix = cache.get(key)
+    if matrix is None:
+        matrix = build_variation_matrix(product_id)
+        cache.set(key, matrix, VARIATION_MATRIX_TIMEOUT)
+    return matrix
+
+
+def variation_context(product_id):
+    """Template context of the detail / quick-view variant pickers."""
+    matrix = get_variation_matrix(product_id)
+    default = matrix["default"]
+    return {
+        "variation_matrix": matrix,
+        "colors": matrix["colors"],
+        "sizes": matrix["sizes"],
+        "quantity_range": range(1, default["stock"] + 1) if default and default["stock"] > 0 else [],
+    }
@@ -0,0 +1,138 @@
+import threading
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+
+
+# ===========================
+# Cache version counters
+# ===========================
+# A version is a counter in the cache that writers bump; readers put it in
+# their cache keys (or compare it with a built copy), so a bump invalidates
+# everything derived from the old data without deleting keys one by one.
+
+TYPEAHEAD = "typeahead"
+FACETS = "facets"
+CATALOG = "catalog"
+VARIATION_LABELS = "variation_labels"
+SITE = "site"  # header / footer data outside the catalog (shop info, shipping, countries)
+GEOGRAPHY = "geography"
+NAVIGATION = "navigation"  # header / footer menus: categories, subcategories, tags, shop info
+
+
+def listing_scope(kind, value):
+    """Version name of one listing scope, e.g. listing_scope("category", 3)."""
+    return f"listing:{kind}:{value}"
+
+
+def product_variations(product_id):
+    """Version name bumped by every Variation write of one product."""
+    return f"variations:{product_id}"
+
+
+def product_content(product_id):
+    """Version name bumped by Product, Variation and ProductImage writes of one product."""
+    return f"product:{product_id}"
+
+
+def user_cart(user_id):
+    """Version name bumped by every Cart write of one user."""
+    return f"cart:{user_id}"
+
+
+def _key(name):
+    return f"shopingo:version:{name}"
+
+
+def _changed_key(name):
+    return f"shopingo:version:{name}:changed_at"
+
+
+def _seed():
+    # A counter lost from the cache restarts from the clock, never from a
+    # value an old reader may still hold.
+    return time.time_ns()
+
+
+def get_version(name):
+    version = cache.get(_key(name))
+    if version is None:
+        cache.add(_key(name), _seed(), None)
+        version = cache.get(_key(name))
+    return version
+
+
+def _bump(name):
+    cache.set(_changed_key(name), timezone.now(), None)
+    try:
+        return cache.incr(_key(name))
+    except ValueError:
+        cache.add(_key(name), _seed(), None)
+        return cache.get(_key(name))
+
+
+_pending = threading.local()
+
+
+def bump_version(name, again_on_commit=True):
+    """
+    Bump ``name`` now and, inside a transaction, once more when it commits.
+
+    Signals fire before the transaction commits: a request served in that
+    gap still reads the old rows and may cache them under the first new
+    version. The second bump retires that entry. Every name is bumped once
+    per commit, however many writes touched it. Callers that already run
+    after the commit pass ``again_on_commit=False``.
+    """
+    version = _bump(name)
+    if again_on_commit and transaction.get_connection().in_atomic_block:
+        if not hasattr(_pending, "names"):
+            _pending.names = set()
+        _pending.names.add(name)
+        # The first callback after the commit bumps every pending name, the
+        # rest find the set empty; names left over from a rolled back
+        # transaction just get one bump too many.
+        transaction.on_commit(_bump_pending)
+    return version
+
+
+def _bump_pending():
+    names = getattr(_pending, "names", None)
+    if not names:
+        return
+    _pending.names = set()
+    for name in names:
+        _bump(name)
+
+
+def changed_at(name):
+    """When ``name`` was last bumped (Last-Modified); "now" if that was lost from the cache."""
+    value = cache.get(_changed_key(name))
+    if value is None:
+        value = timezone.now()
+        cache.add(_changed_key(name), value, None)
+    return value
+
+
+def get_versions(names):
+    """{name: version} for several counters in one cache round trip."""
+    keys = {_key(name): name for name in names}
+    found = cache.get_many(keys)
+    versions = {keys[key]: value for key, value in found.items()}
+    for name in names:
+        if name not in versions:
+            versions[name] = get_version(name)
+    return versions
+
+
+def cache_is_shared():
+    """
+    False for a cache that lives inside one process (locmem, dummy): a
+    version bumped there is only seen by that process, never by the web
+    workers.
+    """
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
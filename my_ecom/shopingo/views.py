@@ -1,161 +1,112 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from .models import *
-from django.http import JsonResponse
+import json
+import logging
+from decimal import Decimal
+
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
-from accounts.models import *
-from decimal import Decimal
+from django.contrib.auth.views import redirect_to_login
+from django.db import transaction
+from django.db.models import Count, Q, F
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.utils import timezone
-import logging
-logger = logging.getLogger(__name__)
-from shopingo.context_processors import cart_context
+from django.utils.cache import patch_cache_control
 from django.utils.crypto import get_random_string
-from django.core.paginator import Paginator
-from django.db.models import Count, Q, F
+from django.views.decorators.http import condition, require_POST
 
+from .models import *
+from accounts.models import *
+from shopingo.carts import apply_cart_operations, cart_summary_json, cart_totals, set_cart_quantity
+from shopingo.catalog import parse_listing_filters, listing_context
+from shopingo.conditional import versioned_condition
+from shopingo.context_processors import cart_summary
+from shopingo.feeds import get_home_feed
+from shopingo.fragments import quick_view_batch, quick_view_etag, quick_view_html
+from shopingo.geography import get_geography
+from shopingo.guest_cart import build_guest_cart_lines, guest_cart_add, guest_cart_remove, read_guest_cart, write_guest_cart
+from shopingo.images import with_primary_image
+from shopingo.recommendations import recommended_listings
+from shopingo.sales import record_order_sales
+from shopingo.search import ranked_listings, search_listings
+from shopingo.typeahead import suggest
+from shopingo.variants import get_variation_matrix, variation_context
+from shopingo.versions import CATALOG, GEOGRAPHY, SITE, VARIATION_LABELS, product_content, product_variations
 
-# Create your views here.
-
-
-from django.db.models import Count
-
-def home(request):
-    main_tags = ["Men Wear", "Women Wear", "Kids Wear"]
-
-    tag_data = []
-
-    for tag_name in main_tags:
-        tag = Tag.objects.filter(name__iexact=tag_name).first()
-
-        if not tag:
-            tag = Tag.objects.exclude(name__in=main_tags).first()
+logger = logging.getLogger(__name__)
 
-        if tag:
-            product = (
-                Product.objects.filter(tags__tag=tag)
-                .order_by("price")
-                .first()
-            )
 
-            tag_data.append({
-                "tag": tag,
-                "product": product
-            })
+# Create your views here.
 
-    # Featured section er jonno
-    featured_products = (
-        Product.objects.filter(is_featured=True)
-        .prefetch_related("images")[:10]
-    )
 
-    # New Arrivals (main slider)
-    new_arrivals = (
-        Product.objects.all()
-        .prefetch_related("images")
-        .order_by("-created_at")[:10]
-    )
+def home(request):
+    # Whole page data comes from the precomputed snapshot (shopingo/feeds.py)
+    context = get_home_feed()
+    return render(request, "index.html", context)
 
-    # Category carousel
-    cat = (
-        Category.objects
-        .annotate(product_count=Count("products"))
-        .filter(product_count__gt=0)
-        .prefetch_related("products__images")
-    )
 
-    # ---------- BOTTOM 4 LISTS ----------
 
-    # 1) Best Selling Products (orderitem related_name use kore)
-    best_selling_products = (
-        Product.objects
-        .annotate(total_sold=Count("orderitem"))
-        .prefetch_related("images")
-        .order_by("-total_sold", "-id")[:4]
-    )
+def shop_categories(request):
+    return render(request, 'products/shop-categories.html')
 
-    # 2) Featured Products (nicher choto list er jonno)
-    bottom_featured_products = featured_products[:4]
+# ---- Conditional GET (anonymous pages, shopingo/conditional.py) ----
+# Every page also shows the header / footer: categories, tags, shop info
+PAGE_VERSIONS = [CATALOG, SITE]
 
-    # 3) New Arrivals (nicher list er jonno)
-    bottom_new_arrivals = new_arrivals[:4]
 
-    # 4) Top Rated Products (wishlist count diye approx rating)
-    top_rated_products = (
-        Product.objects
-        .annotate(wishlist_count=Count("wishlist"))
-        .prefetch_related("images")
-        .order_by("-wishlist_count", "-id")[:4]
-    )
+def _detail_row(request, slug):
+    # (id, updated_at) of the product, looked up once per request
+    if not hasattr(request, "_detail_row"):
+        request._detail_row = Product.objects.filter(slug=slug).values_list("id", "updated_at").first()
+    return request._detail_row
 
-    context = {
-        "tag_data": tag_data,
-        "featured_products": featured_products,
-        "new_arrivals": new_arrivals,
-        "categories": cat,
-
-        # bottom lists
-        "best_selling_products": best_selling_products,
-        "bottom_featured_products": bottom_featured_products,
-        "bottom_new_arrivals": bottom_new_arrivals,
-        "top_rated_products": top_rated_products,
-    }
 
-    return render(request, "index.html", context)
+def _detail_versions(request, slug):
+    row = _detail_row(request, slug)
+    if row is None:
+        return None
+    return PAGE_VERSIONS + [product_content(row[0]), product_variations(row[0]), VARIATION_LABELS]
 
 
+def _detail_updated_at(request, slug):
+    row = _detail_row(request, slug)
+    return row[1] if row else None
 
-def shop_categories(request):
-    return render(request, 'products/shop-categories.html')
 
+@versioned_condition(_detail_versions, last_modified=_detail_updated_at)
 def product_detail(request, slug):
     product = get_object_or_404(Product, slug=slug)
     
-    variations = product.variations.all()
-    colors = variations.values('color__name', 'color__code').distinct()
-    sizes = variations.values_list('size__name', flat=True).distinct()
-    default_variation = variations.first()
-    quantity_range = range(1, default_variation.stock + 1) if default_variation and default_variation.stock > 0 else []
-    
-     # -------- Similar Products Logic --------
-    similar_products = []
-
-    # Step 1️⃣: প্রথমে একই category এর product খুঁজো
-    if product.category:
-        similar_products = list(
-            Product.objects.filter(category=product.category)
-            .exclude(slug=product.slug)
-            .order_by('-id')[:8]
-        )
+    # Colors / sizes / stock per variant: one cached matrix (shopingo/variants.py)
+    variations = variation_context(product.id)
 
-    # Step 2️⃣: যদি ৮টার কম হয়, তাহলে অন্য random product দাও
+    # -------- Similar Products Logic --------
+    # Step 1: precomputed neighbours (co-purchase / co-wishlist), one query
+    similar_products = recommended_listings(product.id, 8)
+
+    # Cold start: pad with the same category, then anything, newest first
+    listings = ProductListing.objects.exclude(product_id=product.id)
     if len(similar_products) < 8:
-        extra_needed = 8 - len(similar_products)
-        extra_products = list(
-            Product.objects.exclude(
-                Q(slug=product.slug) | Q(id__in=[p.id for p in similar_products])
-            ).order_by('-id')[:extra_needed]
+        similar_products += list(
+            listings.filter(category_id=product.category_id)
+            .exclude(product_id__in=[p.product_id for p in similar_products])
+            .order_by('-product_id')[:8 - len(similar_products)]
         )
-        similar_products += extra_products
 
-    # Step 3️⃣: যদি মোট database এ ৮টার কম product থাকে, তাহলে যতটা আছে সব দেখাবে
-    if not similar_products:
-        similar_products = list(
-            Product.objects.exclude(slug=product.slug).order_by('-id')
+    # ... then with the newest products from anywhere else
+    if len(similar_products) < 8:
+        extra_needed = 8 - len(similar_products)
+        similar_products += list(
+            listings.exclude(product_id__in=[p.product_id for p in similar_products])
+            .order_by('-product_id')[:extra_needed]
         )
 
-    # Step 4️⃣: প্রতিটি product এ প্রথম image attach করো
-    for p in similar_products:
-        p.first_image = ProductImage.objects.filter(product=p).first()
-
     
     context = {
         'product': product,
-        'quantity_range': quantity_range,   
-        'colors': colors,
-        'sizes': sizes, 
         'similar_products': similar_products,
-    }   
+        **variations,
+    }
     return render(request, 'products/product-details.html', context)
 
 def product_comparison(request):
@@ -169,12 +120,53 @@ def starter_page(request):
 
 
 
-@login_required(login_url='customer_login')
+def _guest_product_action(request):
+    """handle_product_action for visitors: the cart lives in a signed cookie (shopingo/guest_cart.py)."""
+    action = request.POST.get("action", "").strip()
+    is_ajax = request.headers.get("x-requested-with") == "XMLHttpRequest"
+
+    # Wishlist needs an account
+    if action not in ("cart", "add_to_cart"):
+        if is_ajax:
+            return JsonResponse({"success": False, "message": "Please log in first.", "redirect_url": reverse("customer_login")})
+        return redirect_to_login(request.get_full_path(), "customer_login")
+
+    product = get_object_or_404(Product, id=request.POST.get("product_id") or 0)
+    try:
+        quantity = max(int(request.POST.get("quantity", 1)), 1)
+    except ValueError:
+        quantity = 1
+    try:
+        lines = guest_cart_add(
+            read_guest_cart(request), product.id, quantity,
+            request.POST.get("color", ""), request.POST.get("size", ""),
+        )
+    except ValueError as e:
+        # Cart cookie is full: refuse, keep the cookie as it is
+        if is_ajax:
+            return JsonResponse({"success": False, "message": str(e), "redirect_url": reverse("customer_login")})
+        messages.error(request, str(e))
+        return redirect("shopping-cart")
+
+    success_message = f"{product.title} added to your cart!"
+    if is_ajax:
+        response = JsonResponse({"success": True, "message": success_message, "redirect_url": None})
+    else:
+        messages.success(request, success_message)
+        response = redirect("shopping-cart")
+    write_guest_cart(response, lines)
+    return response
+
+
 def handle_product_action(request):
     if request.method != "POST":
         # Non-POST requests go home (or adjust as you wish)
         return redirect("home")
 
+    # Not logged in: cart in a cookie, merged into Cart at login
+    if not request.user.is_authenticated:
+        return _guest_product_action(request)
+
     product_id = request.POST.get("product_id")
     quantity = request.POST.get("quantity", 1)
     color = request.POST.get("color", "")
@@ -255,7 +247,7 @@ def handle_product_action(request):
 
 @login_required(login_url='customer_login')
 def wishlist(request):
-    wishlist_items = Wishlist.objects.filter(user=request.user).select_related('product')
+    wishlist_items = with_primary_image(Wishlist.objects.filter(user=request.user), 'product')
     return render(request, 'products/wishlist.html', {'wishlist_items': wishlist_items})
 
 
@@ -307,22 +299,43 @@ def remove_to_wishlist(request, item_id):
 
 
 
-@login_required(login_url='customer_login')
+def _guest_remove_cart_item(request, product_id):
+    # Changes the cookie, so never on a GET (a cross-site <img> could empty the cart)
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    lines = guest_cart_remove(read_guest_cart(request), product_id)
+
+    if request.headers.get("x-requested-with") == "XMLHttpRequest":
+        summary = build_guest_cart_lines(lines)
+        response = JsonResponse({
+            "success": True,
+            "cart_total_items": summary['cart_total_items'],
+            "cart_subtotal": f"{summary['cart_subtotal']:.2f}"
+        })
+    else:
+        messages.success(request, "Item removed from cart!")
+        response = redirect(request.META.get("HTTP_REFERER", "home"))
+    write_guest_cart(response, lines)
+    return response
+
+
 def remove_cart_item(request, item_id):
+    # Visitors: item_id is the product id of the guest cart line
+    if not request.user.is_authenticated:
+        return _guest_remove_cart_item(request, item_id)
+
     cart_item = get_object_or_404(Cart, id=item_id, user=request.user)
     cart_item.delete()
 
     # Check if AJAX
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
-        # recalculate cart totals
-        cart_items = Cart.objects.filter(user=request.user)
-        total_items = sum(item.quantity for item in cart_items)
-        subtotal = sum(item.product.orginal_price * item.quantity for item in cart_items)
+        # recalculate cart totals (one aggregate query)
+        totals = cart_totals(request.user.id)
 
         return JsonResponse({
             "success": True,
-            "cart_total_items": total_items,
-            "cart_subtotal": f"{subtotal:.2f}"
+            "cart_total_items": totals['cart_total_items'],
+            "cart_subtotal": f"{totals['cart_subtotal']:.2f}"
         })
 
     # Normal redirect for non-AJAX requests
@@ -366,7 +379,10 @@ def shopping_cart(request):
         return redirect('checkout-details')
 
     # GET request হলে শুধু কার্ট পেজ দেখাও
-    return render(request, 'products/shop-cart.html')
+    # Selectors read the whole geography tree once, from a long-cached URL
+    geography = get_geography()
+    context = {'geography_url': reverse('geography_document', args=[geography.version])}
+    return render(request, 'products/shop-cart.html', context)
 
 
 
@@ -377,7 +393,7 @@ def checkout_details(request):
         return redirect('shopping-cart')
 
     # --- Cart Totals ---
-    cart_data = cart_context(request)
+    cart_data = cart_summary(request)
     subtotal = cart_data['cart_subtotal']
     shipping_amount = cart_data['cart_shipping']
     coupon_discount = cart_data['cart_coupon_discount']
@@ -397,14 +413,8 @@ def checkout_details(request):
         address1 = request.POST.get('address1')
         address2 = request.POST.get('address2')
 
-        # Resolve Country Name
-        country_name_value = None
-        if country_id:
-            try:
-                country = CountryName.objects.get(id=country_id)
-                country_name_value = country.nameName
-            except CountryName.DoesNotExist:
-                pass
+        # Resolve Country Name (from the in-memory geography tree)
+        country_name_value = get_geography().country_name(country_id)
 
         # --- Save to Session ---
         request.session['shipping_info'] = {
@@ -443,22 +453,9 @@ def checkout_details(request):
     shipping_info = request.session.get('shipping_info', {})
 
     # --- Division & District Display ---
-    division_display = None
-    district_display = None
-
-    if shipping_info.get('division_id'):
-        try:
-            division = Division.objects.get(id=shipping_info['division_id'])
-            division_display = getattr(division, 'name', None) or getattr(division, 'division_name', None)
-        except Division.DoesNotExist:
-            pass
-
-    if shipping_info.get('district_id'):
-        try:
-            district = District.objects.get(id=shipping_info['district_id'])
-            district_display = getattr(district, 'name', None) or getattr(district, 'district_name', None)
-        except District.DoesNotExist:
-            pass
+    geography = get_geography()
+    division_display = geography.division_name(shipping_info.get('division_id'))
+    district_display = geography.district_name(shipping_info.get('district_id'))
 
     context = {
         'cart_items': cart_items,
@@ -466,7 +463,7 @@ def checkout_details(request):
         'shipping_amount': shipping_amount,
         'coupon_discount': coupon_discount,
         'order_total': total,
-        'country_name': CountryName.objects.all(),
+        'country_name': geography.countries,
         'shipping_info': shipping_info,
         'division_display': division_display,
         'district_display': district_display,
@@ -478,9 +475,9 @@ def checkout_details(request):
 @login_required(login_url='customer_login')
 def checkout_shipping(request):
     shipping_methods = ShippingCharge.objects.filter(active=True)
-    country_name = CountryName.objects.all()
+    country_name = get_geography().countries
 
-    cart_data = cart_context(request)
+    cart_data = cart_summary(request)
     subtotal = cart_data['cart_subtotal']
     coupon_discount = cart_data['cart_coupon_discount']
 
@@ -604,7 +601,7 @@ def checkout_review(request):
         return redirect('shopping-cart')
 
     order = get_object_or_404(Order, id=order_id, user=request.user)
-    order_items = order.items.all()
+    order_items = with_primary_image(order.items.all(), "product")
     address = order.shipping_address
 
     # Coupon check
@@ -672,16 +669,19 @@ def checkout_complete(request, order_id):
 
     tracking_id = get_random_string(length=12).upper()
 
-    completed_order = CompletedOrder.objects.create(
-        tracking_id=tracking_id,
-        shipping_address=address,
-        order=order,
-        total_amount=order.total_amount,
-        customer_info=customer_info,
-        product_info=product_info
-    )
+    # Order completion + best-seller counters commit together
+    with transaction.atomic():
+        completed_order = CompletedOrder.objects.create(
+            tracking_id=tracking_id,
+            shipping_address=address,
+            order=order,
+            total_amount=order.total_amount,
+            customer_info=customer_info,
+            product_info=product_info
+        )
 
-    completed_order.order_items.set(order_items)
+        completed_order.order_items.set(order_items)
+        record_order_sales(order_items)
 
     # 🟢 Clear order items
     # order.items.all().delete()
@@ -716,141 +716,22 @@ def contact_page(request):
 
 
 
+@versioned_condition(PAGE_VERSIONS)
 def produc_category_view(request, slug):
     view_type = request.GET.get('view', 'top')
     current_category = get_object_or_404(Category, slug=slug)
 
-    # Start with all products
-    products = Product.objects.all().prefetch_related("variations", "images")
+    filters = parse_listing_filters(request)
 
-    # -------- Sidebar filter values --------
-    selected_category_ids = request.GET.getlist("category")
-    selected_brand_ids = request.GET.getlist("brand")
-    selected_color_ids = request.GET.getlist("color")
-    min_price = request.GET.get("min_price") or ""
-    max_price = request.GET.get("max_price") or ""
-    selected_discount = request.GET.get("discount") or ""
-    selected_sort = request.GET.get("sort") or ""
+    # Category (sidebar checkboxes can widen the page to other categories)
+    category_ids = filters["selected_category_ids"] or [current_category.id]
+    products = ProductListing.objects.filter(category_id__in=category_ids)
 
-    # -------- Top toolbox filters --------
-    selected_size = request.GET.get("size") or ""
-    top_color = request.GET.get("top_color") or ""
-    price_range = request.GET.get("price_range") or ""
-    per_page = request.GET.get("per_page") or "12"
+    context = listing_context(products, filters, view_type, ("category", category_ids))
 
-    try:
-        per_page = int(per_page)
-    except ValueError:
-        per_page = 12
-
-    # ----------------- PRODUCT FILTERING -----------------
-
-    # Category
-    if selected_category_ids:
-        products = products.filter(category_id__in=selected_category_ids)
-    else:
-        products = products.filter(category=current_category)
-
-    # Brand
-    if selected_brand_ids:
-        products = products.filter(variations__brand_id__in=selected_brand_ids)
-
-    # Sidebar Color
-    if selected_color_ids:
-        products = products.filter(variations__color_id__in=selected_color_ids)
-
-    # Size (top toolbox)
-    if selected_size:
-        products = products.filter(variations__size_id=selected_size)
-
-    # Top bar color filter
-    if top_color:
-        products = products.filter(variations__color_id=top_color)
-
-    # Price range -> convert to min/max only if manual min/max not given
-    if price_range and not (min_price or max_price):
-        mapping = {
-            "5-49": (5, 49),
-            "49-99": (49, 99),
-            "99-149": (99, 149),
-            "149-300": (149, 300),
-            "300-500": (300, 500),
-            "1000+": (1000, None),
-        }
-        pr_min, pr_max = mapping.get(price_range, (None, None))
-        if pr_min is not None:
-            min_price = pr_min
-        if pr_max is not None:
-            max_price = pr_max
-
-    # Price filter based on discount_price (same as your original)
-    if min_price:
-        products = products.filter(variations__discount_price__gte=min_price)
-    if max_price:
-        products = products.filter(variations__discount_price__lte=max_price)
-
-    # --------- keep copy before discount filter (for counts) ---------
-    products_before_discount = products.distinct()
-
-    # ----------------- DISCOUNT FILTER (BUCKET BASED like 1st view) -----------------
-    if selected_discount:
-        try:
-            selected_discount_int = int(selected_discount)
-        except ValueError:
-            selected_discount_int = None
-
-        if selected_discount_int is not None:
-            start = (selected_discount_int - 10) + 1 if selected_discount_int > 10 else 0
-            end = selected_discount_int if selected_discount_int < 90 else 100
-
-            products = products.filter(
-                variations__discount_price__gte=start,
-                variations__discount_price__lte=end
-            )
-
-    products = products.distinct()
-
-    # ----------------- SORTING (same key names you used) -----------------
-    if selected_sort == "price_asc":
-        products = products.order_by("price")          # যদি Product এ price থাকে
-    elif selected_sort == "price_desc":
-        products = products.order_by("-price")
-    elif selected_sort == "newest":
-        products = products.order_by("-id")
-
-    # ----------------- PAGINATION (with per_page) -----------------
-    paginator = Paginator(products, per_page)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-
-    # ----------------- COUNT ANNOTATIONS -----------------
-    categoriess = Category.objects.annotate(product_count=Count('products', distinct=True))
-    brands = Brand.objects.annotate(product_count=Count('variation__product', distinct=True))
-    colors = Color.objects.annotate(product_count=Count('variation__product', distinct=True))
-    sizes = Size.objects.all()
-
-    # ----------------- DISCOUNT BUCKET COUNT (same style as 1st view) -----------------
-    discount_ranges = [10, 20, 30, 40, 50, 60, 70, 80, 90]
-
-    # count এর জন্য discount filter ছাড়া products ব্যবহার করছি
-    filtered_variations = Variation.objects.filter(product__in=products_before_discount)
-
-    discount_data = []
-    for d in discount_ranges:
-        start = (d - 10) + 1 if d > 10 else 0
-        end = d if d < 90 else 100   # 90% = 90–100
-
-        count = filtered_variations.filter(
-            discount_price__gte=start,
-            discount_price__lte=end
-        ).count()
-
-        discount_data.append({
-            "value": d,
-            "count": count,
-        })
-    # চাইলে এখানে zero গুলোই বাদ দিতে পারো, তবে তুমি টেমপ্লেটে if দিয়ে already করছো
-    # discount_data = [item for item in discount_data if item["count"] > 0]
+    # ----------------- CATEGORY COUNTS -----------------
+    context['categoriess'] = Category.objects.annotate(product_count=Count('products', distinct=True))
+    context['category'] = current_category
 
     # ----------------- TEMPLATE SELECTION -----------------
     if view_type == 'left':
@@ -860,194 +741,29 @@ def produc_category_view(request, slug):
     else:
         template = 'products/category/shop-grid-filter-on-top.html'
 
-    # ----------------- CONTEXT -----------------
-    context = {
-        'category': current_category,
-        'products': page_obj,
-        'page_obj': page_obj,
-
-        'categoriess': categoriess,
-        'brands': brands,
-        'colors': colors,
-        'sizes': sizes,
-
-        # Sidebar state
-        'selected_category_ids': selected_category_ids,
-        'selected_brand_ids': selected_brand_ids,
-        'selected_color_ids': selected_color_ids,
-        'min_price': min_price,
-        'max_price': max_price,
-        'selected_discount': selected_discount,
-        'selected_sort': selected_sort,
-
-        # Top toolbox state
-        'selected_size': selected_size,
-        'top_color': top_color,
-        'price_range': price_range,
-        'per_page': per_page,
-        'per_page_list': [9, 12, 16, 20, 50, 100],
-
-        'view_type': view_type,
-        'discount_ranges': discount_ranges,
-        'discount_data': discount_data,
-    }
-
     return render(request, template, context)
 
 
 
-
-
-
-
+@versioned_condition(PAGE_VERSIONS)
 def produc_subCategory_view(request, slug):
     view_type = request.GET.get('view', 'top')  # 'top', 'left', or 'list'
 
     subCategory = get_object_or_404(SubCategory, slug=slug)
 
     # ---------- BASE QUERY: only this subcategory ----------
-    products = Product.objects.filter(
-        subcategory=subCategory
-    ).prefetch_related("variations", "images")
-
-    # -------- Sidebar filter values --------
-    selected_brand_ids = [b for b in request.GET.getlist("brand") if b]
-    selected_color_ids = [c for c in request.GET.getlist("color") if c]
-    min_price = request.GET.get("min_price") or ""
-    max_price = request.GET.get("max_price") or ""
-    selected_discount = request.GET.get("discount") or ""
-    selected_sort = request.GET.get("sort") or ""
-
-    # -------- Top toolbox filters --------
-    selected_size = request.GET.get("size") or ""
-    top_color = request.GET.get("top_color") or ""
-    price_range = request.GET.get("price_range") or ""
-    per_page = request.GET.get("per_page") or "12"
+    products = ProductListing.objects.filter(subcategory=subCategory)
 
-    try:
-        per_page = int(per_page)
-    except ValueError:
-        per_page = 12
-
-    # ----------------- PRODUCT FILTERING -----------------
-    # Brand
-    if selected_brand_ids:
-        products = products.filter(variations__brand_id__in=selected_brand_ids)
-
-    # Sidebar Color
-    if selected_color_ids:
-        products = products.filter(variations__color_id__in=selected_color_ids)
-
-    # Size (top toolbox)
-    if selected_size:
-        products = products.filter(variations__size_id=selected_size)
-
-    # Top bar color filter
-    if top_color:
-        products = products.filter(variations__color_id=top_color)
-
-    # Price range -> convert to min/max only if manual min/max not given
-    if price_range and not (min_price or max_price):
-        mapping = {
-            "5-49": (5, 49),
-            "49-99": (49, 99),
-            "99-149": (99, 149),
-            "149-300": (149, 300),
-            "300-500": (300, 500),
-            "1000+": (1000, None),
-        }
-        pr_min, pr_max = mapping.get(price_range, (None, None))
-        if pr_min is not None:
-            min_price = pr_min
-        if pr_max is not None:
-            max_price = pr_max
-
-    # Price filter based on Variation.discount_price
-    if min_price:
-        products = products.filter(variations__discount_price__gte=min_price)
-    if max_price:
-        products = products.filter(variations__discount_price__lte=max_price)
-
-    # --------- keep copy before discount filter (for counts) ---------
-    products_before_discount = products.distinct()
-
-    # ----------------- DISCOUNT FILTER (BUCKET BASED) -----------------
-    if selected_discount:
-        try:
-            selected_discount_int = int(selected_discount)
-        except ValueError:
-            selected_discount_int = None
-
-        if selected_discount_int is not None:
-            start = (selected_discount_int - 10) + 1 if selected_discount_int > 10 else 0
-            end = selected_discount_int if selected_discount_int < 90 else 100
-
-            products = products.filter(
-                variations__discount_price__gte=start,
-                variations__discount_price__lte=end
-            )
-
-    products = products.distinct()
-
-    # ----------------- SORTING -----------------
-    if selected_sort == "price_asc":
-        products = products.order_by("price")
-    elif selected_sort == "price_desc":
-        products = products.order_by("-price")
-    elif selected_sort == "newest":
-        products = products.order_by("-id")
-
-    # ----------------- PAGINATION -----------------
-    paginator = Paginator(products, per_page)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    context = listing_context(products, parse_listing_filters(request), view_type, ("subcategory", [subCategory.id]))
 
     # ----------------- SIDEBAR COUNTS (subcategory specific) -----------------
     # subcategory er under sob subcategory list dekhate chaile:
-    categoriess = SubCategory.objects.filter(
+    context['categoriess'] = SubCategory.objects.filter(
         category=subCategory.category
     ).annotate(
         product_count=Count("products", distinct=True)
     )
-
-    # Only those variations which belong to products of this subcategory
-    filtered_variations = Variation.objects.filter(
-        product__in=products_before_discount
-    )
-
-    brands = Brand.objects.annotate(
-        product_count=Count(
-            "variation__product",
-            filter=Q(variation__product__in=products_before_discount),
-            distinct=True,
-        )
-    )
-
-    colors = Color.objects.annotate(
-        product_count=Count(
-            "variation__product",
-            filter=Q(variation__product__in=products_before_discount),
-            distinct=True,
-        )
-    )
-
-    sizes = Size.objects.all()
-
-    # ----------------- DISCOUNT BUCKET COUNT -----------------
-    discount_ranges = [10, 20, 30, 40, 50, 60, 70, 80, 90]
-    discount_data = []
-
-    for d in discount_ranges:
-        start = (d - 10) + 1 if d > 10 else 0
-        end = d if d < 90 else 100  # 90% = 90–100
-        count = filtered_variations.filter(
-            discount_price__gte=start,
-            discount_price__lte=end
-        ).count()
-        discount_data.append({
-            "value": d,
-            "count": count,
-        })
+    context['subCategory'] = subCategory
 
     # ----------------- TEMPLATE SELECTION -----------------
     if view_type == 'left':
@@ -1057,248 +773,125 @@ def produc_subCategory_view(request, slug):
     else:
         template = 'products/subCategory/shop-grid-filter-on-top.html'
 
-    # ----------------- CONTEXT -----------------
-    context = {
-        "subCategory": subCategory,
-        "products": page_obj,
-        "page_obj": page_obj,
-
-        # category page er sathe same naming, jeno same sidebar template reuse kora jai
-        "categoriess": categoriess,
-        "brands": brands,
-        "colors": colors,
-        "sizes": sizes,
-
-        # Sidebar state
-        "selected_brand_ids": selected_brand_ids,
-        "selected_color_ids": selected_color_ids,
-        "min_price": min_price,
-        "max_price": max_price,
-        "selected_discount": selected_discount,
-        "selected_sort": selected_sort,
-
-        # Top toolbox state
-        "selected_size": selected_size,
-        "top_color": top_color,
-        "price_range": price_range,
-        "per_page": per_page,
-        "per_page_list": [9, 12, 16, 20, 50, 100],
-        "view_type": view_type,
-
-        "discount_ranges": discount_ranges,
-        "discount_data": discount_data,
-    }
-
     return render(request, template, context)
 
 
 
-
-
-
+@versioned_condition(PAGE_VERSIONS)
 def produc_tag_view(request, slug):
     view_type = request.GET.get('view', 'top')
     tag = get_object_or_404(Tag, slug=slug)
 
-    # 1) Tag er under e sob product
+    # Tag er under e sob product
     product_ids = ProductTag.objects.filter(tag=tag).values_list('product_id', flat=True)
-    products = Product.objects.filter(id__in=product_ids).prefetch_related("variations", "images")
-
-    # -------- Sidebar filter values (category er moto) --------
-    selected_brand_ids = [b for b in request.GET.getlist("brand") if b]
-    selected_color_ids = [c for c in request.GET.getlist("color") if c]
-    min_price = request.GET.get("min_price") or ""
-    max_price = request.GET.get("max_price") or ""
-    selected_discount = request.GET.get("discount") or ""
-    selected_sort = request.GET.get("sort") or ""
-
-    # -------- Top toolbox filters --------
-    selected_size = request.GET.get("size") or ""
-    top_color = request.GET.get("top_color") or ""
-    price_range = request.GET.get("price_range") or ""
-    per_page = request.GET.get("per_page") or "12"
+    products = ProductListing.objects.filter(product_id__in=product_ids)
 
-    try:
-        per_page = int(per_page)
-    except ValueError:
-        per_page = 12
-
-    # ----------------- PRODUCT FILTERING -----------------
-
-    # Brand
-    if selected_brand_ids:
-        products = products.filter(variations__brand_id__in=selected_brand_ids)
-
-    # Sidebar Color
-    if selected_color_ids:
-        products = products.filter(variations__color_id__in=selected_color_ids)
-
-    # Size (top toolbox)
-    if selected_size:
-        products = products.filter(variations__size_id=selected_size)
-
-    # Top bar color filter
-    if top_color:
-        products = products.filter(variations__color_id=top_color)
-
-    # Price range -> convert to min/max only if manual min/max not given
-    if price_range and not (min_price or max_price):
-        mapping = {
-            "5-49": (5, 49),
-            "49-99": (49, 99),
-            "99-149": (99, 149),
-            "149-300": (149, 300),
-            "300-500": (300, 500),
-            "1000+": (1000, None),
-        }
-        pr_min, pr_max = mapping.get(price_range, (None, None))
-        if pr_min is not None:
-            min_price = pr_min
-        if pr_max is not None:
-            max_price = pr_max
-
-    # Price filter based on discount_price
-    if min_price:
-        products = products.filter(variations__discount_price__gte=min_price)
-    if max_price:
-        products = products.filter(variations__discount_price__lte=max_price)
-
-    # --------- copy before discount filter (for counts) ---------
-    products_before_discount = products.distinct()
-
-    # ----------------- DISCOUNT FILTER (bucket) -----------------
-    if selected_discount:
-        try:
-            selected_discount_int = int(selected_discount)
-        except ValueError:
-            selected_discount_int = None
+    context = listing_context(products, parse_listing_filters(request), view_type, ("tag", [tag.id]))
+    context['tag'] = tag
+
+    # ----------------- TEMPLATE SELECT -----------------
+    if view_type == 'left':
+        template = 'products/tag/shop-grid-left-sidebar.html'
+    elif view_type == 'list':
+        template = 'products/tag/shop-list-left-sidebar.html'
+    else:
+        template = 'products/tag/shop-grid-filter-on-top.html'
 
-        if selected_discount_int is not None:
-            start = (selected_discount_int - 10) + 1 if selected_discount_int > 10 else 0
-            end = selected_discount_int if selected_discount_int < 90 else 100
+    return render(request, template, context)
 
-            products = products.filter(
-                variations__discount_price__gte=start,
-                variations__discount_price__lte=end
-            )
 
-    products = products.distinct()
-
-    # ----------------- SORTING -----------------
-    if selected_sort == "price_asc":
-        products = products.order_by("price")
-    elif selected_sort == "price_desc":
-        products = products.order_by("-price")
-    elif selected_sort == "newest":
-        products = products.order_by("-id")
-
-    # ----------------- PAGINATION -----------------
-    paginator = Paginator(products, per_page)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-
-    # ----------------- SIDEBAR COUNTS (tag specific) -----------------
-    # Tag specific variations for discount counts
-    filtered_variations = Variation.objects.filter(product__in=products_before_discount)
-
-    brands = Brand.objects.annotate(
-        product_count=Count(
-            "variation__product",
-            filter=Q(variation__product__in=products_before_discount),
-            distinct=True
-        )
-    )
 
-    colors = Color.objects.annotate(
-        product_count=Count(
-            "variation__product",
-            filter=Q(variation__product__in=products_before_discount),
-            distinct=True
-        )
-    )
 
-    sizes = Size.objects.all()
+@versioned_condition(PAGE_VERSIONS)
+def product_search(request):
+    view_type = request.GET.get('view', 'left')
+    query = (request.GET.get('q') or '').strip()
 
-    # ----------------- DISCOUNT BUCKET COUNT -----------------
-    discount_ranges = [10, 20, 30, 40, 50, 60, 70, 80, 90]
-    discount_data = []
+    # Every match from the full-text index, the normal sidebar facets, pages ranked by relevance
+    products = search_listings(query)
 
-    for d in discount_ranges:
-        start = (d - 10) + 1 if d > 10 else 0
-        end = d if d < 90 else 100
+    context = listing_context(products, parse_listing_filters(request), view_type, rank=ranked_listings(query))
+    context['query'] = query
 
-        count = filtered_variations.filter(
-            discount_price__gte=start,
-            discount_price__lte=end
-        ).count()
+    return render(request, 'products/search/search-results.html', context)
 
-        discount_data.append({
-            "value": d,
-            "count": count,
-        })
 
-    # ----------------- TEMPLATE SELECT -----------------
-    if view_type == 'left':
-        template = 'products/tag/shop-grid-left-sidebar.html'
-    elif view_type == 'list':
-        template = 'products/tag/shop-list-left-sidebar.html'
-    else:
-        template = 'products/tag/shop-grid-filter-on-top.html'
+def product_search_api(request):
+    query = (request.GET.get('q') or '').strip()
 
-    # ----------------- CONTEXT -----------------
-    context = {
-        "tag": tag,
-        "products": page_obj,
-        "page_obj": page_obj,
-
-        "brands": brands,
-        "colors": colors,
-        "sizes": sizes,
-
-        # Sidebar state
-        "selected_brand_ids": selected_brand_ids,
-        "selected_color_ids": selected_color_ids,
-        "min_price": min_price,
-        "max_price": max_price,
-        "selected_discount": selected_discount,
-        "selected_sort": selected_sort,
-
-        # Top toolbox state
-        "selected_size": selected_size,
-        "top_color": top_color,
-        "price_range": price_range,
-        "per_page": per_page,
-        "per_page_list": [9, 12, 16, 20, 50, 100],
-
-        "view_type": view_type,
-        "discount_ranges": discount_ranges,
-        "discount_data": discount_data,
+    context = listing_context(search_listings(query), parse_listing_filters(request), 'api', rank=ranked_listings(query))
+    page_obj = context['page_obj']
+
+    results = [{
+        'id': item.product_id,
+        'title': item.title,
+        'slug': item.slug,
+        'url': reverse('product-detail', args=[item.slug]),
+        'image': item.image.url if item.image else None,
+        'price': str(item.price),
+        'orginal_price': str(item.orginal_price) if item.orginal_price is not None else None,
+        'category': item.category_name,
+    } for item in page_obj]
+
+    data = {
+        'query': query,
+        'results': results,
+        'has_next': page_obj.has_next(),
+        'facets': {
+            'brands': [{'id': b.id, 'name': b.name, 'count': b.product_count} for b in context['brands'] if b.product_count],
+            'colors': [{'id': c.id, 'name': c.name, 'count': c.product_count} for c in context['colors'] if c.product_count],
+            'discount': [d for d in context['discount_data'] if d['count']],
+        },
     }
+    if hasattr(page_obj, 'next_cursor'):
+        data['next_cursor'] = page_obj.next_cursor
+        data['estimated_count'] = page_obj.estimated_count
+    else:
+        data['count'] = page_obj.paginator.count
+        data['page'] = page_obj.number
+    return JsonResponse(data)
 
-    return render(request, template, context)
 
 
 
+def search_suggestions(request):
+    # Served from the in-process prefix index, no database on this path
+    try:
+        limit = min(int(request.GET.get('limit') or 10), 20)
+    except ValueError:
+        limit = 10
+    return JsonResponse({'suggestions': suggest(request.GET.get('q', ''), limit)})
 
+
+
+
+def _quick_view_etag(request, slug):
+    product_id = Product.objects.filter(slug=slug).values_list("id", flat=True).first()
+    return quick_view_etag(product_id) if product_id else None
+
+
+@condition(etag_func=_quick_view_etag)
 def quick_view_product(request, slug):
+    # Rendered fragment is cached per product content version; a repeat
+    # open with the same ETag gets a 304 before this runs
     product = get_object_or_404(Product, slug=slug)
+    response = JsonResponse({'html': quick_view_html(product)})
+    patch_cache_control(response, no_cache=True)
+    return response
 
-    # Get variations
-    variations = product.variations.all()
-    colors = variations.values('color__name', 'color__code').distinct()
-    sizes = variations.values_list('size__name', flat=True).distinct()
-    default_variation = variations.first()
-    quantity_range = range(1, default_variation.stock + 1) if default_variation and default_variation.stock > 0 else []
-    
 
-    html = render(request, 'partials/quick_view_content.html', {
-        'product': product,
-        'colors': colors,
-        'sizes': sizes,
-        'quantity_range': quantity_range,
-    }).content.decode('utf-8')
+def quick_view_batch_view(request):
+    """Several quick view fragments in one round trip (prefetch on hover): ?slug=a&slug=b"""
+    slugs = [slug for slug in request.GET.getlist("slug") if slug]
+    return JsonResponse({"fragments": quick_view_batch(slugs)})
+
 
-    return JsonResponse({'html': html})
+def product_variations_api(request, slug):
+    """Variation matrix as JSON, so the front end can switch variants without more requests."""
+    product_id = Product.objects.filter(slug=slug).values_list("id", flat=True).first()
+    if product_id is None:
+        return JsonResponse({"error": "Product not found"}, status=404)
+    return JsonResponse(get_variation_matrix(product_id))
 
 
 
@@ -1309,29 +902,40 @@ def update_cart_quantity(request):
     item_id = request.POST.get("item_id")
     quantity = request.POST.get("quantity")
 
-    try:
-        item = Cart.objects.get(id=item_id, user=request.user)
-        quantity = int(quantity)
-        if quantity < 1:
-            quantity = 1
-        item.quantity = quantity
-        item.save()
-
-        # Calculate updated totals
-        item_total = item.product.orginal_price * item.quantity
-        cart_items = Cart.objects.filter(user=request.user)
-        cart_subtotal = sum(i.product.orginal_price * i.quantity for i in cart_items)
-        cart_total_items = sum(i.quantity for i in cart_items)
+    quantity = int(quantity)
+    if quantity < 1:
+        quantity = 1
 
-        return JsonResponse({
-            "success": True,
-            "item_total": f"{item_total:.2f}",
-            "cart_subtotal": f"{cart_subtotal:.2f}",
-            "cart_total_items": cart_total_items
-        })
-    except Cart.DoesNotExist:
+    # One UPDATE, then the line total and cart totals from one aggregate query
+    if not set_cart_quantity(request.user.id, item_id, quantity):
         return JsonResponse({"success": False, "message": "Item not found."})
 
+    totals = cart_totals(request.user.id, item_id)
+    return JsonResponse({
+        "success": True,
+        "item_total": f"{totals['item_total']:.2f}",
+        "cart_subtotal": f"{totals['cart_subtotal']:.2f}",
+        "cart_total_items": totals['cart_total_items']
+    })
+
+@require_POST
+@login_required(login_url='customer_login')
+def cart_batch(request):
+    """
+    Several cart changes in one request (re-order, move all to cart, mobile):
+    POST {"operations": [{"op": "add", "product_id": 3, "quantity": 2}, ...]}
+    Returns the new cart summary. See shopingo/carts.py for the operations.
+    """
+    try:
+        payload = json.loads(request.body or b"{}")
+        operations = payload.get("operations") if isinstance(payload, dict) else None
+        apply_cart_operations(request.user.id, operations)
+    except ValueError as e:
+        # Invalid JSON or operation: nothing was applied
+        return JsonResponse({"success": False, "message": str(e)}, status=400)
+
+    return JsonResponse({"success": True, **cart_summary_json(request.user.id)})
+
 def apply_coupon(request):
     if request.method == "POST":
         code = request.POST.get("coupon_code", "").strip()
@@ -1357,15 +961,13 @@ def apply_coupon(request):
 
     return redirect(request.META.get("HTTP_REFERER", "cart"))
 
-from shopingo.context_processors import cart_context
-
 def remove_coupon(request):
     request.session.pop("coupon_code", None)
     request.session.pop("coupon_discount", None)
     messages.success(request, "Coupon removed.")
 
     # 🧮 Recalculate totals
-    cart_data = cart_context(request)
+    cart_data = cart_summary(request)
     subtotal = cart_data['cart_subtotal']
     shipping = cart_data['cart_shipping']
 
@@ -1392,15 +994,29 @@ def remove_coupon(request):
 #     messages.success(request, "Coupon removed.")
 #     return redirect(request.META.get("HTTP_REFERER", "shop-cart"))
 
+# ---- Geography (served from memory, shopingo/geography.py) ----
+@versioned_condition([GEOGRAPHY], anonymous_only=False, page=False)
 def get_divisions(request):
     country_id = request.GET.get("country_id")
-    divisions = Division.objects.filter(country_id=country_id).values("id", "division_name")
-    return JsonResponse(list(divisions), safe=False)
+    return JsonResponse(get_geography().divisions_of(country_id), safe=False)
 
+@versioned_condition([GEOGRAPHY], anonymous_only=False, page=False)
 def get_districts(request):
     division_id = request.GET.get("division_id")
-    districts = District.objects.filter(division_id=division_id).values("id", "district_name")
-    return JsonResponse(list(districts), safe=False)
+    return JsonResponse(get_geography().districts_of(division_id), safe=False)
+
+
+# Versioned URL: a write changes the version, so browsers may keep a copy for good
+GEOGRAPHY_MAX_AGE = 60 * 60 * 24 * 365
+
+def geography_document(request, version):
+    """The whole country -> division -> district tree as one JSON document."""
+    geography = get_geography()
+    if version != geography.version:
+        return redirect('geography_document', version=geography.version)
+    response = HttpResponse(geography.document, content_type="application/json")
+    patch_cache_control(response, public=True, max_age=GEOGRAPHY_MAX_AGE, immutable=True)
+    return response
 
 
 